@@ -0,0 +1,936 @@
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from main import CLOCK, Clock, EVENTS, METRICS, SERIALIZERS, BankingSystem, BufferedSink, ConsoleSink, CheckingAccount, CorporateCustomer, Customer, DepositTransaction, FixedClock, IndividualCustomer, JsonSerializer, LedgerEntry, LoanAccount, LoanAnalytics, Money, NullSink, SavingsAccount, ShardedBank, TransactionExecutor, np
+
+
+def measure_memory(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return items, after - before
+
+
+def bench_ledger_memory(count):
+    def build_dicts():
+        return [{
+            "type": "deposit",
+            "amount": 25.0 + i % 100,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "balance_after": 1000.0 + i
+        } for i in range(count)]
+
+    def build_entries():
+        # the ledger stores integer cents; the dict layout above is the old float one
+        return [LedgerEntry.create("deposit", 2500 + i % 100 * 100, 100_000 + i * 100) for i in range(count)]
+
+    _, dict_bytes = measure_memory(build_dicts)
+    entries, entry_bytes = measure_memory(build_entries)
+    assert all(LedgerEntry.from_dict(e.to_dict()).to_dict() == e.to_dict() for e in entries[:1000])
+
+    print(f"ledger entries: {count}")
+    print(f"  dict layout:      {dict_bytes / count:8.1f} bytes/entry  ({dict_bytes / 1e6:.1f} MB)")
+    print(f"  LedgerEntry slots: {entry_bytes / count:7.1f} bytes/entry  ({entry_bytes / 1e6:.1f} MB)")
+    print(f"  saving: {100 * (1 - entry_bytes / dict_bytes):.0f}%")
+
+
+def bench_statement(entries, queries, backend=None):
+    with tempfile.TemporaryDirectory() as directory:
+        bank, numbers = build_bank(directory, 1, backend=backend)
+        account = bank.find_account(numbers[0])
+        start = datetime(2030, 1, 1).timestamp() * 1_000_000
+        step = int(2 * 365 * 86_400_000_000 / entries)
+        rng = random.Random(5)
+        balance = account.get_balance_cents()
+        for i in range(entries):
+            kind = rng.choice(("deposit", "withdrawal", "fee", "interest"))
+            amount = rng.randint(1, 5_000)
+            balance += -amount if kind in ("withdrawal", "fee") else amount
+            account._add_transaction(LedgerEntry.create(kind, amount, balance, ts=int(start) + i * step))
+        account._set_balance_cents(balance)
+        bank.log_accounts(account)
+
+        # one-month windows at random points in the two years
+        windows = []
+        for _ in range(queries):
+            month = rng.randint(0, 22)
+            windows.append((f"{2030 + month // 12}-{month % 12 + 1:02d}-05", f"{2030 + (month + 1) // 12}-{(month + 1) % 12 + 1:02d}-05"))
+
+        started = time.perf_counter()
+        scanned = 0
+        for low, high in windows[:max(1, queries // 10)]:
+            low_us, high_us = Clock.parse(low), Clock.parse(high)
+            scanned += sum(1 for entry in account.get_transaction_history() if low_us <= entry.ts < high_us)
+        scan_elapsed = (time.perf_counter() - started) / max(1, queries // 10)
+
+        started = time.perf_counter()
+        found = 0
+        for low, high in windows:
+            found += sum(1 for _ in bank.iter_statement(numbers[0], low, high))
+        query_elapsed = (time.perf_counter() - started) / queries
+
+        started = time.perf_counter()
+        pages, cursor, rows = 0, None, 0
+        while True:
+            page = bank.statement(numbers[0], cursor=cursor, limit=500)
+            pages += 1
+            rows += len(page["entries"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        paged_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        last = None
+        for last in bank.iter_statement(numbers[0]):
+            pass
+        stream_elapsed = time.perf_counter() - started
+        bank.close()
+    print(f"statements: {entries:,} ledger entries over two years on one account{' (' + backend + ')' if backend else ''}")
+    print(f"  one-month window, full history scan: {scan_elapsed * 1000:8.1f} ms/query")
+    print(f"  one-month window, indexed query:     {query_elapsed * 1000:8.1f} ms/query (~{found // queries:,} rows)")
+    print(f"  cursor pages of 500:  {rows:,} rows in {pages:,} pages, {rows / paged_elapsed:,.0f} rows/s")
+    print(f"  streamed statement:   {entries / stream_elapsed:,.0f} rows/s, closing balance ${last['balance_cents'] / 100:,.2f} (account ${balance / 100:,.2f})")
+    return last["balance_cents"] == balance
+
+
+def bench_clock(count):
+    started = time.perf_counter()
+    stamps = [datetime.now().strftime("%Y-%m-%d %H:%M:%S") for _ in range(count)]
+    string_elapsed = time.perf_counter() - started
+    string_bytes = sum(sys.getsizeof(stamp) for stamp in stamps)
+
+    started = time.perf_counter()
+    stamps = [CLOCK.now_us() for _ in range(count)]
+    int_elapsed = time.perf_counter() - started
+    int_bytes = sum(sys.getsizeof(stamp) for stamp in stamps)
+
+    holder = Customer("cbench", "bench", "bench@example.com", "5550000", "bench street")
+    account = CheckingAccount("abench", holder, 0)
+    rates = {}
+    for label, clock in (("system", None), ("fixed", FixedClock("2030-01-01 00:00:00"))):
+        with CLOCK.using(clock):
+            started = time.perf_counter()
+            for i in range(count):
+                DepositTransaction(f"TXN{i:08d}", account, 1)
+            rates[label] = count / (time.perf_counter() - started)
+    print(f"timestamps: {count:,} readings")
+    print(f"  datetime.now().strftime: {count / string_elapsed:12,.0f}/s, {string_bytes / count:.0f} bytes each")
+    print(f"  integer microseconds:    {count / int_elapsed:12,.0f}/s, {int_bytes / count:.0f} bytes each")
+    print(f"  transaction construction: system clock {rates['system']:,.0f}/s, fixed clock {rates['fixed']:,.0f}/s")
+
+
+def bench_money(count):
+    rng = random.Random(7)
+    amounts = [rng.randint(1, 500_00) / 100 for _ in range(count)]
+    amount_cents = [Money.to_cents(a) for a in amounts]
+
+    started = time.perf_counter()
+    balance = 1000.0
+    for i, amount in enumerate(amounts):
+        if i % 2:
+            balance += amount
+        elif amount <= balance:
+            balance -= amount
+        else:
+            balance = round(balance - 35.0, 2)
+    balance += round(balance * 0.001, 2)
+    float_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cents = 100000
+    for i, amount in enumerate(amount_cents):
+        if i % 2:
+            cents += amount
+        elif amount <= cents:
+            cents -= amount
+        else:
+            cents -= 3500
+    cents += Money.apply_rate(cents, 0.001)
+    cents_elapsed = time.perf_counter() - started
+
+    holder = Customer("cbench", "bench", "bench@example.com", "5550000", "bench street")
+    account = CheckingAccount("abench", holder, 1_000_000.0, overdraft_limit=0)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, amount in enumerate(amounts):
+            if i % 2:
+                account.deposit(amount)
+            elif amount <= account.get_balance():
+                account.withdraw(amount)
+    account_elapsed = time.perf_counter() - started
+
+    print(f"money ops: {count}")
+    print(f"  float hot loop:     {count / float_elapsed:12,.0f} ops/s  (final {balance:.2f}, drift {balance - round(balance, 2):+.2e})")
+    print(f"  int cents hot loop: {count / cents_elapsed:12,.0f} ops/s  (final {cents / 100:.2f}, exact)")
+    print(f"  Account deposit/withdraw: {count / account_elapsed:,.0f} ops/s")
+
+
+def build_numbers(accounts):
+    return [f"ab{i:07d}" for i in range(accounts)]
+
+
+def build_bank(directory, accounts, balance=10_000.0, **options):
+    bank = BankingSystem(os.path.join(directory, "bench.json"), **options)
+    numbers = []
+    for i in range(accounts):
+        customer = IndividualCustomer(f"cb{i:07d}", f"bench {i}", f"bench{i}@example.com", "5550000", "bench street")
+        bank.add_customer(customer)
+        account = CheckingAccount(f"ab{i:07d}", customer, balance, overdraft_limit=0)
+        bank.add_account(account)
+        customer.add_account(account)
+        numbers.append(account.get_account_number())
+    return bank, numbers
+
+
+def random_instructions(numbers, count, seed=11):
+    rng = random.Random(seed)
+    ops = ("deposit", "withdraw", "transfer")
+    for _ in range(count):
+        op = rng.choice(ops)
+        instruction = {"op": op, "account": rng.choice(numbers), "amount": f"{rng.randint(1, 20_000) / 100:.2f}"}
+        if op == "transfer":
+            instruction["to_account"] = rng.choice(numbers)
+        yield instruction
+
+
+def bench_batch(count, accounts):
+    with tempfile.TemporaryDirectory() as directory:
+        bank, numbers = build_bank(directory, accounts)
+        path = os.path.join(directory, "payroll.csv")
+        with open(path, "w") as f:
+            f.write("op,account,to_account,amount\n")
+            for instruction in random_instructions(numbers, count):
+                f.write(f"{instruction['op']},{instruction['account']},{instruction.get('to_account', '')},{instruction['amount']}\n")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = bank.apply_batch_file(path)
+        print(f"batch file: {count} lines over {accounts} accounts")
+        print(f"  completed {report['completed']}, failed/rejected {report['failed']}")
+        print(f"  apply_batch: {report['ops_per_sec']:,.0f} ops/s ({report['elapsed']:.2f}s)")
+
+        single = min(count, 5_000)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for instruction in random_instructions(numbers, single, seed=12):
+                try:
+                    bank.submit(instruction)
+                except Exception:
+                    pass
+        elapsed = time.perf_counter() - started
+        print(f"  one commit per operation: {single / elapsed:,.0f} ops/s")
+        bank.close()
+
+
+def bench_idempotency(count, accounts, threads, backend=None):
+    # keyed requests are posted once, then every successful key is retried: live, as a keyed batch, and after a restart
+    def balances(bank, numbers):
+        return [bank.find_account(n).get_balance_cents() for n in numbers]
+
+    def post_all(bank, instructions):
+        def post(instruction):
+            try:
+                return bank.post(instruction)
+            except Exception:
+                return None
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            receipts = list(pool.map(post, instructions))
+        return receipts, time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        bank, numbers = build_bank(directory, accounts, idempotency_entries=count, backend=backend)
+        bank.save_data(silent=True)
+        instructions = [dict(instruction, key=f"req-{i}") for i, instruction in enumerate(random_instructions(numbers, count))]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            receipts, first = post_all(bank, instructions)
+            retried = [instruction for instruction, receipt in zip(instructions, receipts) if receipt is not None]
+            before = balances(bank, numbers)
+            replays, again = post_all(bank, retried)
+            live_ok = all(r is not None and r.get("replayed") for r in replays) and balances(bank, numbers) == before
+            report = bank.apply_batch(retried)
+            batch_ok = report["duplicates"] == len(retried) and balances(bank, numbers) == before
+            stats = bank.get_idempotency_stats()
+            bank.close()
+
+            reopened = BankingSystem(os.path.join(directory, "bench.json"), idempotency_entries=count, backend=backend)
+            reopened.load_data()
+            replays, restarted = post_all(reopened, retried)
+            restart_ok = all(r is not None and r.get("replayed") for r in replays) and balances(reopened, numbers) == before
+            reopened.close()
+
+    print(f"idempotency: {count} keyed requests over {accounts} accounts, {threads} threads, {backend or 'journal'} storage")
+    print(f"  first attempt: {count / first:,.0f} req/s, {len(retried)} completed")
+    print(f"  live retries: {len(retried) / again:,.0f} req/s, all replayed without posting: {'ok' if live_ok else 'FAILED'}")
+    print(f"  keyed batch retry: {report['ops_per_sec']:,.0f} lines/s, {report['duplicates']} duplicates: {'ok' if batch_ok else 'FAILED'}")
+    print(f"  retries after restart: {len(retried) / restarted:,.0f} req/s: {'ok' if restart_ok else 'FAILED'}")
+    print(f"  cache: {stats['entries']} entries (max {stats['max_entries']}), {stats['hits']} hits, {stats['misses']} misses")
+    return live_ok and batch_ok and restart_ok
+
+
+def bench_events(count, accounts, rounds):
+    print(f"event sinks: {count:,} batch lines over {accounts:,} accounts, best of {rounds}; console output goes to {os.devnull}")
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        path = os.path.join(directory, "payroll.csv")
+        with open(path, "w") as f:
+            f.write("op,account,to_account,amount\n")
+            for instruction in random_instructions(build_numbers(accounts), count):
+                f.write(f"{instruction['op']},{instruction['account']},{instruction.get('to_account', '')},{instruction['amount']}\n")
+        sinks = (
+            ("console", lambda: ConsoleSink(devnull)),
+            ("buffered", lambda: BufferedSink(os.path.join(directory, "events.log"), format="text")),
+            ("jsonl", lambda: BufferedSink(os.path.join(directory, "events.jsonl"))),
+            ("null", NullSink)
+        )
+        batch = {label: 0.0 for label, _ in sinks}
+        direct = {label: 0.0 for label, _ in sinks}
+        for round_number in range(rounds):
+            for label, make_sink in sinks:
+                run = os.path.join(directory, f"{label}-{round_number}")
+                os.mkdir(run)
+                bank, numbers = build_bank(run, accounts)
+                sink = make_sink()
+                previous = EVENTS.set_sink(sink)
+                try:
+                    with contextlib.redirect_stdout(devnull):
+                        report = bank.apply_batch_file(path)
+                    # the same account calls without the bank around them, where the output is most of the work
+                    account = bank.find_account(numbers[0])
+                    started = time.perf_counter()
+                    for _ in range(count // 2):
+                        account.deposit(1)
+                        account.withdraw(1)
+                    direct_rate = count / (time.perf_counter() - started)
+                    sink.close()
+                finally:
+                    EVENTS.set_sink(previous)
+                    bank.close()
+                batch[label] = max(batch[label], report["ops_per_sec"])
+                direct[label] = max(direct[label], direct_rate)
+        for label, _ in sinks:
+            print(f"  {label:8} sink: batch {batch[label]:9,.0f} ops/s ({batch[label] / batch['console']:.2f}x)   direct deposit/withdraw {direct[label]:10,.0f} ops/s ({direct[label] / direct['console']:.2f}x)")
+
+
+def bench_metrics(count, accounts):
+    with tempfile.TemporaryDirectory() as directory:
+        bank, numbers = build_bank(directory, accounts)
+        holder = bank.find_customer("cb0000000")
+
+        def deposits():
+            # a fresh account each run so history growth does not favour the first
+            account = CheckingAccount("am0000000", holder, 0)
+            gc.collect()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for i in range(count):
+                    DepositTransaction(f"TXN{i:08d}", account, 1).execute()
+            return count / (time.perf_counter() - started)
+
+        never = deposits()
+        METRICS.enable()
+        enabled = deposits()
+        METRICS.disable()
+        disabled = deposits()
+
+        METRICS.reset()
+        METRICS.enable()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for instruction in random_instructions(numbers, min(count, 20_000)):
+                try:
+                    bank.submit_nowait(instruction)
+                except Exception:
+                    pass
+            bank.save_data(silent=True)
+        METRICS.disable()
+        report = METRICS.to_dict()
+        METRICS.reset()
+        bank.close()
+    print(f"metrics: {count:,} direct deposits per run")
+    print(f"  never enabled:    {never:10,.0f} ops/s")
+    print(f"  enabled:          {enabled:10,.0f} ops/s ({enabled / never - 1:+.1%})")
+    print(f"  after disable():  {disabled:10,.0f} ops/s ({disabled / never - 1:+.1%})")
+    print(f"  mixed workload over {accounts:,} accounts:")
+    for name in ("bank_transaction_seconds", "bank_transaction_validate_seconds", "bank_account_operation_seconds", "bank_persistence_seconds"):
+        for series in report["histograms"].get(name, []):
+            labels = ",".join(series["labels"].values())
+            print(f"    {name:34} {labels:28} n={series['count']:<6} p50 {series['p50'] * 1e6:8.1f}us  p99 {series['p99'] * 1e6:9.1f}us")
+    for series in report["counters"].get("bank_transaction_rejections_total", []):
+        print(f"    rejected {series['labels']['type']}: {series['labels']['reason']} x{series['value']}")
+
+
+def bench_stress(count, accounts, threads, backend=None):
+    sys.setswitchinterval(1e-5)
+    with tempfile.TemporaryDirectory() as directory:
+        bank, numbers = build_bank(directory, accounts, balance=100.0, checkpoint_ops=500, backend=backend)
+        bank.save_data(silent=True)
+        expected = sum(bank.find_account(n).get_balance_cents() for n in numbers)
+
+        rng = random.Random(3)
+        instructions = []
+        for _ in range(count):
+            source, dest = rng.sample(numbers, 2)
+            instructions.append({"op": "transfer", "account": source, "to_account": dest, "amount": f"{rng.randint(1, 5000) / 100:.2f}"})
+
+        executor = TransactionExecutor(bank, max_workers=threads)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = executor.run_all(instructions)
+        elapsed = time.perf_counter() - started
+        executor.shutdown()
+
+        balances = [bank.find_account(n).get_balance_cents() for n in numbers]
+        bank.close()
+        reloaded = BankingSystem(os.path.join(directory, "bench.json"), backend=backend)
+        with contextlib.redirect_stdout(io.StringIO()):
+            reloaded.load_data()
+        recovered = [reloaded.find_account(n).get_balance_cents() for n in numbers]
+        reloaded.close()
+
+    completed = sum(1 for ok, _ in results if ok)
+    print(f"stress: {count} random transfers, {accounts} accounts, {threads} threads, {backend or 'journal'} storage")
+    print(f"  completed {completed}, rejected {count - completed}, {count / elapsed:,.0f} transfers/s")
+    print(f"  money before ${expected / 100:,.2f}, after ${sum(balances) / 100:,.2f}, after reload ${sum(recovered) / 100:,.2f}")
+    ok = sum(balances) == expected and min(balances) >= 0 and recovered == balances
+    print("  conservation: " + ("ok" if ok else "FAILED"))
+    return ok
+
+
+def bench_shards(shard_counts, count, accounts, threads, backend=None):
+    # each client thread runs its share of a random deposit/withdraw/transfer mix through the router
+    def client(bank, numbers, ops, seed):
+        rng = random.Random(seed)
+        net = 0
+        done = 0
+        for _ in range(ops):
+            op = rng.choice(("deposit", "withdraw", "transfer"))
+            cents = rng.randint(1, 5000)
+            try:
+                if op == "deposit":
+                    bank.deposit(rng.choice(numbers), cents / 100)
+                    net += cents
+                elif op == "withdraw":
+                    bank.withdraw(rng.choice(numbers), cents / 100)
+                    net -= cents
+                else:
+                    source, dest = rng.sample(numbers, 2)
+                    bank.transfer(source, dest, cents / 100)
+                done += 1
+            except Exception:
+                pass
+        return net, done
+
+    print(f"shards: {count} random operations, {accounts} accounts, {threads} client threads, {backend or 'journal'} storage, {os.cpu_count()} cpus")
+    ok = True
+    for shards in shard_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.json")
+            bank = ShardedBank(path, shards=shards, backend=backend)
+            numbers = []
+            for i in range(accounts):
+                customer_id = bank.create_customer("individual", f"bench {i}", f"bench{i}@example.com", "5550000", "bench street")
+                numbers.append(bank.create_account(customer_id, "checking", 1000))
+            expected = bank.get_totals()["total_cents"]
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                results = list(pool.map(lambda seed: client(bank, numbers, count // threads, seed), range(threads)))
+            elapsed = time.perf_counter() - started
+
+            expected += sum(net for net, _ in results)
+            totals = bank.get_totals()
+            stats = bank.get_stats()
+            bank.close()
+            reopened = ShardedBank(path, shards=shards, backend=backend)
+            recovered = reopened.get_totals()
+            reopened.close()
+
+        ops = count // threads * threads
+        balanced = totals["total_cents"] == expected and totals["holds"] == 0 and recovered["total_cents"] == expected and recovered["holds"] == 0
+        ok = ok and balanced
+        print(f"  {shards} shard(s): {ops / elapsed:,.0f} ops/s, completed {sum(done for _, done in results)}/{ops}, "
+              f"{stats['cross_shard_transfers']} cross-shard transfers, {stats['aborted_transfers']} aborted, conservation {'ok' if balanced else 'FAILED'}")
+    return ok
+
+
+def bench_cold_start(accounts):
+    with tempfile.TemporaryDirectory() as directory:
+        bank, numbers = build_bank(directory, accounts)
+        bank.save_data(silent=True)
+        bank.close()
+        size = os.path.getsize(os.path.join(directory, "bench.json"))
+
+        timings = {}
+        for lazy in (False, True):
+            started = time.perf_counter()
+            restarted = BankingSystem(os.path.join(directory, "bench.json"), lazy=lazy)
+            restarted.load_data()
+            timings[lazy] = time.perf_counter() - started
+            if lazy:
+                rng = random.Random(1)
+                started = time.perf_counter()
+                for number in rng.sample(numbers, min(1_000, accounts)):
+                    restarted.find_account(number).get_balance_cents()
+                lookup_elapsed = time.perf_counter() - started
+                stats = restarted.get_load_stats()
+            restarted.close()
+    print(f"cold start: {accounts:,} customers/accounts, snapshot {size / 1e6:.1f} MB")
+    print(f"  eager load_data: {timings[False]:.2f}s")
+    print(f"  lazy load_data:  {timings[True]:.2f}s")
+    print(f"  1,000 first-touch lookups: {lookup_elapsed * 1000:.1f} ms, touched {stats['touched']:.2%} ({stats['bytes_hydrated']:,} bytes)")
+
+
+def bench_wide_load(sizes, customers):
+    print(f"wide customers: load time for {customers} corporate customers holding many accounts each")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.json")
+            bank = BankingSystem(path)
+            kinds = (SavingsAccount, CheckingAccount, LoanAccount)
+            for c in range(customers):
+                customer = CorporateCustomer(f"cw{c:07d}", f"holding {c}", f"holding{c}@example.com", "5550000", "tower", f"Holding {c} Ltd", f"TX{c:08d}")
+                bank.add_customer(customer)
+                for i in range(size):
+                    account = kinds[i % 3](f"aw{c:03d}{i:07d}", customer, 1_000 + i)
+                    bank.add_account(account)
+                    customer.add_account(account)
+            bank.save_data(silent=True)
+            bank.close()
+
+            timings = {}
+            for lazy in (False, True):
+                started = time.perf_counter()
+                restarted = BankingSystem(path, lazy=lazy)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    restarted.load_data()
+                    customer = restarted.find_customer("cw0000000")
+                timings[lazy] = time.perf_counter() - started
+                count = customer.get_account_count()
+                total = customer.get_total_balance_cents()
+                restarted.close()
+            per_account = timings[False] / (size * customers) * 1e6
+            print(f"  {size:>7,} accounts/customer: eager {timings[False]:6.2f}s ({per_account:5.1f} us/account), lazy first touch {timings[True]:6.2f}s; {count:,} accounts, ${total / 100:,.2f}")
+
+
+def bench_cache(accounts, capacity, count):
+    with tempfile.TemporaryDirectory() as directory:
+        bank, numbers = build_bank(directory, accounts)
+        expected = sum(bank.find_account(number).get_balance_cents() for number in numbers)
+        bank.save_data(silent=True)
+        bank.close()
+
+        bank = BankingSystem(os.path.join(directory, "bench.json"), cache_customers=capacity)
+        bank.load_data()
+        rng = random.Random(5)
+        # a skewed mix: most traffic lands on a small hot set, the rest spreads over every customer
+        hot = numbers[:max(1, capacity // 2)]
+        instructions = []
+        for _ in range(count):
+            source = rng.choice(hot) if rng.random() < 0.8 else rng.choice(numbers)
+            instructions.append({"op": "transfer", "account": source, "to_account": rng.choice(numbers), "amount": f"{rng.randint(1, 500) / 100:.2f}"})
+        executor = TransactionExecutor(bank, max_workers=8)
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            executor.run_all(instructions)
+        elapsed = time.perf_counter() - started
+        executor.shutdown()
+        stats = bank.get_cache_stats()
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = bank.close_period()
+        bank.save_data(silent=True)
+        after_close = bank.get_cache_stats()
+        bank.close()
+
+        reloaded = BankingSystem(os.path.join(directory, "bench.json"))
+        reloaded.load_data()
+        total = sum(reloaded.find_account(number).get_balance_cents() for number in numbers)
+        reloaded.close()
+
+    lookups = stats["hits"] + stats["misses"]
+    print(f"customer cache: {accounts:,} customers, capacity {capacity:,}")
+    print(f"  {count:,} transfers: {count / elapsed:,.0f} ops/s, hit rate {stats['hits'] / lookups:.1%}")
+    print(f"  evictions {stats['evictions']:,}, write-backs {stats['write_backs']:,}, resident {stats['resident_customers']:,} ({stats['resident_bytes']:,} est. bytes)")
+    print(f"  close_period over {report['accounts']:,} accounts: {report['elapsed']:.2f}s, resident after checkpoint {after_close['resident_customers']:,}")
+    print(f"  conservation after reload: {'ok' if total == expected + report['interest_cents'] - report['fees_cents'] else 'MISMATCH'}")
+    return total == expected + report["interest_cents"] - report["fees_cents"]
+
+
+def snapshot_rows(accounts):
+    customers, rows = [], []
+    kinds = (SavingsAccount, CheckingAccount, LoanAccount)
+    for i in range(accounts):
+        if i % 2 == 0:
+            if i % 20 == 0:
+                customer = CorporateCustomer(f"cs{i:07d}", f"firm {i}", f"firm{i}@example.com", f"555{i:07d}", "market street", f"Firm {i} Ltd", f"TX{i:08d}")
+            else:
+                customer = IndividualCustomer(f"cs{i:07d}", f"person {i}", f"person{i}@example.com", f"555{i:07d}", "home street")
+            customers.append(customer.to_dict())
+        kind = kinds[i % 3]
+        account = kind(f"as{i:07d}", customer, 1_000 + i % 5_000)
+        rows.append(account.to_dict())
+    return customers, rows
+
+
+def bench_snapshot_formats(sizes):
+    serializers = [("json indent=2", JsonSerializer(indent=2)), ("json", SERIALIZERS["json"]), ("columnar", SERIALIZERS["columnar"])]
+    header = {"next_customer_id": 1, "next_account_number": 1000, "next_transaction_id": 1, "journal_seq": 0}
+    print("snapshot formats: size, save and load time")
+    for accounts in sizes:
+        customers, rows = snapshot_rows(accounts)
+        print(f"  {accounts:,} accounts, {len(customers):,} customers")
+        with tempfile.TemporaryDirectory() as directory:
+            for label, serializer in serializers:
+                path = os.path.join(directory, "snapshot" + serializer.EXTENSION)
+                started = time.perf_counter()
+                serializer.dump(path, header, customers, rows)
+                save_elapsed = time.perf_counter() - started
+                size = os.path.getsize(path)
+                gc.collect()
+                started = time.perf_counter()
+                loaded = serializer.load(path)
+                load_elapsed = time.perf_counter() - started
+                by_number = {row["account_number"]: row for row in loaded["accounts"]}
+                assert len(by_number) == len(rows) and all(by_number[row["account_number"]] == row for row in rows[::997])
+                del loaded
+                os.remove(path)
+                print(f"    {label:14} {size / 1e6:9.1f} MB  save {save_elapsed:6.2f}s  load {load_elapsed:6.2f}s")
+        del customers, rows
+        gc.collect()
+
+
+def bench_totals(accounts, reads):
+    with tempfile.TemporaryDirectory() as directory:
+        bank = BankingSystem(os.path.join(directory, "bench.json"))
+        customer = CorporateCustomer("ct0000001", "holding", "holding@example.com", "5550000", "tower", "Holding Ltd", "TX00000001")
+        bank.add_customer(customer)
+        kinds = (SavingsAccount, CheckingAccount, LoanAccount)
+        for i in range(accounts):
+            account = kinds[i % 3](f"at{i:07d}", customer, 1_000 + i)
+            bank.add_account(account)
+            customer.add_account(account)
+
+        started = time.perf_counter()
+        for _ in range(reads):
+            summed = sum(account.get_balance_cents() for account in customer.get_accounts_list())
+        summed_elapsed = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(reads):
+            total = customer.get_total_balance_cents()
+        running_elapsed = time.perf_counter() - started
+        assert summed == total
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            for account in customer.get_accounts_list()[::3]:
+                bank.deposit(account.get_account_number(), 10)
+        started = time.perf_counter()
+        report = bank.verify_aggregates()
+        verify_elapsed = time.perf_counter() - started
+        bank.close()
+    print(f"customer totals: {accounts:,} accounts on one holder, {reads:,} reads")
+    print(f"  summed per read:  {reads / summed_elapsed:12,.0f} reads/s")
+    print(f"  running totals:   {reads / running_elapsed:12,.0f} reads/s")
+    print(f"  verifier: {verify_elapsed * 1000:.1f} ms, {'ok' if report['ok'] else 'DRIFT'}; bank total ${report['actual']['total_cents'] / 100:,.2f}, loans ${report['actual']['loans_outstanding_cents'] / 100:,.2f}")
+    return report["ok"]
+
+
+def bench_period_close(accounts):
+    with tempfile.TemporaryDirectory() as directory:
+        bank = BankingSystem(os.path.join(directory, "bench.json"))
+        kinds = (SavingsAccount, CheckingAccount, LoanAccount)
+        for i in range(accounts):
+            if i % 10 == 0:
+                customer = IndividualCustomer(f"cp{i:07d}", f"close {i}", f"close{i}@example.com", "5550000", "close street")
+                bank.add_customer(customer)
+            kind = kinds[i % 3]
+            account = kind(f"ap{i:07d}", customer, 1_000 + i % 5_000)
+            bank.add_account(account)
+            customer.add_account(account)
+        accounts_list = [bank.find_account(f"ap{i:07d}") for i in range(accounts)]
+
+        started = time.perf_counter()
+        per_object = sum(account.calculate_interest_cents() for account in accounts_list)
+        method_elapsed = time.perf_counter() - started
+
+        report = bank.close_period()
+        bank.close()
+    print(f"period close: {report['accounts']:,} accounts ({'numpy' if np is not None else 'pure python fallback'})")
+    print(f"  per-object calculate_interest loop: {method_elapsed:.2f}s (sum {per_object / 100:,.2f})")
+    print(f"  close_period: {report['elapsed']:.2f}s, interest ${report['interest_cents'] / 100:,.2f}, fees ${report['fees_cents'] / 100:,.2f}, accrued ${report['accrued_cents'] / 100:,.2f}")
+
+
+def bench_loan_report(loans):
+    rng = random.Random(5)
+    customer = IndividualCustomer("cl0000001", "loan bench", "loan@example.com", "5550000", "loan street")
+    portfolio = []
+    for i in range(loans):
+        loan = LoanAccount(f"al{i:07d}", customer, rng.choice((5_000, 10_000, 25_000, 50_000)), rng.choice((0.05, 0.08, 0.12)), rng.choice((12, 24, 36, 60)))
+        loan._set_date_opened(f"{rng.randint(2022, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 09:00:00")
+        loan._set_payments_made(rng.randint(0, 12))
+        portfolio.append(loan)
+
+    started = time.perf_counter()
+    report = LoanAnalytics.portfolio_report(portfolio, "2026-06-30")
+    report_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for loan in portfolio:
+        LoanAnalytics.payoff_quote(loan, "2026-06-30")
+    quote_elapsed = time.perf_counter() - started
+
+    cache = LoanAnalytics.schedule.cache_info()
+    print(f"loan analytics: {loans:,} loans ({'numpy' if np is not None else 'pure python fallback'})")
+    print(f"  portfolio report: {report_elapsed:.2f}s, {len(report['delinquent']):,} delinquent, past due ${report['past_due_cents'] / 100:,.2f}")
+    print(f"  remaining principal ${report['remaining_principal_cents'] / 100:,.2f} vs scheduled ${report['scheduled_principal_cents'] / 100:,.2f}")
+    print(f"  payoff quotes: {loans / quote_elapsed:,.0f}/s")
+    print(f"  schedule cache: {cache.hits:,} hits, {cache.misses:,} misses")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def rpc(reader, writer, request):
+    writer.write(json.dumps(request).encode("utf-8") + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def open_connection(host, port, attempts=50):
+    for _ in range(attempts):
+        try:
+            return await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise ConnectionError(f"server at {host}:{port} not reachable")
+
+
+async def run_loadgen(host, port, connections, requests, pipeline, accounts):
+    reader, writer = await open_connection(host, port)
+    numbers = []
+    for i in range(accounts):
+        customer = await rpc(reader, writer, {"id": i, "op": "create_customer", "name": f"load {i}", "email": f"load{i}@example.com", "phone": "5550000", "address": "load street"})
+        account = await rpc(reader, writer, {"id": i, "op": "create_account", "customer_id": customer["result"]["customer_id"], "account_type": "checking", "amount": 100_000})
+        numbers.append(account["result"]["account_number"])
+    writer.close()
+
+    latencies = []
+    errors = 0
+
+    async def client(seed):
+        nonlocal errors
+        rng = random.Random(seed)
+        reader, writer = await open_connection(host, port)
+        window = asyncio.Semaphore(pipeline)
+        sent = {}
+
+        async def collect():
+            nonlocal errors
+            for _ in range(requests):
+                response = json.loads(await reader.readline())
+                latencies.append(time.perf_counter() - sent.pop(response["id"]))
+                if not response["ok"]:
+                    errors += 1
+                window.release()
+
+        collector = asyncio.create_task(collect())
+        for request_id in range(requests):
+            await window.acquire()
+            op = rng.choice(("deposit", "withdraw", "transfer", "balance"))
+            request = {"id": request_id, "op": op, "account": rng.choice(numbers), "amount": f"{rng.randint(1, 5000) / 100:.2f}"}
+            if op == "transfer":
+                request["to_account"] = rng.choice(numbers)
+            sent[request_id] = time.perf_counter()
+            writer.write(json.dumps(request).encode("utf-8") + b"\n")
+            await writer.drain()
+        await collector
+        writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(seed) for seed in range(connections)))
+    elapsed = time.perf_counter() - started
+
+    reader, writer = await open_connection(host, port)
+    stats = (await rpc(reader, writer, {"id": 0, "op": "commit_stats"}))["result"]
+    writer.close()
+
+    latencies.sort()
+    total = connections * requests
+    print(f"loadgen: {connections} connections x {requests} requests, pipeline depth {pipeline}")
+    print(f"  {total / elapsed:,.0f} req/s, {errors} error responses")
+    print(f"  latency p50 {percentile(latencies, 0.50) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms")
+    print(f"  group commit: {stats['batches']} fsyncs for {stats['records']} records, avg batch {stats['avg_batch_size']:.1f}, max batch {stats['max_batch_size']}")
+    print(f"  commit latency avg {stats['avg_latency_ms']:.2f} ms, p99 {stats['p99_latency_ms']:.2f} ms")
+
+
+def bench_loadgen(host, port, connections, requests, pipeline, accounts):
+    if port:
+        asyncio.run(run_loadgen(host, port, connections, requests, pipeline, accounts))
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        with socket.socket() as probe:
+            probe.bind((host, 0))
+            port = probe.getsockname()[1]
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"), "serve",
+             "--host", host, "--port", str(port), "--data", os.path.join(directory, "bench.json")],
+            stdout=subprocess.DEVNULL
+        )
+        try:
+            asyncio.run(run_loadgen(host, port, connections, requests, pipeline, accounts))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="banking system benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    ledger = sub.add_parser("ledger-memory", help="memory of ledger entries vs per-transaction dicts")
+    ledger.add_argument("--count", type=int, default=200_000)
+
+    statement = sub.add_parser("statement", help="date-range statement queries, cursor pagination and streaming vs scanning history")
+    statement.add_argument("--entries", type=int, default=200_000)
+    statement.add_argument("--queries", type=int, default=50)
+    statement.add_argument("--backend", choices=("sqlite",), help="storage backend instead of journal and snapshot files")
+
+    clock = sub.add_parser("clock", help="integer microsecond clock vs formatted datetime strings")
+    clock.add_argument("--count", type=int, default=200_000)
+
+    money = sub.add_parser("money", help="int-cents arithmetic vs float balances")
+    money.add_argument("--count", type=int, default=1_000_000)
+
+    batch = sub.add_parser("batch", help="bulk file ingestion throughput")
+    batch.add_argument("--count", type=int, default=100_000)
+    batch.add_argument("--accounts", type=int, default=1_000)
+
+    events = sub.add_parser("events", help="batch throughput with console, buffered and null event sinks")
+    events.add_argument("--count", type=int, default=100_000)
+    events.add_argument("--accounts", type=int, default=1_000)
+    events.add_argument("--rounds", type=int, default=3)
+
+    idempotency = sub.add_parser("idempotency", help="keyed request retries answered from the persisted receipt cache")
+    idempotency.add_argument("--count", type=int, default=20_000)
+    idempotency.add_argument("--accounts", type=int, default=1_000)
+    idempotency.add_argument("--threads", type=int, default=16)
+    idempotency.add_argument("--backend", choices=("sqlite",), help="storage backend instead of journal and snapshot files")
+
+    metrics = sub.add_parser("metrics", help="instrumentation overhead and per-operation latency percentiles")
+    metrics.add_argument("--count", type=int, default=100_000)
+    metrics.add_argument("--accounts", type=int, default=1_000)
+
+    stress = sub.add_parser("stress", help="concurrent random transfers; checks money conservation")
+    stress.add_argument("--count", type=int, default=20_000)
+    stress.add_argument("--accounts", type=int, default=20)
+    stress.add_argument("--threads", type=int, default=16)
+    stress.add_argument("--backend", choices=("sqlite",), help="storage backend instead of journal and snapshot files")
+
+    shards = sub.add_parser("shards", help="hash-sharded worker processes with two-phase cross-shard transfers; scaling and money conservation")
+    shards.add_argument("--shards", default="1,2,4", help="comma separated shard counts")
+    shards.add_argument("--count", type=int, default=10_000)
+    shards.add_argument("--accounts", type=int, default=200)
+    shards.add_argument("--threads", type=int, default=32)
+    shards.add_argument("--backend", choices=("sqlite",), help="storage backend instead of journal and snapshot files")
+
+    cold = sub.add_parser("cold-start", help="eager vs lazy load_data restart time")
+    cold.add_argument("--accounts", type=int, default=200_000)
+
+    wide = sub.add_parser("wide-load", help="load time for customers holding thousands of accounts")
+    wide.add_argument("--sizes", default="2500,5000,10000", help="comma-separated accounts per customer")
+    wide.add_argument("--customers", type=int, default=2)
+
+    cache = sub.add_parser("cache", help="bounded customer cache: hit rate, evictions and write-backs under skewed transfers")
+    cache.add_argument("--accounts", type=int, default=100_000)
+    cache.add_argument("--capacity", type=int, default=10_000)
+    cache.add_argument("--count", type=int, default=50_000)
+
+    formats = sub.add_parser("snapshot-formats", help="json vs binary columnar snapshot size, save and load time")
+    formats.add_argument("--sizes", default="10000,100000,1000000", help="comma separated account counts")
+
+    totals = sub.add_parser("totals", help="running customer/bank totals vs summing accounts on every read")
+    totals.add_argument("--accounts", type=int, default=500)
+    totals.add_argument("--reads", type=int, default=100_000)
+
+    close = sub.add_parser("period-close", help="end-of-period interest, fee and accrual run")
+    close.add_argument("--accounts", type=int, default=200_000)
+
+    loans = sub.add_parser("loan-report", help="portfolio delinquency/principal report and payoff quotes")
+    loans.add_argument("--loans", type=int, default=100_000)
+
+    loadgen = sub.add_parser("loadgen", help="json-lines server load generator (spawns a server unless --port is given)")
+    loadgen.add_argument("--host", default="127.0.0.1")
+    loadgen.add_argument("--port", type=int, default=0)
+    loadgen.add_argument("--connections", type=int, default=16)
+    loadgen.add_argument("--requests", type=int, default=2_000)
+    loadgen.add_argument("--pipeline", type=int, default=16)
+    loadgen.add_argument("--accounts", type=int, default=100)
+
+    args = parser.parse_args()
+    started = time.perf_counter()
+    if args.bench == "ledger-memory":
+        bench_ledger_memory(args.count)
+    elif args.bench == "statement":
+        if not bench_statement(args.entries, args.queries, args.backend):
+            sys.exit(1)
+    elif args.bench == "clock":
+        bench_clock(args.count)
+    elif args.bench == "money":
+        bench_money(args.count)
+    elif args.bench == "batch":
+        bench_batch(args.count, args.accounts)
+    elif args.bench == "shards":
+        if not bench_shards([int(n) for n in args.shards.split(",")], args.count, args.accounts, args.threads, args.backend):
+            sys.exit(1)
+    elif args.bench == "idempotency":
+        if not bench_idempotency(args.count, args.accounts, args.threads, args.backend):
+            sys.exit(1)
+    elif args.bench == "cold-start":
+        bench_cold_start(args.accounts)
+    elif args.bench == "wide-load":
+        bench_wide_load([int(size) for size in args.sizes.split(",")], args.customers)
+    elif args.bench == "cache":
+        if not bench_cache(args.accounts, args.capacity, args.count):
+            sys.exit(1)
+    elif args.bench == "snapshot-formats":
+        bench_snapshot_formats([int(size) for size in args.sizes.split(",")])
+    elif args.bench == "totals":
+        if not bench_totals(args.accounts, args.reads):
+            sys.exit(1)
+    elif args.bench == "period-close":
+        bench_period_close(args.accounts)
+    elif args.bench == "loan-report":
+        bench_loan_report(args.loans)
+    elif args.bench == "loadgen":
+        bench_loadgen(args.host, args.port, args.connections, args.requests, args.pipeline, args.accounts)
+    elif args.bench == "events":
+        bench_events(args.count, args.accounts, args.rounds)
+    elif args.bench == "metrics":
+        bench_metrics(args.count, args.accounts)
+    elif args.bench == "stress":
+        if not bench_stress(args.count, args.accounts, args.threads, args.backend):
+            sys.exit(1)
+    print(f"done in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
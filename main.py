@@ -1,9 +1,35 @@
 from abc import ABC, abstractmethod
+import argparse
+import array
+import asyncio
+import bisect
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, redirect_stdout
 from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache, wraps
+import csv
+import inspect
+import itertools
 import json
+import math
+import mmap
+import multiprocessing
 import os
-import random
 import re
+import signal
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class Customer:
@@ -13,24 +39,90 @@ class Customer:
         self.__email = email
         self.__phone = phone
         self.__address = address
-        self.__accounts_list = []
-        self.__date_joined = date_joined if date_joined else datetime.now().strftime("%Y-%m-%d")
+        self.__accounts = {}
+        self.__joined_us = Clock.parse(date_joined) if date_joined else CLOCK.now_us()
+        self.__total = 0
+        self.__totals = {}
+        self.__loans_outstanding = 0
+        self.__totals_lock = threading.Lock()
+        self.__aggregates = None
     
     def get_customer_id(self): return self.__customer_id
     def get_name(self): return self.__name
     def get_email(self): return self.__email
-    def get_accounts_list(self): return self.__accounts_list
+    def get_phone(self): return self.__phone
+    def get_date_joined(self): return Clock.format(self.__joined_us, "%Y-%m-%d")
+    def get_joined_us(self): return self.__joined_us
+    def get_accounts_list(self): return list(self.__accounts.values())
+    def get_account(self, account_number): return self.__accounts.get(account_number)
+    def get_account_count(self): return len(self.__accounts)
+    
+    def iter_accounts(self):
+        # live view in insertion order; callers that may race with add/remove take get_accounts_list()
+        return iter(self.__accounts.values())
     
     def add_account(self, account):
-        if account not in self.__accounts_list:
-            self.__accounts_list.append(account)
+        account_number = account.get_account_number()
+        current = self.__accounts.get(account_number)
+        if current is account:
+            return
+        if current is not None:
+            self.remove_account(current)
+        self.__accounts[account_number] = account
+        self._add_totals(account, 1)
+        account._set_tracked(True)
     
     def remove_account(self, account):
-        if account in self.__accounts_list:
-            self.__accounts_list.remove(account)
+        account_number = account.get_account_number()
+        if self.__accounts.get(account_number) is account:
+            del self.__accounts[account_number]
+            account._set_tracked(False)
+            self._add_totals(account, -1)
+    
+    def _add_totals(self, account, sign):
+        loan = account.get_remaining_balance_cents() if isinstance(account, LoanAccount) else 0
+        with self.__totals_lock:
+            self._apply_totals(account.__class__.__name__, sign * account.get_balance_cents(), sign * loan)
+    
+    def _apply_totals(self, account_type, delta, loan_delta):
+        self.__total += delta
+        self.__totals[account_type] = self.__totals.get(account_type, 0) + delta
+        self.__loans_outstanding += loan_delta
+    
+    def _attach_aggregates(self, aggregates): self.__aggregates = aggregates
+    
+    def _on_balance_change(self, account, delta, loan_delta):
+        # accounts push deltas as they change; totals are never summed on read
+        account_type = account.__class__.__name__
+        with self.__totals_lock:
+            self._apply_totals(account_type, delta, loan_delta)
+        if self.__aggregates is not None:
+            self.__aggregates.apply(account_type, delta, loan_delta)
+    
+    def get_total_balance(self): return self.__total / 100
+    def get_total_balance_cents(self): return self.__total
+    def get_loans_outstanding_cents(self): return self.__loans_outstanding
     
-    def get_total_balance(self):
-        return sum(acc.get_balance() for acc in self.__accounts_list)
+    def get_balance_breakdown(self):
+        with self.__totals_lock:
+            return dict(self.__totals)
+    
+    def verify_totals(self, repair=False):
+        expected = {}
+        loans = 0
+        for account in self.__accounts.values():
+            account_type = account.__class__.__name__
+            expected[account_type] = expected.get(account_type, 0) + account.get_balance_cents()
+            if isinstance(account, LoanAccount):
+                loans += account.get_remaining_balance_cents()
+        with self.__totals_lock:
+            actual = {account_type: cents for account_type, cents in self.__totals.items() if cents}
+            ok = actual == {account_type: cents for account_type, cents in expected.items() if cents} and self.__total == sum(expected.values()) and self.__loans_outstanding == loans
+            if not ok and repair:
+                self.__totals = expected
+                self.__total = sum(expected.values())
+                self.__loans_outstanding = loans
+        return ok
     
     def get_info(self):
         print(f"\n[1] id  [2] name  [3] email  [4] phone  [5] accounts  [6] total balance  [7] all")
@@ -45,10 +137,12 @@ class Customer:
         elif choice == "4":
             print(f"phone: {self.__phone}")
         elif choice == "5":
-            for acc in self.__accounts_list:
+            for acc in self.__accounts.values():
                 print(f"  {acc.get_account_number()}: ${acc.get_balance():.2f}")
         elif choice == "6":
             print(f"total: ${self.get_total_balance():.2f}")
+            for account_type, cents in sorted(self.get_balance_breakdown().items()):
+                print(f"  {account_type}: ${cents / 100:.2f}")
         elif choice == "7":
             print(f"id: {self.__customer_id} | name: {self.__name} | email: {self.__email} | phone: {self.__phone} | balance: ${self.get_total_balance():.2f}")
     
@@ -66,7 +160,7 @@ class Customer:
             "email": self.__email,
             "phone": self.__phone,
             "address": self.__address,
-            "date_joined": self.__date_joined
+            "date_joined": self.__joined_us
         }
     
     @classmethod
@@ -118,6 +212,7 @@ class CorporateCustomer(Customer):
         self.__tax_id = tax_id
     
     def get_company_name(self): return self.__company_name
+    def get_tax_id(self): return self.__tax_id
     
     def to_dict(self):
         data = super().to_dict()
@@ -137,69 +232,486 @@ class CorporateCustomer(Customer):
             data.get("date_joined")
         )
 
+class Money:
+    CENT = Decimal("0.01")
+    
+    @staticmethod
+    def to_cents(amount):
+        if type(amount) is int:
+            return amount * 100
+        # floats go through their shortest repr, so 1.005 rounds like "1.005" instead of like its binary value
+        if type(amount) is float:
+            amount = repr(amount)
+        return int(Decimal(str(amount)).quantize(Money.CENT, ROUND_HALF_UP) * 100)
+    
+    @staticmethod
+    def to_decimal(cents):
+        return Decimal(cents).scaleb(-2)
+    
+    @staticmethod
+    def apply_rate(cents, rate):
+        value = cents * rate
+        return int(value + 0.5) if value >= 0 else -int(0.5 - value)
+    
+    @staticmethod
+    def apply_rates(cents, rates, positive_only=False):
+        if np is None:
+            apply_rate = Money.apply_rate
+            if positive_only:
+                return [apply_rate(c, r) if c > 0 else 0 for c, r in zip(cents, rates)]
+            return [apply_rate(c, r) for c, r in zip(cents, rates)]
+        values = np.asarray(cents, dtype=np.int64) * np.asarray(rates, dtype=np.float64)
+        result = (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+        if positive_only:
+            result[values <= 0] = 0
+        return result.tolist()
+    
+    @staticmethod
+    def from_field(data, key, default_cents=0):
+        if key + "_cents" in data:
+            return data[key + "_cents"]
+        if data.get(key) is not None:
+            return Money.to_cents(data[key])
+        return default_cents
+
+class Clock:
+    # timestamps are integer epoch microseconds; text is produced only when something is displayed
+    def now_us(self):
+        return time.time_ns() // 1000
+    
+    def now(self):
+        return datetime.fromtimestamp(self.now_us() / 1_000_000)
+    
+    @staticmethod
+    def format(ts, fmt="%Y-%m-%d %H:%M:%S"):
+        return None if ts is None else datetime.fromtimestamp(ts / 1_000_000).strftime(fmt)
+    
+    @staticmethod
+    def parse(value):
+        # snapshots written before integer timestamps hold "yyyy-mm-dd[ hh:mm:ss]" strings
+        if value is None or isinstance(value, int):
+            return value
+        return int(datetime.fromisoformat(value).timestamp() * 1_000_000)
+
+
+class FixedClock(Clock):
+    def __init__(self, ts: int):
+        self.__ts = Clock.parse(ts)
+    
+    def now_us(self): return self.__ts
+    def set(self, ts): self.__ts = Clock.parse(ts)
+    def advance(self, us): self.__ts += us
+
+
+class SimulatedClock(Clock):
+    # every reading moves time forward by a fixed step, so replays get distinct, repeatable timestamps
+    def __init__(self, start: int, step_us: int = 1):
+        self.__ts = Clock.parse(start)
+        self.__step = step_us
+        self.__lock = threading.Lock()
+    
+    def now_us(self):
+        with self.__lock:
+            ts = self.__ts
+            self.__ts += self.__step
+            return ts
+    
+    def advance(self, us):
+        with self.__lock:
+            self.__ts += us
+
+
+class ClockSource:
+    def __init__(self, clock=None):
+        self.__clock = clock if clock is not None else Clock()
+    
+    def get_clock(self): return self.__clock
+    
+    def set_clock(self, clock):
+        previous = self.__clock
+        self.__clock = clock if clock is not None else Clock()
+        return previous
+    
+    @contextmanager
+    def using(self, clock):
+        previous = self.set_clock(clock)
+        try:
+            yield clock
+        finally:
+            self.set_clock(previous)
+    
+    def now_us(self): return self.__clock.now_us()
+    def now(self): return self.__clock.now()
+
+
+CLOCK = ClockSource()
+
+
+class LedgerEntry:
+    __slots__ = ("code", "ts", "amount", "balance_after", "principal", "interest", "description")
+    
+    TYPES = ["deposit", "withdrawal", "fee", "payment", "interest", "accrual"]
+    CODES = {name: code for code, name in enumerate(TYPES)}
+    
+    def __init__(self, code: int, ts: int, amount: int, balance_after: int = None, principal: int = None, interest: int = None, description: str = None):
+        self.code = code
+        self.ts = ts
+        self.amount = amount
+        self.balance_after = balance_after
+        self.principal = principal
+        self.interest = interest
+        self.description = description
+    
+    @classmethod
+    def create(cls, entry_type: str, amount_cents: int, balance_after_cents: int = None, principal_cents: int = None, interest_cents: int = None, description: str = None, ts: int = None):
+        return cls(cls.CODES[entry_type], ts if ts is not None else CLOCK.now_us(), amount_cents, balance_after_cents, principal_cents, interest_cents, description)
+    
+    def get_type(self): return self.TYPES[self.code]
+    def get_timestamp(self): return Clock.format(self.ts)
+    
+    def get_month(self): return self.month_of(self.ts)
+    
+    @staticmethod
+    def month_of(ts):
+        tm = time.localtime(ts // 1_000_000)
+        return f"{tm.tm_year}-{tm.tm_mon:02d}"
+    
+    def balance_delta(self):
+        # for entries without balance_after; a loan payment moves the balance by its principal, an accrual is a memo
+        entry_type = self.TYPES[self.code]
+        if entry_type in ("withdrawal", "fee"):
+            return -self.amount
+        if entry_type == "payment" and self.principal is not None:
+            return self.principal
+        if entry_type == "accrual":
+            return 0
+        return self.amount
+    
+    def to_dict(self):
+        # ts is the exact microsecond stamp; timestamp is only for reading
+        data = {"type": self.TYPES[self.code], "amount": self.amount / 100, "ts": self.ts, "timestamp": self.get_timestamp()}
+        if self.balance_after is not None:
+            data["balance_after"] = self.balance_after / 100
+        if self.principal is not None:
+            data["principal"] = self.principal / 100
+        if self.interest is not None:
+            data["interest"] = self.interest / 100
+        if self.description is not None:
+            data["description"] = self.description
+        return data
+    
+    @classmethod
+    def from_dict(cls, data):
+        # exports written before ts was kept only have the second-resolution text
+        ts = data["ts"] if data.get("ts") is not None else Clock.parse(data["timestamp"])
+        return cls(
+            cls.CODES[data["type"]],
+            ts,
+            Money.to_cents(data["amount"]),
+            None if data.get("balance_after") is None else Money.to_cents(data["balance_after"]),
+            None if data.get("principal") is None else Money.to_cents(data["principal"]),
+            None if data.get("interest") is None else Money.to_cents(data["interest"]),
+            data.get("description")
+        )
+    
+    def to_row(self):
+        row = [self.code, self.ts, self.amount, self.balance_after, self.principal, self.interest, self.description]
+        while row[-1] is None:
+            row.pop()
+        return row
+    
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+    
+    def __eq__(self, other):
+        return isinstance(other, LedgerEntry) and self.to_row() == other.to_row()
+    
+    def __repr__(self):
+        return f"LedgerEntry({self.to_dict()})"
+
+class Event:
+    # fields stay raw (cents, ids) until a sink asks for text
+    __slots__ = ("kind", "ts", "fields")
+    
+    RENDERERS = {
+        "deposit": lambda f: f"deposited ${f['amount_cents'] / 100:.2f}. balance: ${f['balance_cents'] / 100:.2f}",
+        "withdrawal": lambda f: f"withdrew ${f['amount_cents'] / 100:.2f}. balance: ${f['balance_cents'] / 100:.2f}",
+        "overdraft_fee": lambda f: f"overdraft fee: ${f['fee_cents'] / 100:.2f}",
+        "payment_adjusted": lambda f: f"note: payment ${f['amount_cents'] / 100:.2f} exceeds balance. adjusting to ${f['remaining_cents'] / 100:.2f}",
+        "loan_payment": lambda f: (
+            f"payment: ${f['amount_cents'] / 100:.2f} (principal: ${f['principal_cents'] / 100:.2f}, interest: ${f['interest_cents'] / 100:.2f})\n"
+            f"  remaining: ${f['remaining_cents'] / 100:.2f}"
+        ),
+        "transfer": lambda f: f"transfer: ${f['amount_cents'] / 100:.2f} from {f['account']} to {f['to_account']}",
+        "account_opened": lambda f: f"{f['account_type']} account created: {f['account']}",
+        "shared_email": lambda f: f"warning: customer {f['customer']} shares email with {f['other']}",
+        "orphan_account": lambda f: f"warning: account {f['account']} has invalid holder_id {f['holder']}",
+        "unknown_account_type": lambda f: f"warning: unknown account type {f['account_type']}",
+        "checkpoint_failed": lambda f: f"checkpoint failed: {f['error']}",
+        "export_failed": lambda f: f"export failed: {f['error']}",
+        "load_failed": lambda f: f"load failed: {f['error']}"
+    }
+    
+    def __init__(self, kind: str, ts: int, fields: dict):
+        self.kind = kind
+        self.ts = ts
+        self.fields = fields
+    
+    def render(self):
+        return self.RENDERERS[self.kind](self.fields)
+    
+    def to_dict(self):
+        data = {"ts": self.ts, "kind": self.kind}
+        data.update(self.fields)
+        return data
+
+
+class EventSink(ABC):
+    # a disabled sink is skipped before the event is even built
+    enabled = True
+    
+    @abstractmethod
+    def emit(self, event):
+        pass
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.flush()
+
+
+class NullSink(EventSink):
+    enabled = False
+    
+    def emit(self, event):
+        pass
+
+
+class ConsoleSink(EventSink):
+    def __init__(self, stream=None):
+        self.__stream = stream
+    
+    def emit(self, event):
+        # sys.stdout is looked up per event so redirect_stdout still captures the repl output
+        print(event.render(), file=self.__stream or sys.stdout)
+
+
+class BufferedSink(EventSink):
+    def __init__(self, path: str, format: str = "json", flush_interval: float = 0.2, max_pending: int = 100_000):
+        self.__file = open(path, "a", encoding="utf-8")
+        self.__format = format
+        self.__encoder = json.JSONEncoder(separators=(",", ":"))
+        self.__flush_interval = flush_interval
+        self.__max_pending = max_pending
+        self.__pending = []
+        self.__accepted = 0
+        self.__flush_requested = 0
+        self.__written = 0
+        self.__dropped = 0
+        self.__closed = False
+        self.__condition = threading.Condition()
+        self.__thread = threading.Thread(target=self._run, name="events", daemon=True)
+        self.__thread.start()
+    
+    def emit(self, event):
+        with self.__condition:
+            if len(self.__pending) >= self.__max_pending:
+                self.__dropped += 1
+                return
+            self.__pending.append(event)
+            self.__accepted += 1
+    
+    def _run(self):
+        while True:
+            with self.__condition:
+                # sleep out the interval so events are rendered and written in large batches
+                if not self.__closed and self.__flush_requested <= self.__written:
+                    self.__condition.wait(self.__flush_interval)
+                batch = self.__pending
+                self.__pending = []
+                closed = self.__closed
+            if batch:
+                self._write(batch)
+            if closed and not batch:
+                return
+    
+    def _write(self, batch):
+        # rendering happens here, on the writer thread, never on the operation that emitted
+        if self.__format == "json":
+            encode = self.__encoder.encode
+            lines = [encode(event.to_dict()) for event in batch]
+        else:
+            lines = [event.render() for event in batch]
+        self.__file.write("\n".join(lines) + "\n")
+        self.__file.flush()
+        with self.__condition:
+            self.__written += len(batch)
+            self.__condition.notify_all()
+    
+    def get_stats(self):
+        with self.__condition:
+            return {"written": self.__written, "pending": len(self.__pending), "dropped": self.__dropped}
+    
+    def flush(self):
+        with self.__condition:
+            self.__flush_requested = self.__accepted
+            self.__condition.notify_all()
+            self.__condition.wait_for(lambda: self.__written >= self.__accepted)
+    
+    def close(self):
+        with self.__condition:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__thread.join()
+        self.__file.close()
+
+
+class EventBus:
+    def __init__(self, sink=None):
+        self.__sink = sink if sink is not None else ConsoleSink()
+    
+    def get_sink(self): return self.__sink
+    
+    def set_sink(self, sink):
+        previous = self.__sink
+        self.__sink = sink if sink is not None else NullSink()
+        return previous
+    
+    def emit(self, kind, **fields):
+        sink = self.__sink
+        if sink.enabled:
+            sink.emit(Event(kind, CLOCK.now_us(), fields))
+
+
+EVENTS = EventBus()
+
+
 class Account(ABC):
+    RECENT_TAIL = 20
+    
     def __init__(self, account_number: str, account_holder, initial_balance: float = 0.0):
         self.__account_number = account_number
-        self.__balance = initial_balance
+        self.__balance = Money.to_cents(initial_balance)
         self.__account_holder = account_holder
-        self.__date_opened = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.__transaction_history = []
+        self.__opened_us = CLOCK.now_us()
+        self.__ledger = None
+        self.__recent = deque()
+        self.__tail_loaded = True
+        self.__unlogged = []
         self.__status = "active"
+        self.__lock = threading.RLock()
+        self.__tracked = False
     
     def get_account_number(self): return self.__account_number
-    def get_balance(self): return self.__balance
+    def get_lock(self): return self.__lock
+    def get_balance(self): return self.__balance / 100
+    def get_balance_cents(self): return self.__balance
     def get_account_holder(self): return self.__account_holder
     def get_status(self): return self.__status
     
-    def _set_balance(self, amount): self.__balance = amount
-    def _add_transaction(self, transaction_dict): self.__transaction_history.append(transaction_dict)
-    def _set_transaction_history(self, history): self.__transaction_history = history
-    def _set_date_opened(self, date_str): self.__date_opened = date_str
+    def get_transaction_history(self):
+        if self.__ledger is None:
+            return list(self.__recent)
+        return self.__ledger.read(self.__account_number) + self.__unlogged
+    
+    def query_history(self, start_us=None, end_us=None):
+        # entries in [start_us, end_us) in time order; the ledger part streams, so callers hold the lock only while this returns
+        low = -2 ** 63 if start_us is None else start_us
+        high = 2 ** 63 - 1 if end_us is None else end_us
+        if self.__ledger is None:
+            return iter(sorted((entry for entry in self.__recent if low <= entry.ts < high), key=lambda entry: entry.ts))
+        unlogged = sorted((entry for entry in self.__unlogged if low <= entry.ts < high), key=lambda entry: entry.ts)
+        return itertools.chain(self.__ledger.query(self.__account_number, start_us, end_us), unlogged)
+    
+    def get_recent_transactions(self, count: int = 10):
+        if not self.__tail_loaded:
+            history = self.__ledger.read(self.__account_number, last=self.RECENT_TAIL) + self.__unlogged
+            self.__recent = deque(history, maxlen=self.RECENT_TAIL)
+            self.__tail_loaded = True
+        return list(self.__recent)[-count:]
+    
+    def _set_balance_cents(self, cents):
+        delta = cents - self.__balance
+        self.__balance = cents
+        if delta and self.__tracked:
+            self.__account_holder._on_balance_change(self, delta, 0)
+    
+    def _set_tracked(self, tracked): self.__tracked = tracked
+    
+    def _push_loan_delta(self, loan_delta):
+        if loan_delta and self.__tracked:
+            self.__account_holder._on_balance_change(self, 0, loan_delta)
+    
+    def _add_transaction(self, entry):
+        self.__recent.append(entry)
+        self.__unlogged.append(entry)
+    
+    def _set_transaction_history(self, history):
+        history = [LedgerEntry.from_dict(entry) if isinstance(entry, dict) else entry for entry in history]
+        self.__recent = deque(history, maxlen=self.__recent.maxlen)
+        self.__unlogged = list(history)
+    
+    def _take_unlogged_transactions(self):
+        new_entries = self.__unlogged
+        self.__unlogged = []
+        return new_entries
+    
+    def _attach_ledger(self, ledger):
+        self.__ledger = ledger
+        self.__recent = deque(maxlen=self.RECENT_TAIL)
+        self.__tail_loaded = False
+    
+    def get_date_opened(self): return Clock.format(self.__opened_us)
+    def get_opened_us(self): return self.__opened_us
+    def _set_date_opened(self, value): self.__opened_us = Clock.parse(value)
     def _set_status(self, status): self.__status = status
     
     @abstractmethod
-    def calculate_interest(self):
+    def calculate_interest_cents(self):
         pass
     
+    def calculate_interest(self):
+        return self.calculate_interest_cents() / 100
+    
     def deposit(self, amount):
+        return self.deposit_cents(Money.to_cents(amount))
+    
+    def withdraw(self, amount):
+        return self.withdraw_cents(Money.to_cents(amount))
+    
+    def deposit_cents(self, cents):
         if self.__status != "active":
             raise Exception(f"account is {self.__status}")
-        if amount <= 0:
+        if cents <= 0:
             raise ValueError("amount must be positive")
         
-        self.__balance += amount
-        self.__transaction_history.append({
-            "type": "deposit",
-            "amount": amount,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "balance_after": self.__balance
-        })
-        print(f"deposited ${amount:.2f}. balance: ${self.__balance:.2f}")
+        self._set_balance_cents(self.__balance + cents)
+        self._add_transaction(LedgerEntry.create("deposit", cents, self.__balance))
+        EVENTS.emit("deposit", account=self.__account_number, amount_cents=cents, balance_cents=self.__balance)
         return True
     
-    def withdraw(self, amount):
+    def withdraw_cents(self, cents):
         if self.__status != "active":
             raise Exception(f"account is {self.__status}")
-        if amount <= 0:
+        if cents <= 0:
             raise ValueError("amount must be positive")
-        if amount > self.__balance:
+        if cents > self.__balance:
             raise ValueError("insufficient funds")
         
-        self.__balance -= amount
-        self.__transaction_history.append({
-            "type": "withdrawal",
-            "amount": amount,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "balance_after": self.__balance
-        })
-        print(f"withdrew ${amount:.2f}. balance: ${self.__balance:.2f}")
+        self._set_balance_cents(self.__balance - cents)
+        self._add_transaction(LedgerEntry.create("withdrawal", cents, self.__balance))
+        EVENTS.emit("withdrawal", account=self.__account_number, amount_cents=cents, balance_cents=self.__balance)
         return True
     
     def view_balance(self):
-        print(f"account: {self.__account_number} | holder: {self.__account_holder.get_name()} | balance: ${self.__balance:.2f}")
+        print(f"account: {self.__account_number} | holder: {self.__account_holder.get_name()} | balance: ${self.__balance / 100:.2f}")
     
     def __str__(self):
-        return f"{self.__class__.__name__} #{self.__account_number}: ${self.__balance:.2f}"
+        return f"{self.__class__.__name__} #{self.__account_number}: ${self.__balance / 100:.2f}"
     
     def __gt__(self, other):
         return isinstance(other, Account) and self.__balance > other.__balance
@@ -207,44 +719,48 @@ class Account(ABC):
     def __lt__(self, other):
         return isinstance(other, Account) and self.__balance < other.__balance
     
-    def to_dict(self):
-        return {
+    def to_dict(self, include_history=False):
+        data = {
             "account_number": self.__account_number,
             "account_type": self.__class__.__name__,
-            "balance": self.__balance,
+            "balance_cents": self.__balance,
             "holder_id": self.__account_holder.get_customer_id(),
-            "date_opened": self.__date_opened,
-            "status": self.__status,
-            "transaction_history": self.__transaction_history
+            "date_opened": self.__opened_us,
+            "status": self.__status
         }
+        if include_history:
+            data["transaction_history"] = [entry.to_dict() for entry in self.get_transaction_history()]
+        return data
 
 class SavingsAccount(Account):
     def __init__(self, account_number: str, account_holder, initial_balance: float = 0.0):
         super().__init__(account_number, account_holder, initial_balance)
         self.__interest_rate = 0.03
-        self.__minimum_balance = 500.0
+        self.__minimum_balance = 50000
         self.__withdrawal_limit = 2
         self.__current_withdrawal_count = 0
     
-    def calculate_interest(self):
-        balance = self.get_balance()
-        return balance * self.__interest_rate if balance > 0 else 0.0
+    def get_interest_rate(self): return self.__interest_rate
     
-    def withdraw(self, amount):
+    def calculate_interest_cents(self):
+        balance = self.get_balance_cents()
+        return Money.apply_rate(balance, self.__interest_rate) if balance > 0 else 0
+    
+    def withdraw_cents(self, cents):
         if self.__current_withdrawal_count >= self.__withdrawal_limit:
             raise Exception(f"withdrawal limit ({self.__withdrawal_limit}) reached")
-        if self.get_balance() - amount < self.__minimum_balance:
-            raise ValueError(f"minimum balance ${self.__minimum_balance} required")
+        if self.get_balance_cents() - cents < self.__minimum_balance:
+            raise ValueError(f"minimum balance ${self.__minimum_balance / 100} required")
         
-        super().withdraw(amount)
+        super().withdraw_cents(cents)
         self.__current_withdrawal_count += 1
         return True
     
-    def to_dict(self):
-        data = super().to_dict()
+    def to_dict(self, include_history=False):
+        data = super().to_dict(include_history)
         data.update({
             "interest_rate": self.__interest_rate,
-            "minimum_balance": self.__minimum_balance,
+            "minimum_balance_cents": self.__minimum_balance,
             "withdrawal_limit": self.__withdrawal_limit,
             "current_withdrawal_count": self.__current_withdrawal_count
         })
@@ -255,68 +771,75 @@ class SavingsAccount(Account):
     
     @classmethod
     def from_dict(cls, data, account_holder):
-        account = cls(data["account_number"], account_holder, data["balance"])
-        account._set_balance(data["balance"])
-        account._set_date_opened(data.get("date_opened", datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        account = cls(data["account_number"], account_holder)
+        account._set_balance_cents(Money.from_field(data, "balance"))
+        if data.get("date_opened") is not None:
+            account._set_date_opened(data["date_opened"])
         account._set_status(data.get("status", "active"))
         account._set_withdrawal_count(data.get("current_withdrawal_count", 0))
         account._set_transaction_history(data.get("transaction_history", []))
         return account
 
 class CheckingAccount(Account):
+    INTEREST_RATE = 0.001
+    
     def __init__(self, account_number: str, account_holder, initial_balance: float = 0.0, overdraft_limit: float = 500.0):
         super().__init__(account_number, account_holder, initial_balance)
-        self.__overdraft_limit = overdraft_limit
-        self.__monthly_fee = 10.0
+        self.__overdraft_limit = Money.to_cents(overdraft_limit)
+        self.__monthly_fee = 1000
     
     def get_total_spendable_balance(self):
-        return self.get_balance() + self.__overdraft_limit
+        return self.get_total_spendable_balance_cents() / 100
     
-    def calculate_interest(self):
-        balance = self.get_balance()
-        return balance * 0.001 if balance > 0 else 0.0
+    def get_total_spendable_balance_cents(self):
+        return self.get_balance_cents() + self.__overdraft_limit
     
-    def withdraw(self, amount):
+    def get_monthly_fee_cents(self): return self.__monthly_fee
+    
+    def calculate_interest_cents(self):
+        balance = self.get_balance_cents()
+        return Money.apply_rate(balance, self.INTEREST_RATE) if balance > 0 else 0
+    
+    def withdraw_cents(self, cents):
         if self.get_status() != "active":
             raise Exception(f"account is {self.get_status()}")
-        if amount <= 0:
+        if cents <= 0:
             raise ValueError("amount must be positive.")
         
-        balance_after = self.get_balance() - amount
+        current_balance = self.get_balance_cents()
+        balance_after = current_balance - cents
         if balance_after < -self.__overdraft_limit:
             raise ValueError(f"insufficient funds. available: ${self.get_total_spendable_balance():.2f}")
         
-        current_balance = self.get_balance()
-        self._set_balance(balance_after)
+        self._set_balance_cents(balance_after)
+        self._add_transaction(LedgerEntry.create("withdrawal", cents, balance_after))
+        EVENTS.emit("withdrawal", account=self.get_account_number(), amount_cents=cents, balance_cents=balance_after)
         
+        # the fee is its own entry after the withdrawal, so each row's balance is the balance right after it
         if current_balance >= 0 and balance_after < 0:
-            overdraft_fee = 35.0
-            self._set_balance(self.get_balance() - overdraft_fee)
-            self._add_transaction({
-                "type": "fee", 
-                "amount": overdraft_fee, 
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "description": "overdraft fee"
-            })
-            print(f"overdraft fee: ${overdraft_fee:.2f}")
-        
-        self._add_transaction({"type": "withdrawal", "amount": amount, "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
-        print(f"withdrew ${amount:.2f}. balance: ${self.get_balance():.2f}")
+            overdraft_fee = 3500
+            self._set_balance_cents(balance_after - overdraft_fee)
+            self._add_transaction(LedgerEntry.create("fee", overdraft_fee, balance_after - overdraft_fee, description="overdraft fee"))
+            EVENTS.emit("overdraft_fee", account=self.get_account_number(), fee_cents=overdraft_fee)
         return True
     
-    def to_dict(self):
-        data = super().to_dict()
+    def to_dict(self, include_history=False):
+        data = super().to_dict(include_history)
         data.update({
-            "overdraft_limit": self.__overdraft_limit,
-            "monthly_fee": self.__monthly_fee
+            "overdraft_limit_cents": self.__overdraft_limit,
+            "monthly_fee_cents": self.__monthly_fee
         })
         return data
     
+    def _set_overdraft_limit_cents(self, cents): self.__overdraft_limit = cents
+    
     @classmethod
     def from_dict(cls, data, account_holder):
-        account = cls(data["account_number"], account_holder, data["balance"], data.get("overdraft_limit", 500.0))
-        account._set_balance(data["balance"])
-        account._set_date_opened(data.get("date_opened", datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        account = cls(data["account_number"], account_holder)
+        account._set_balance_cents(Money.from_field(data, "balance"))
+        account._set_overdraft_limit_cents(Money.from_field(data, "overdraft_limit", 50000))
+        if data.get("date_opened") is not None:
+            account._set_date_opened(data["date_opened"])
         account._set_status(data.get("status", "active"))
         account._set_transaction_history(data.get("transaction_history", []))
         return account
@@ -324,92 +847,285 @@ class CheckingAccount(Account):
 class LoanAccount(Account):
     def __init__(self, account_number: str, account_holder, loan_amount: float, interest_rate: float = 0.08, loan_term_months: int = 24):
         super().__init__(account_number, account_holder, -loan_amount)
-        self.__loan_amount = loan_amount
+        self.__loan_amount = Money.to_cents(loan_amount)
         self.__interest_rate = interest_rate
         self.__loan_term_months = loan_term_months
-        self.__remaining_balance = loan_amount
+        self.__remaining_balance = self.__loan_amount
         self.__monthly_payment = self._calculate_monthly_payment()
         self.__payments_made = 0
+        self.__last_payment_us = None
+        self.__schedule = None
+        self.__schedule_position = 0
+    
+    def get_interest_rate(self): return self.__interest_rate
+    def get_remaining_balance_cents(self): return self.__remaining_balance
+    def get_loan_amount_cents(self): return self.__loan_amount
+    def get_loan_term_months(self): return self.__loan_term_months
+    def get_monthly_payment_cents(self): return self.__monthly_payment
+    def get_payments_made(self): return self.__payments_made
+    def get_last_payment_date(self): return Clock.format(self.__last_payment_us, "%Y-%m-%d")
+    def get_last_payment_us(self): return self.__last_payment_us
     
     def _calculate_monthly_payment(self):
-        if self.__interest_rate == 0:
-            return self.__loan_amount / self.__loan_term_months
-        monthly_rate = self.__interest_rate / 12
-        payment = self.__loan_amount * (monthly_rate * (1 + monthly_rate)**self.__loan_term_months) / ((1 + monthly_rate)**self.__loan_term_months - 1)
-        return round(payment, 2)
+        return LoanAnalytics.monthly_payment(self.__loan_amount, self.__interest_rate, self.__loan_term_months)
     
-    def calculate_interest(self):
-        return round(self.__remaining_balance * (self.__interest_rate / 12), 2)
+    def get_schedule(self):
+        # rows of (payment, interest, principal, remaining) still ahead of this loan
+        if self.__schedule is None:
+            remaining_term = max(self.__loan_term_months - self.__payments_made, 1)
+            self.__schedule = LoanAnalytics.schedule(self.__remaining_balance, self.__interest_rate, remaining_term, self.__monthly_payment)
+            self.__schedule_position = 0
+        return self.__schedule, self.__schedule_position
     
-    def deposit(self, amount):
-        if amount > self.__remaining_balance:
-            print(f"note: payment ${amount:.2f} exceeds balance. adjusting to ${self.__remaining_balance:.2f}")
-            amount = self.__remaining_balance
+    def _advance_schedule(self):
+        # an on-schedule payment just moves the cursor; anything else re-keys the cached schedule
+        if self.__schedule is not None:
+            position = self.__schedule_position
+            if position < len(self.__schedule) and self.__schedule[position][3] == self.__remaining_balance:
+                self.__schedule_position = position + 1
+            else:
+                self.__schedule = None
+    
+    def calculate_interest_cents(self):
+        return Money.apply_rate(self.__remaining_balance, self.__interest_rate / 12)
+    
+    def deposit_cents(self, cents):
+        if cents > self.__remaining_balance:
+            EVENTS.emit("payment_adjusted", account=self.get_account_number(), amount_cents=cents, remaining_cents=self.__remaining_balance)
+            cents = self.__remaining_balance
 
-        if amount < self.__monthly_payment and amount < self.__remaining_balance:
-            raise ValueError(f"minimum payment: ${self.__monthly_payment:.2f}")
+        if cents < self.__monthly_payment and cents < self.__remaining_balance:
+            raise ValueError(f"minimum payment: ${self.__monthly_payment / 100:.2f}")
         
-        interest_portion = self.calculate_interest()
-        principal_portion = amount - interest_portion
+        interest_portion = self.calculate_interest_cents()
+        principal_portion = cents - interest_portion
         
+        remaining_before = self.__remaining_balance
         self.__remaining_balance -= principal_portion
         
         if self.__remaining_balance < 0:
-            self.__remaining_balance = 0.0
+            self.__remaining_balance = 0
         
-        self._set_balance(self.get_balance() + principal_portion)
+        self._push_loan_delta(self.__remaining_balance - remaining_before)
+        self._set_balance_cents(self.get_balance_cents() + principal_portion)
         self.__payments_made += 1
+        self.__last_payment_us = CLOCK.now_us()
+        self._advance_schedule()
         
-        self._add_transaction({"type": "payment", "amount": amount, "principal": principal_portion, "interest": interest_portion, "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
-        print(f"payment: ${amount:.2f} (principal: ${principal_portion:.2f}, interest: ${interest_portion:.2f})")
-        print(f"  remaining: ${self.__remaining_balance:.2f}")
+        self._add_transaction(LedgerEntry.create("payment", cents, self.get_balance_cents(), principal_portion, interest_portion))
+        EVENTS.emit("loan_payment", account=self.get_account_number(), amount_cents=cents, principal_cents=principal_portion, interest_cents=interest_portion, remaining_cents=self.__remaining_balance)
         return True
     
-    def withdraw(self, amount):
+    def withdraw_cents(self, cents):
         raise Exception("cannot withdraw from loan account")
     
-    def to_dict(self):
-        data = super().to_dict()
+    def to_dict(self, include_history=False):
+        data = super().to_dict(include_history)
         data.update({
-            "loan_amount": self.__loan_amount,
+            "loan_amount_cents": self.__loan_amount,
             "interest_rate": self.__interest_rate,
             "loan_term_months": self.__loan_term_months,
-            "remaining_balance": self.__remaining_balance,
-            "monthly_payment": self.__monthly_payment,
-            "payments_made": self.__payments_made
+            "remaining_balance_cents": self.__remaining_balance,
+            "monthly_payment_cents": self.__monthly_payment,
+            "payments_made": self.__payments_made,
+            "last_payment_date": self.__last_payment_us
         })
         return data
     
-    def _set_remaining_balance(self, balance): self.__remaining_balance = balance
-    def _set_payments_made(self, count): self.__payments_made = count
+    def _set_remaining_balance_cents(self, cents):
+        self._push_loan_delta(cents - self.__remaining_balance)
+        self.__remaining_balance = cents
+        self.__schedule = None
+    
+    def _set_payments_made(self, count):
+        self.__payments_made = count
+        self.__schedule = None
+    
+    def _set_last_payment_date(self, value): self.__last_payment_us = Clock.parse(value)
     
     @classmethod
     def from_dict(cls, data, account_holder):
-        loan_amount = data.get("loan_amount", abs(data["balance"]))
+        balance = Money.from_field(data, "balance")
+        loan_amount = Money.from_field(data, "loan_amount", abs(balance))
         account = cls(
             data["account_number"],
             account_holder,
-            loan_amount,
+            loan_amount / 100,
             data.get("interest_rate", 0.08),
             data.get("loan_term_months", 24)
         )
-        account._set_balance(data["balance"])
-        account._set_date_opened(data.get("date_opened", datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        account._set_balance_cents(balance)
+        if data.get("date_opened") is not None:
+            account._set_date_opened(data["date_opened"])
         account._set_status(data.get("status", "active"))
-        account._set_remaining_balance(data.get("remaining_balance", loan_amount))
+        account._set_remaining_balance_cents(Money.from_field(data, "remaining_balance", loan_amount))
         account._set_payments_made(data.get("payments_made", 0))
+        account._set_last_payment_date(data.get("last_payment_date"))
         account._set_transaction_history(data.get("transaction_history", []))
         return account
 
+class LoanAnalytics:
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def monthly_payment(principal_cents, annual_rate, term_months):
+        if annual_rate == 0:
+            return Money.apply_rate(principal_cents, 1 / term_months)
+        monthly_rate = annual_rate / 12
+        growth = (1 + monthly_rate) ** term_months
+        return Money.apply_rate(principal_cents, monthly_rate * growth / (growth - 1))
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def schedule(principal_cents, annual_rate, term_months, payment_cents=None):
+        payment = payment_cents if payment_cents is not None else LoanAnalytics.monthly_payment(principal_cents, annual_rate, term_months)
+        monthly_rate = annual_rate / 12
+        remaining = principal_cents
+        rows = []
+        for month in range(term_months):
+            interest = Money.apply_rate(remaining, monthly_rate)
+            # the last installment clears whatever rounding left behind
+            due = remaining + interest if month == term_months - 1 else min(payment, remaining + interest)
+            principal = due - interest
+            remaining -= principal
+            rows.append((due, interest, principal, remaining))
+            if remaining <= 0:
+                break
+        return tuple(rows)
+    
+    @staticmethod
+    def scheduled_remaining(principals, rates, terms, payments, months):
+        if np is None:
+            remaining = []
+            for principal, rate, term, payment, k in zip(principals, rates, terms, payments, months):
+                if k <= 0:
+                    remaining.append(principal)
+                    continue
+                rows = LoanAnalytics.schedule(principal, rate, term, payment)
+                remaining.append(rows[k - 1][3] if k <= len(rows) else 0)
+            return remaining
+        # walk every loan's rounded schedule in lockstep, one month per step
+        remaining = np.asarray(principals, dtype=np.int64)
+        rates = np.asarray(rates, dtype=np.float64) / 12
+        terms = np.asarray(terms, dtype=np.int64)
+        payments = np.asarray(payments, dtype=np.int64)
+        months = np.asarray(months, dtype=np.int64)
+        for month in range(int(months.max(initial=0))):
+            values = remaining * rates
+            interest = (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+            owed = remaining + interest
+            due = np.where(terms == month + 1, owed, np.minimum(payments, owed))
+            active = (months > month) & (remaining > 0)
+            remaining = np.where(active, remaining - (due - interest), remaining)
+        return remaining.tolist()
+    
+    @staticmethod
+    def _as_date(value):
+        if value is None:
+            return CLOCK.now()
+        if isinstance(value, str):
+            return datetime.strptime(value[:10], "%Y-%m-%d")
+        if isinstance(value, int):
+            return datetime.fromtimestamp(value / 1_000_000).replace(hour=0, minute=0, second=0, microsecond=0)
+        return value
+    
+    @staticmethod
+    def months_between(start, end):
+        start, end = LoanAnalytics._as_date(start), LoanAnalytics._as_date(end)
+        months = (end.year - start.year) * 12 + end.month - start.month
+        if end.day < start.day:
+            months -= 1
+        return max(months, 0)
+    
+    @staticmethod
+    def payoff_quote(loan, as_of=None):
+        as_of = LoanAnalytics._as_date(as_of)
+        since = LoanAnalytics._as_date(loan.get_last_payment_us() or loan.get_opened_us())
+        days = max((as_of - since).days, 0)
+        remaining = loan.get_remaining_balance_cents()
+        interest = Money.apply_rate(remaining, loan.get_interest_rate() * days / 365)
+        return {"principal_cents": remaining, "interest_cents": interest, "payoff_cents": remaining + interest, "as_of": as_of.strftime("%Y-%m-%d")}
+    
+    @staticmethod
+    def portfolio_report(loans, as_of=None):
+        as_of = LoanAnalytics._as_date(as_of)
+        loans = [loan for loan in loans if loan.get_remaining_balance_cents() > 0]
+        elapsed = [min(LoanAnalytics.months_between(loan.get_opened_us(), as_of), loan.get_loan_term_months()) for loan in loans]
+        scheduled = LoanAnalytics.scheduled_remaining(
+            [loan.get_loan_amount_cents() for loan in loans],
+            [loan.get_interest_rate() for loan in loans],
+            [loan.get_loan_term_months() for loan in loans],
+            [loan.get_monthly_payment_cents() for loan in loans],
+            elapsed
+        )
+        delinquent = []
+        for loan, due, expected in zip(loans, elapsed, scheduled):
+            behind = due - loan.get_payments_made()
+            if behind > 0:
+                delinquent.append({
+                    "account_number": loan.get_account_number(),
+                    "payments_behind": behind,
+                    "past_due_cents": behind * loan.get_monthly_payment_cents(),
+                    "remaining_cents": loan.get_remaining_balance_cents(),
+                    "scheduled_remaining_cents": expected
+                })
+        delinquent.sort(key=lambda row: -row["payments_behind"])
+        return {
+            "as_of": as_of.strftime("%Y-%m-%d"),
+            "loans": len(loans),
+            "remaining_principal_cents": sum(loan.get_remaining_balance_cents() for loan in loans),
+            "scheduled_principal_cents": sum(scheduled),
+            "past_due_cents": sum(row["past_due_cents"] for row in delinquent),
+            "delinquent": delinquent
+        }
+    
+    @staticmethod
+    def merge_reports(reports):
+        merged = {"as_of": reports[0]["as_of"], "loans": 0, "remaining_principal_cents": 0, "scheduled_principal_cents": 0, "past_due_cents": 0, "delinquent": []}
+        for report in reports:
+            for key in ("loans", "remaining_principal_cents", "scheduled_principal_cents", "past_due_cents"):
+                merged[key] += report[key]
+            merged["delinquent"].extend(report["delinquent"])
+        merged["delinquent"].sort(key=lambda row: -row["payments_behind"])
+        return merged
+
+
+class AccountLocks:
+    __slots__ = ("locks",)
+    
+    def __init__(self, accounts):
+        # always lock in account-number order so two transfers over the same pair cannot deadlock
+        ordered = {account.get_account_number(): account for account in accounts}
+        self.locks = [ordered[number].get_lock() for number in sorted(ordered)]
+    
+    def __enter__(self):
+        acquired = []
+        try:
+            for lock in self.locks:
+                lock.acquire()
+                acquired.append(lock)
+        except BaseException:
+            for lock in reversed(acquired):
+                lock.release()
+            raise
+        return self
+    
+    def __exit__(self, *exc):
+        for lock in reversed(self.locks):
+            lock.release()
+        return False
+
 class Transaction(ABC):
     def __init__(self, transaction_id: str, amount: float):
         self.__transaction_id = transaction_id
-        self.__amount = amount
-        self.__timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.__amount = Money.to_cents(amount)
+        self.__ts = CLOCK.now_us()
         self.__status = "pending"
     
     def get_transaction_id(self): return self.__transaction_id
-    def get_amount(self): return self.__amount
+    def get_amount(self): return self.__amount / 100
+    def get_amount_cents(self): return self.__amount
+    def get_timestamp(self): return Clock.format(self.__ts)
+    def get_ts(self): return self.__ts
     def get_status(self): return self.__status
     def _set_status(self, status): self.__status = status
     
@@ -424,8 +1140,14 @@ class Transaction(ABC):
     def __lt__(self, other):
         return isinstance(other, Transaction) and self.__amount < other.__amount
     
+    @staticmethod
+    def lock_accounts(*accounts):
+        if len(accounts) == 1:
+            return accounts[0].get_lock()
+        return AccountLocks(accounts)
+    
     def __str__(self):
-        return f"{self.__class__.__name__} #{self.__transaction_id}: ${self.__amount:.2f}"
+        return f"{self.__class__.__name__} #{self.__transaction_id}: ${self.__amount / 100:.2f}"
 
 class DepositTransaction(Transaction):
     def __init__(self, transaction_id: str, account, amount: float, method: str = "cash"):
@@ -436,18 +1158,19 @@ class DepositTransaction(Transaction):
     def validate(self):
         if self.__account.get_status() != "active":
             return False, f"account is {self.__account.get_status()}"
-        if self.get_amount() <= 0:
+        if self.get_amount_cents() <= 0:
             return False, "amount must be positive"
         return True, "valid"
     
     def execute(self):
-        is_valid, msg = self.validate()
-        if not is_valid:
-            self._set_status("failed")
-            raise Exception(f"failed: {msg}")
-        
-        self.__account.deposit(self.get_amount())
-        self._set_status("completed")
+        with self.lock_accounts(self.__account):
+            is_valid, msg = self.validate()
+            if not is_valid:
+                self._set_status("failed")
+                raise Exception(f"failed: {msg}")
+            
+            self.__account.deposit_cents(self.get_amount_cents())
+            self._set_status("completed")
         return True
 
 class WithdrawalTransaction(Transaction):
@@ -459,26 +1182,27 @@ class WithdrawalTransaction(Transaction):
     def validate(self):
         if self.__account.get_status() != "active":
             return False, f"account is {self.__account.get_status()}"
-        if self.get_amount() <= 0:
+        if self.get_amount_cents() <= 0:
             return False, "amount must be positive"
         
         if isinstance(self.__account, CheckingAccount):
-            if self.get_amount() > self.__account.get_total_spendable_balance():
+            if self.get_amount_cents() > self.__account.get_total_spendable_balance_cents():
                 return False, "insufficient funds"
         else:
-            if self.get_amount() > self.__account.get_balance():
+            if self.get_amount_cents() > self.__account.get_balance_cents():
                 return False, "insufficient funds"
         
         return True, "valid"
     
     def execute(self):
-        is_valid, msg = self.validate()
-        if not is_valid:
-            self._set_status("failed")
-            raise Exception(f"failed: {msg}")
-        
-        self.__account.withdraw(self.get_amount())
-        self._set_status("completed")
+        with self.lock_accounts(self.__account):
+            is_valid, msg = self.validate()
+            if not is_valid:
+                self._set_status("failed")
+                raise Exception(f"failed: {msg}")
+            
+            self.__account.withdraw_cents(self.get_amount_cents())
+            self._set_status("completed")
         return True
 
 class TransferTransaction(Transaction):
@@ -492,39 +1216,40 @@ class TransferTransaction(Transaction):
             return False, "source account not active"
         if self.__dest.get_status() != "active":
             return False, "destination account not active"
-        if self.get_amount() <= 0:
+        if self.get_amount_cents() <= 0:
             return False, "amount must be positive"
         
         if isinstance(self.__source, CheckingAccount):
-            if self.get_amount() > self.__source.get_total_spendable_balance():
+            if self.get_amount_cents() > self.__source.get_total_spendable_balance_cents():
                 return False, "insufficient funds"
         else:
-            if self.get_amount() > self.__source.get_balance():
+            if self.get_amount_cents() > self.__source.get_balance_cents():
                 return False, "insufficient funds"
         
         return True, "valid"
     
     def execute(self):
-        is_valid, msg = self.validate()
-        if not is_valid:
-            self._set_status("failed")
-            raise Exception(f"failed: {msg}")
-        
-        try:
-            self.__source.withdraw(self.get_amount())
-        except Exception as e:
-            self._set_status("failed")
-            raise e
+        with self.lock_accounts(self.__source, self.__dest):
+            is_valid, msg = self.validate()
+            if not is_valid:
+                self._set_status("failed")
+                raise Exception(f"failed: {msg}")
+            
+            try:
+                self.__source.withdraw_cents(self.get_amount_cents())
+            except Exception as e:
+                self._set_status("failed")
+                raise e
 
-        try:
-            self.__dest.deposit(self.get_amount())
-        except Exception as e:
-            self.__source.deposit(self.get_amount())
-            self._set_status("failed")
-            raise Exception(f"transfer failed at destination. money refunded. error: {e}")
+            try:
+                self.__dest.deposit_cents(self.get_amount_cents())
+            except Exception as e:
+                self.__source.deposit_cents(self.get_amount_cents())
+                self._set_status("failed")
+                raise Exception(f"transfer failed at destination. money refunded. error: {e}")
 
-        self._set_status("completed")
-        print(f"transfer: ${self.get_amount():.2f} from {self.__source.get_account_number()} to {self.__dest.get_account_number()}")
+            self._set_status("completed")
+        EVENTS.emit("transfer", account=self.__source.get_account_number(), to_account=self.__dest.get_account_number(), amount_cents=self.get_amount_cents())
         return True
 
 class Validator:
@@ -597,122 +1322,3222 @@ class Validator:
                 print("error: invalid amount. enter a valid number.")
 
 
-class BankingSystem:
+class IdAllocator:
+    def __init__(self, next_value: int = 1, block: int = 1000, on_reserve=None, name: str = None):
+        self.__name = name
+        self.__next = next_value
+        self.__ceiling = next_value
+        self.__block = block
+        self.__on_reserve = on_reserve
+        self.__lock = threading.Lock()
+    
+    def get_name(self): return self.__name
+    def get_next(self): return self.__next
+    
+    def lease(self, count=1):
+        with self.__lock:
+            start = self.__next
+            self.__next += count
+            # the reserved ceiling is journaled once per block, not once per id
+            if self.__next > self.__ceiling:
+                self.__ceiling = self.__next + self.__block
+                if self.__on_reserve is not None:
+                    self.__on_reserve(self.__ceiling)
+            return range(start, self.__next)
+    
+    def next(self):
+        return self.lease(1)[0]
+    
+    def checkpoint(self):
+        # reservations journaled before a checkpoint are discarded with it, so the next id re-reserves
+        with self.__lock:
+            self.__ceiling = self.__next
+            return self.__next
+    
+    def reset(self, next_value):
+        with self.__lock:
+            self.__next = next_value
+            self.__ceiling = next_value
+    
+    def advance(self, ceiling):
+        with self.__lock:
+            self.__next = max(self.__next, ceiling)
+            self.__ceiling = self.__next
+
+
+class CustomerIndex:
     def __init__(self):
-        self.__customers = {}
-        self.__accounts = {}
-        self.__transactions = []
-        self.__next_customer_id = 1
-        self.__next_account_number = 1000
-        self.__next_transaction_id = 1
-        self.__data_file = "banking_data.json"
+        self.__by_email = {}
+        self.__by_tax_id = {}
+        self.__by_phone = {}
+        self.__names = []
+        self.__names_sorted = True
+        self.__lock = threading.RLock()
     
-    def generate_customer_id(self, name: str):
-        random_num = random.randint(1000, 9999)
-        cust_id = f"c{name.lower()[:3]}{random_num}"
-        return cust_id
+    @staticmethod
+    def normalize_email(email): return (email or "").strip().lower()
     
-    def generate_account_number(self, customer_name: str):
-        random_num = random.randint(1000, 9999)
-        acc_num = f"a{customer_name.lower()[:3]}{random_num}"
-        return acc_num
+    @staticmethod
+    def normalize_phone(phone): return re.sub(r"\D", "", phone or "")
     
-    def generate_transaction_id(self):
-        txn_id = f"txn{self.__next_transaction_id:08d}"
-        self.__next_transaction_id += 1
-        return txn_id
+    @staticmethod
+    def normalize_name(name): return " ".join((name or "").lower().split())
     
-    def add_customer(self, customer): self.__customers[customer.get_customer_id()] = customer
-    def add_account(self, account): self.__accounts[account.get_account_number()] = account
-    def add_transaction(self, transaction): self.__transactions.append(transaction)
-    def find_customer(self, customer_id): return self.__customers.get(customer_id)
-    def find_account(self, account_number): return self.__accounts.get(account_number)
+    @staticmethod
+    def normalize_tax_id(tax_id): return (tax_id or "").strip().upper()
     
-    def create_account(self, customer, account_type):
-        acc_num = self.generate_account_number(customer.get_name())
-        
-        if account_type == "savings":
-            balance = Validator.validate_amount("initial balance: $")
-            account = SavingsAccount(acc_num, customer, balance)
-        elif account_type == "checking":
-            balance = Validator.validate_amount("initial balance: $")
-            account = CheckingAccount(acc_num, customer, balance)
-        elif account_type == "loan":
-            amount = Validator.validate_amount("loan amount: $")
-            account = LoanAccount(acc_num, customer, amount)
-        else:
-            raise ValueError("invalid type")
-        
-        self.add_account(account)
-        customer.add_account(account)
-        print(f"{account_type} account created: {acc_num}")
-        return account
+    @classmethod
+    def keys(cls, customer):
+        tax_id = customer.get_tax_id() if isinstance(customer, CorporateCustomer) else None
+        return (
+            cls.normalize_email(customer.get_email()),
+            cls.normalize_phone(customer.get_phone()),
+            cls.normalize_tax_id(tax_id),
+            cls.normalize_name(customer.get_name())
+        )
     
-    def save_data(self, silent=False):
-        try:
-            data = {
-                "customers": [c.to_dict() for c in self.__customers.values()],
-                "accounts": [a.to_dict() for a in self.__accounts.values()],
-                "next_customer_id": self.__next_customer_id,
-                "next_account_number": self.__next_account_number,
-                "next_transaction_id": self.__next_transaction_id
+    def _sort_names(self):
+        # appends during load stay unsorted; one sort on first lookup beats an insort per customer
+        if not self.__names_sorted:
+            self.__names.sort()
+            self.__names_sorted = True
+    
+    def add(self, customer, unique=True):
+        self.add_keys(customer.get_customer_id(), *self.keys(customer), unique=unique)
+    
+    def add_keys(self, cust_id, email, phone, tax_id, name, unique=True):
+        with self.__lock:
+            if unique:
+                if self.__by_email.get(email, cust_id) != cust_id:
+                    raise ValueError(f"email {email} already registered")
+                if tax_id and self.__by_tax_id.get(tax_id, cust_id) != cust_id:
+                    raise ValueError(f"tax id {tax_id} already registered")
+            elif email in self.__by_email and self.__by_email[email] != cust_id:
+                EVENTS.emit("shared_email", customer=cust_id, other=self.__by_email[email])
+            self._insert(cust_id, email, phone, tax_id, name)
+    
+    def add_many(self, entries):
+        # keys here are already normalized, e.g. straight from a snapshot directory
+        with self.__lock:
+            for cust_id, email, phone, tax_id, name in entries:
+                self._insert(cust_id, email, phone, tax_id, name)
+    
+    def _insert(self, cust_id, email, phone, tax_id, name):
+        self.__by_email.setdefault(email, cust_id)
+        if tax_id:
+            self.__by_tax_id.setdefault(tax_id, cust_id)
+        if phone:
+            self.__by_phone.setdefault(phone, {})[cust_id] = None
+        self.__names.append((name, cust_id))
+        self.__names_sorted = False
+    
+    def remove(self, customer):
+        cust_id = customer.get_customer_id()
+        email, phone, tax_id, name = self.keys(customer)
+        with self.__lock:
+            if self.__by_email.get(email) == cust_id:
+                del self.__by_email[email]
+            if tax_id and self.__by_tax_id.get(tax_id) == cust_id:
+                del self.__by_tax_id[tax_id]
+            ids = self.__by_phone.get(phone, {})
+            if cust_id in ids:
+                del ids[cust_id]
+                if not ids:
+                    del self.__by_phone[phone]
+            self._sort_names()
+            key = (name, cust_id)
+            pos = bisect.bisect_left(self.__names, key)
+            if pos < len(self.__names) and self.__names[pos] == key:
+                del self.__names[pos]
+    
+    def find_by_email(self, email):
+        with self.__lock:
+            return self.__by_email.get(self.normalize_email(email))
+    
+    def find_by_tax_id(self, tax_id):
+        with self.__lock:
+            return self.__by_tax_id.get(self.normalize_tax_id(tax_id))
+    
+    def find_by_phone(self, phone):
+        with self.__lock:
+            return list(self.__by_phone.get(self.normalize_phone(phone), {}))
+    
+    def search_name(self, prefix, limit=20):
+        prefix = self.normalize_name(prefix)
+        with self.__lock:
+            self._sort_names()
+            ids = []
+            pos = bisect.bisect_left(self.__names, (prefix,))
+            while pos < len(self.__names) and len(ids) < limit and self.__names[pos][0].startswith(prefix):
+                ids.append(self.__names[pos][1])
+                pos += 1
+            return ids
+
+
+class BalanceAggregates:
+    # bank-wide running totals, fed the same deltas as each holder; they survive eviction because nothing is summed from residents
+    def __init__(self):
+        self.__total = 0
+        self.__totals = {}
+        self.__loans_outstanding = 0
+        self.__lock = threading.Lock()
+    
+    def apply(self, account_type, delta, loan_delta=0):
+        with self.__lock:
+            self.__total += delta
+            self.__totals[account_type] = self.__totals.get(account_type, 0) + delta
+            self.__loans_outstanding += loan_delta
+    
+    def add_account(self, account):
+        loan = account.get_remaining_balance_cents() if isinstance(account, LoanAccount) else 0
+        self.apply(account.__class__.__name__, account.get_balance_cents(), loan)
+    
+    def get_total_cents(self): return self.__total
+    def get_loans_outstanding_cents(self): return self.__loans_outstanding
+    
+    def to_dict(self):
+        with self.__lock:
+            return {
+                "total_cents": self.__total,
+                "by_type": {account_type: cents for account_type, cents in self.__totals.items() if cents},
+                "loans_outstanding_cents": self.__loans_outstanding
             }
-            with open(self.__data_file, 'w') as f:
-                json.dump(data, f, indent=2)
-            if not silent:
-                print(f"data saved")
-            return True
-        except Exception as e:
-            print(f"save failed: {e}")
-            return False
     
-    def load_data(self):
-        if not os.path.exists(self.__data_file):
-            print("starting fresh")
-            return False
-        try:
-            with open(self.__data_file, 'r') as f:
-                data = json.load(f)
+    def reset(self, data=None):
+        data = data or {}
+        with self.__lock:
+            self.__totals = dict(data.get("by_type", {}))
+            self.__total = data.get("total_cents", sum(self.__totals.values()))
+            self.__loans_outstanding = data.get("loans_outstanding_cents", 0)
 
-            self.__next_customer_id = data.get("next_customer_id", 1)
-            self.__next_account_number = data.get("next_account_number", 1000)
-            self.__next_transaction_id = data.get("next_transaction_id", 1)
-            
-            for cust_data in data.get("customers", []):
-                if cust_data.get("customer_type") == "IndividualCustomer":
-                    customer = IndividualCustomer.from_dict(cust_data)
-                elif cust_data.get("customer_type") == "CorporateCustomer":
-                    customer = CorporateCustomer.from_dict(cust_data)
-                else:
-                    customer = Customer.from_dict(cust_data)
-                self.__customers[customer.get_customer_id()] = customer
-            
-            for acc_data in data.get("accounts", []):
-                holder_id = acc_data.get("holder_id")
-                customer = self.__customers.get(holder_id)
+
+class IdempotencyCache:
+    # receipts of keyed requests in the order they were logged; entries age out after the ttl and the oldest go first once full
+    def __init__(self, max_entries: int = 10_000, ttl: float = 24 * 3600.0):
+        self.__max_entries = max_entries
+        self.__ttl_us = int(ttl * 1_000_000)
+        self.__entries = OrderedDict()
+        self.__pending = {}
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__expired = 0
+        self.__evicted = 0
+    
+    def get_max_entries(self): return self.__max_entries
+    def get_ttl_us(self): return self.__ttl_us
+    
+    def claim(self, key):
+        # None means the caller runs the request; otherwise a future holding the original receipt.
+        # a request still in flight stays pending until its record is durable, so a retry never sees an unlogged result
+        with self.__lock:
+            future = self.__pending.get(key)
+            if future is None:
+                self._expire(CLOCK.now_us())
+                receipt = self.__entries.get(key)
+                if receipt is None:
+                    self.__misses += 1
+                    self.__pending[key] = Future()
+                    return None
+                future = Future()
+                future.set_result(receipt)
+            self.__hits += 1
+            return future
+    
+    def record(self, key, receipt):
+        # called with the record that carries the receipt, under the commit gate, so a snapshot always agrees with the journal
+        with self.__lock:
+            self.__entries[key] = receipt
+            self.__entries.move_to_end(key)
+            self._expire(CLOCK.now_us())
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+                self.__evicted += 1
+    
+    def resolve(self, key, receipt=None, error=None):
+        with self.__lock:
+            future = self.__pending.pop(key, None)
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(receipt)
+    
+    def _expire(self, now_us):
+        cutoff = now_us - self.__ttl_us
+        entries = self.__entries
+        while entries:
+            key = next(iter(entries))
+            if entries[key]["ts"] >= cutoff:
+                break
+            del entries[key]
+            self.__expired += 1
+    
+    def load(self, pairs):
+        for key, receipt in pairs:
+            self.record(key, receipt)
+    
+    def to_list(self):
+        with self.__lock:
+            self._expire(CLOCK.now_us())
+            return [[key, receipt] for key, receipt in self.__entries.items()]
+    
+    def get_stats(self):
+        with self.__lock:
+            return {
+                "entries": len(self.__entries),
+                "pending": len(self.__pending),
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "expired": self.__expired,
+                "evicted": self.__evicted,
+                "max_entries": self.__max_entries,
+                "ttl_seconds": self.__ttl_us / 1_000_000
+            }
+
+
+class LedgerStore:
+    ENCODER = json.JSONEncoder(separators=(",", ":"))
+    
+    def __init__(self, directory: str):
+        self.__directory = directory
+        self.__files = {}
+        self.__offsets = {}
+        self.__stamps = {}
+        self.__indexed_size = {}
+        self.__dirty = set()
+        self.__lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+    
+    def _segment_path(self, segment): return os.path.join(self.__directory, segment + ".seg")
+    def _index_path(self, segment): return os.path.join(self.__directory, segment + ".idx")
+    
+    def segments(self):
+        return sorted(name[:-4] for name in os.listdir(self.__directory) if name.endswith(".seg"))
+    
+    def _open_segment(self, segment):
+        path = self._segment_path(segment)
+        if os.path.exists(path):
+            # a crash mid-append can leave a partial last line; cut it before appending after it
+            with open(path, "r+b") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+        f = self.__files[segment] = open(path, "ab")
+        return f
+    
+    def append(self, account_number, entries):
+        self.append_many([(account_number, entries)])
+    
+    def append_many(self, batches):
+        encode = self.ENCODER.encode
+        months = {}
+        with self.__lock:
+            touched = set()
+            for account_number, entries in batches:
+                for entry in entries:
+                    second = entry.ts // 1_000_000
+                    segment = months.get(second)
+                    if segment is None:
+                        segment = months[second] = entry.get_month()
+                    f = self.__files.get(segment) or self._open_segment(segment)
+                    offset = f.tell()
+                    line = encode([account_number, *entry.to_row()]).encode("utf-8") + b"\n"
+                    f.write(line)
+                    touched.add(segment)
+                    if segment in self.__offsets:
+                        self._index_entry(self.__offsets[segment], self.__stamps[segment], account_number, offset, entry.ts)
+                        self.__indexed_size[segment] = offset + len(line)
+            for segment in touched:
+                self.__files[segment].flush()
+            self.__dirty.update(touched)
+    
+    @staticmethod
+    def _index_entry(offsets, stamps, account_number, offset, ts):
+        # stamps run parallel to offsets and never decrease, so a date range is two bisects and the lists stay append-only;
+        # an entry logged after a later-stamped one is indexed at that later stamp
+        account_stamps = stamps.setdefault(account_number, [])
+        offsets.setdefault(account_number, []).append(offset)
+        account_stamps.append(max(ts, account_stamps[-1]) if account_stamps else ts)
+    
+    def _load_segment(self, segment):
+        with self.__lock:
+            offsets = self.__offsets.get(segment)
+            if offsets is not None:
+                return offsets
+            offsets, stamps, position = {}, {}, 0
+            if os.path.exists(self._index_path(segment)):
+                with open(self._index_path(segment), "r") as f:
+                    index = json.load(f)
+                # indexes written before timestamps were kept are rebuilt from the segment
+                if "stamps" in index:
+                    offsets, stamps, position = index["accounts"], index["stamps"], index["size"]
+            if segment in self.__files:
+                self.__files[segment].flush()
+            indexed = position
+            with open(self._segment_path(segment), "rb") as f:
+                f.seek(position)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    row = json.loads(line)
+                    ts = Clock.parse(row[1]["timestamp"]) if isinstance(row[1], dict) else row[2]
+                    self._index_entry(offsets, stamps, row[0], position, ts)
+                    position += len(line)
+            if position > indexed:
+                self.__dirty.add(segment)
+            self.__offsets[segment] = offsets
+            self.__stamps[segment] = stamps
+            self.__indexed_size[segment] = position
+            return offsets
+    
+    def read(self, account_number, last=None):
+        with self.__lock:
+            located = []
+            for segment in reversed(self.segments()):
+                positions = self._load_segment(segment).get(account_number, [])
+                if last is not None:
+                    positions = positions[-(last - len(located)):] if len(located) < last else []
+                located[:0] = [(segment, position) for position in positions]
+            return list(self._read_located(located))
+    
+    def query(self, account_number, start_us=None, end_us=None):
+        # positions are captured now, under the lock; entries are read as the caller consumes them
+        first = LedgerEntry.month_of(start_us) if start_us is not None else None
+        last = LedgerEntry.month_of(end_us) if end_us is not None else None
+        ranges = []
+        with self.__lock:
+            for segment in self.segments():
+                if (first is not None and segment < first) or (last is not None and segment > last):
+                    continue
+                positions = self._load_segment(segment).get(account_number)
+                if not positions:
+                    continue
+                stamps = self.__stamps[segment][account_number]
+                low = bisect.bisect_left(stamps, start_us) if start_us is not None else 0
+                high = bisect.bisect_left(stamps, end_us) if end_us is not None else len(stamps)
+                if low < high:
+                    ranges.append((segment, positions, low, high))
+        return self._read_located(self._positions_in(ranges))
+    
+    def _positions_in(self, ranges, chunk: int = 1024):
+        # the index lists only grow at the end, so index bounds taken at capture keep naming the same entries
+        for segment, positions, low, high in ranges:
+            for at in range(low, high, chunk):
+                with self.__lock:
+                    window = positions[at:min(at + chunk, high)]
+                for position in window:
+                    yield segment, position
+    
+    def _read_located(self, located):
+        handle, current = None, None
+        try:
+            for segment, position in located:
+                if segment != current:
+                    if handle is not None:
+                        handle.close()
+                    if segment in self.__files:
+                        self.__files[segment].flush()
+                    handle, current = open(self._segment_path(segment), "rb"), segment
+                handle.seek(position)
+                row = json.loads(handle.readline())
+                yield LedgerEntry.from_dict(row[1]) if isinstance(row[1], dict) else LedgerEntry.from_row(row[1:])
+        finally:
+            if handle is not None:
+                handle.close()
+    
+    def capture_index(self):
+        with self.__lock:
+            captured = []
+            for segment in sorted(self.__dirty):
+                offsets = self._load_segment(segment)
+                stamps = self.__stamps[segment]
+                captured.append((segment, self.__indexed_size[segment], {acc: list(positions) for acc, positions in offsets.items()}, {acc: list(ts) for acc, ts in stamps.items()}))
+            self.__dirty.clear()
+            return captured
+    
+    def write_index(self, captured):
+        for segment, size, offsets, stamps in captured:
+            tmp_file = self._index_path(segment) + ".tmp"
+            with open(tmp_file, "w") as f:
+                json.dump({"size": size, "accounts": offsets, "stamps": stamps}, f, separators=(",", ":"))
+            os.replace(tmp_file, self._index_path(segment))
+    
+    def sync(self):
+        with self.__lock:
+            for f in self.__files.values():
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def close(self):
+        with self.__lock:
+            self.sync()
+            for f in self.__files.values():
+                f.close()
+            self.__files = {}
+
+
+class Journal:
+    # records only arrive in batches from the group committer, and every batch is fsynced before it is acknowledged
+    def __init__(self, path: str, on_sync=None):
+        self.__path = path
+        self.__on_sync = on_sync
+        self.__lock = threading.RLock()
+        self.__file = None
+        self.__pending = 0
+        self.__seq = 0
+        segments = self.segments()
+        self.__segment = segments[-1] if segments else 1
+    
+    def get_path(self): return self.__path
+    def get_seq(self): return self.__seq
+    def _segment_path(self, number): return f"{self.__path}.{number:06d}"
+    
+    def segments(self):
+        directory = os.path.dirname(self.__path) or "."
+        prefix = os.path.basename(self.__path) + "."
+        numbers = []
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name[len(prefix):].isdigit():
+                numbers.append(int(name[len(prefix):]))
+        return sorted(numbers)
+    
+    def write_batch(self, records):
+        with self.__lock:
+            if self.__file is None:
+                self.__file = open(self._segment_path(self.__segment), "ab")
+            lines = []
+            for record in records:
+                self.__seq += 1
+                record["seq"] = self.__seq
+                lines.append(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+            data = b"\n".join(lines) + b"\n"
+            self.__file.write(data)
+            self.__file.flush()
+            self.__pending += len(records)
+            self.sync()
+            return len(data)
+    
+    def sync(self):
+        with self.__lock:
+            if self.__on_sync is not None:
+                self.__on_sync()
+            if self.__file is not None and self.__pending:
+                os.fsync(self.__file.fileno())
+            self.__pending = 0
+    
+    def rotate(self):
+        with self.__lock:
+            self.close()
+            self.__segment += 1
+            return self.__seq, self.__segment
+    
+    def replay(self, after_seq: int = 0):
+        for number in self.segments():
+            path = self._segment_path(number)
+            good_offset = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    good_offset += len(line)
+                    self.__seq = max(self.__seq, record.get("seq", 0))
+                    if record.get("seq", 0) > after_seq:
+                        yield record
+            # drop a torn tail left by a crash mid-append so new records start on a clean line
+            if good_offset < os.path.getsize(path):
+                with open(path, "r+b") as f:
+                    f.truncate(good_offset)
+        self.__seq = max(self.__seq, after_seq)
+    
+    def discard_before(self, segment: int):
+        for number in self.segments():
+            if number < segment:
+                os.remove(self._segment_path(number))
+    
+    def close(self):
+        with self.__lock:
+            if self.__file is not None:
+                self.sync()
+                self.__file.close()
+                self.__file = None
+
+
+class StorageBackend(ABC):
+    # a write-through store: committed records are applied in place, so there is no journal to replay or snapshot to rewrite
+    @abstractmethod
+    def write_batch(self, records):
+        pass
+    
+    @abstractmethod
+    def get_ledger(self):
+        pass
+    
+    @abstractmethod
+    def has_data(self):
+        pass
+    
+    @abstractmethod
+    def load_header(self):
+        pass
+    
+    @abstractmethod
+    def load_directory(self):
+        pass
+    
+    @abstractmethod
+    def load_aggregates(self):
+        pass
+    
+    @abstractmethod
+    def load_holds(self):
+        pass
+    
+    @abstractmethod
+    def load_receipts(self, since_us, limit):
+        pass
+    
+    @abstractmethod
+    def prune_receipts(self, before_us, keep):
+        pass
+    
+    @abstractmethod
+    def read_group(self, customer_id):
+        pass
+    
+    @abstractmethod
+    def write_groups(self, groups, header=None):
+        pass
+    
+    @abstractmethod
+    def checkpoint(self):
+        pass
+    
+    @abstractmethod
+    def sync(self):
+        pass
+    
+    @abstractmethod
+    def close(self):
+        pass
+
+class SqliteLedger:
+    # entries wait here until the next backend transaction, so they commit together with the balances they explain
+    def __init__(self, backend):
+        self.__backend = backend
+        self.__pending = []
+        self.__lock = threading.Lock()
+    
+    def append(self, account_number, entries):
+        self.append_many([(account_number, entries)])
+    
+    def append_many(self, batches):
+        rows = [(account_number, *entry.to_row()) for account_number, entries in batches for entry in entries]
+        if rows:
+            with self.__lock:
+                self.__pending.extend(rows)
+    
+    def has_pending(self): return bool(self.__pending)
+    
+    def drain(self):
+        with self.__lock:
+            rows, self.__pending = self.__pending, []
+        # to_row trims trailing empty fields; the insert wants all of them
+        return [row + (None,) * (8 - len(row)) for row in rows]
+    
+    def read(self, account_number, last=None):
+        entries = self.__backend.read_entries(account_number, last)
+        with self.__lock:
+            pending = [LedgerEntry.from_row(row[1:]) for row in self.__pending if row[0] == account_number]
+        entries.extend(pending)
+        return entries[-last:] if last else entries
+    
+    def pending_rows(self, account_number):
+        with self.__lock:
+            return [row[1:] for row in self.__pending if row[0] == account_number]
+    
+    def query(self, account_number, start_us=None, end_us=None):
+        return self.__backend.query_entries(account_number, start_us, end_us)
+    
+    def sync(self):
+        self.__backend.sync()
+    
+    def close(self):
+        pass
+
+class SqliteBackend(StorageBackend):
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS customers (customer_id TEXT PRIMARY KEY, email TEXT, phone TEXT, tax_id TEXT, name TEXT, data TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS customers_email ON customers (email)",
+        "CREATE INDEX IF NOT EXISTS customers_phone ON customers (phone)",
+        "CREATE INDEX IF NOT EXISTS customers_tax_id ON customers (tax_id)",
+        "CREATE INDEX IF NOT EXISTS customers_name ON customers (name)",
+        "CREATE TABLE IF NOT EXISTS accounts (account_number TEXT PRIMARY KEY, customer_id TEXT NOT NULL, account_type TEXT NOT NULL, balance_cents INTEGER NOT NULL, status TEXT NOT NULL, data TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS accounts_customer ON accounts (customer_id)",
+        "CREATE TABLE IF NOT EXISTS ledger (id INTEGER PRIMARY KEY, account_number TEXT NOT NULL, code INTEGER NOT NULL, ts INTEGER NOT NULL, amount INTEGER NOT NULL, balance_after INTEGER, principal INTEGER, interest INTEGER, description TEXT)",
+        "CREATE INDEX IF NOT EXISTS ledger_account ON ledger (account_number, id)",
+        "CREATE INDEX IF NOT EXISTS ledger_account_ts ON ledger (account_number, ts, id)",
+        "CREATE TABLE IF NOT EXISTS holds (txn TEXT PRIMARY KEY, data TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS receipts (key TEXT PRIMARY KEY, ts INTEGER NOT NULL, data TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS receipts_ts ON receipts (ts)"
+    )
+    UPSERT_META = "INSERT INTO meta VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = max(value, excluded.value)"
+    UPSERT_CUSTOMER = "INSERT OR REPLACE INTO customers VALUES (?, ?, ?, ?, ?, ?)"
+    UPSERT_ACCOUNT = "INSERT OR REPLACE INTO accounts VALUES (?, ?, ?, ?, ?, ?)"
+    INSERT_ENTRY = "INSERT INTO ledger (account_number, code, ts, amount, balance_after, principal, interest, description) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    
+    def __init__(self, path: str, synchronous: str = "FULL"):
+        self.__path = path
+        self.__ledger = SqliteLedger(self)
+        # one connection writes (the group-commit thread), the other serves hydration and history reads; wal keeps them apart
+        self.__writer = self._connect(synchronous)
+        self.__reader = self._connect(synchronous)
+        self.__write_lock = threading.Lock()
+        self.__read_lock = threading.Lock()
+        for statement in self.SCHEMA:
+            self.__writer.execute(statement)
+    
+    def _connect(self, synchronous):
+        connection = sqlite3.connect(self.__path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute(f"PRAGMA synchronous = {synchronous}")
+        return connection
+    
+    def get_path(self): return self.__path
+    def get_ledger(self): return self.__ledger
+    
+    def has_data(self):
+        with self.__read_lock:
+            return self.__reader.execute("SELECT EXISTS (SELECT 1 FROM meta) OR EXISTS (SELECT 1 FROM customers)").fetchone()[0] == 1
+    
+    @staticmethod
+    def _customer_row(data):
+        return (
+            data["customer_id"],
+            CustomerIndex.normalize_email(data.get("email")),
+            CustomerIndex.normalize_phone(data.get("phone")),
+            CustomerIndex.normalize_tax_id(data.get("tax_id")),
+            CustomerIndex.normalize_name(data.get("name")),
+            LedgerStore.ENCODER.encode(data)
+        )
+    
+    @staticmethod
+    def _account_row(data):
+        return (data["account_number"], data["holder_id"], data["account_type"], data["balance_cents"], data["status"], LedgerStore.ENCODER.encode(data))
+    
+    def write_batch(self, records):
+        # one sqlite transaction per group commit; every record inside it, e.g. both sides of a transfer, lands or none does
+        customers, accounts, removed, balances, meta, holds, released, receipts = [], [], [], [], [], [], [], []
+        for record in records:
+            op = record["op"]
+            if op == "accounts":
+                accounts.extend(self._account_row(state) for state in record["data"])
+                if "txn" in record:
+                    meta.append(("next_transaction_id", int(record["txn"][3:]) + 1))
+                if "hold" in record:
+                    holds.append((record["hold"]["txn"], LedgerStore.ENCODER.encode(record["hold"])))
+                if "release" in record:
+                    released.append((record["release"],))
+                receipts.extend((key, receipt["ts"], LedgerStore.ENCODER.encode(receipt)) for key, receipt in record.get("receipts", ()))
+            elif op == "customer":
+                customers.append(self._customer_row(record["data"]))
+            elif op == "remove_customer":
+                removed.append((record["customer_id"],))
+            elif op == "period_close":
+                balances.extend((balance, account_number) for account_number, balance in record["balances"])
+            elif op == "reserve_ids":
+                meta.append((record["kind"] + "_ceiling", record["ceiling"]))
+        with self.__write_lock:
+            cursor = self.__writer.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.executemany(self.UPSERT_CUSTOMER, customers)
+                cursor.executemany(self.UPSERT_ACCOUNT, accounts)
+                cursor.executemany("UPDATE accounts SET balance_cents = ? WHERE account_number = ?", balances)
+                cursor.executemany("DELETE FROM customers WHERE customer_id = ?", removed)
+                cursor.executemany(self.UPSERT_META, meta)
+                cursor.executemany("INSERT OR REPLACE INTO holds VALUES (?, ?)", holds)
+                cursor.executemany("DELETE FROM holds WHERE txn = ?", released)
+                cursor.executemany("INSERT OR REPLACE INTO receipts VALUES (?, ?, ?)", receipts)
+                cursor.executemany(self.INSERT_ENTRY, self.__ledger.drain())
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        return sum(len(row[-1]) for row in customers) + sum(len(row[-1]) for row in accounts) + 16 * len(balances)
+    
+    def load_header(self):
+        with self.__read_lock:
+            meta = dict(self.__reader.execute("SELECT key, value FROM meta"))
+        return {
+            "next_customer_id": max(meta.get("next_customer_id", 1), meta.get("customer_ceiling", 1)),
+            "next_account_number": max(meta.get("next_account_number", 1000), meta.get("account_ceiling", 1000)),
+            "next_transaction_id": meta.get("next_transaction_id", 1)
+        }
+    
+    def load_aggregates(self):
+        with self.__read_lock:
+            by_type = dict(self.__reader.execute("SELECT account_type, sum(balance_cents) FROM accounts GROUP BY account_type"))
+            loans = self.__reader.execute("SELECT coalesce(sum(json_extract(data, '$.remaining_balance_cents')), 0) FROM accounts WHERE account_type = 'LoanAccount'").fetchone()[0]
+        return {"by_type": by_type, "loans_outstanding_cents": loans}
+    
+    def load_holds(self):
+        with self.__read_lock:
+            return [json.loads(row[0]) for row in self.__reader.execute("SELECT data FROM holds")]
+    
+    def load_receipts(self, since_us, limit):
+        with self.__read_lock:
+            rows = self.__reader.execute("SELECT key, data FROM receipts WHERE ts >= ? ORDER BY ts DESC LIMIT ?", (since_us, limit)).fetchall()
+        return [(key, json.loads(data)) for key, data in reversed(rows)]
+    
+    def prune_receipts(self, before_us, keep):
+        with self.__write_lock:
+            self.__writer.execute("DELETE FROM receipts WHERE ts < ? OR key NOT IN (SELECT key FROM receipts ORDER BY ts DESC LIMIT ?)", (before_us, keep))
+    
+    def load_directory(self):
+        with self.__read_lock:
+            customers = self.__reader.execute("SELECT customer_id, email, phone, tax_id, name FROM customers").fetchall()
+            owners = self.__reader.execute("SELECT account_number, customer_id FROM accounts").fetchall()
+        return customers, owners
+    
+    def read_group(self, customer_id):
+        with self.__read_lock:
+            cursor = self.__reader.cursor()
+            cursor.execute("BEGIN")
+            try:
+                row = cursor.execute("SELECT data FROM customers WHERE customer_id = ?", (customer_id,)).fetchone()
+                accounts = cursor.execute("SELECT balance_cents, data FROM accounts WHERE customer_id = ?", (customer_id,)).fetchall()
+            finally:
+                cursor.execute("COMMIT")
+        if row is None:
+            return None
+        states = []
+        nbytes = len(row[0])
+        for balance, data in accounts:
+            # period closes only touch the balance column
+            state = json.loads(data)
+            state["balance_cents"] = balance
+            states.append(state)
+            nbytes += len(data)
+        return {"customer": json.loads(row[0]), "accounts": states, "bytes": nbytes}
+    
+    def read_entries(self, account_number, last=None):
+        query = "SELECT code, ts, amount, balance_after, principal, interest, description FROM ledger WHERE account_number = ? ORDER BY id"
+        with self.__read_lock:
+            if last:
+                rows = self.__reader.execute(query + " DESC LIMIT ?", (account_number, last)).fetchall()
+                rows.reverse()
+            else:
+                rows = self.__reader.execute(query, (account_number,)).fetchall()
+        return [LedgerEntry.from_row(row) for row in rows]
+    
+    def query_entries(self, account_number, start_us=None, end_us=None, page: int = 512):
+        # the write lock fences off a commit, so rows up to high plus the pending copy are exactly the ledger as of now
+        with self.__write_lock:
+            with self.__read_lock:
+                high = self.__reader.execute("SELECT COALESCE(MAX(id), 0) FROM ledger").fetchone()[0]
+            pending = self.__ledger.pending_rows(account_number)
+        return self._stream_entries(account_number, -2 ** 63 if start_us is None else start_us, 2 ** 63 - 1 if end_us is None else end_us, high, pending, page)
+    
+    def _stream_entries(self, account_number, start_us, end_us, high, pending, page):
+        query = (
+            "SELECT id, code, ts, amount, balance_after, principal, interest, description FROM ledger"
+            " WHERE account_number = ? AND ts < ? AND id <= ? AND (ts, id) > (?, ?) ORDER BY ts, id LIMIT ?"
+        )
+        after_ts, after_id = start_us, -1
+        while True:
+            with self.__read_lock:
+                rows = self.__reader.execute(query, (account_number, end_us, high, after_ts, after_id, page)).fetchall()
+            for row in rows:
+                yield LedgerEntry.from_row(row[1:])
+            if len(rows) < page:
+                break
+            after_ts, after_id = rows[-1][2], rows[-1][0]
+        for row in sorted((row for row in pending if start_us <= row[1] < end_us), key=lambda row: row[1]):
+            yield LedgerEntry.from_row(row)
+    
+    def write_groups(self, groups, header=None):
+        # groups that only ever lived in memory are written here; everything else already arrived through write_batch
+        with self.__write_lock:
+            cursor = self.__writer.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.executemany(self.UPSERT_META, list((header or {}).items()))
+                cursor.executemany(self.UPSERT_CUSTOMER, [self._customer_row(customer) for customer, _ in groups])
+                cursor.executemany(self.UPSERT_ACCOUNT, [self._account_row(state) for _, states in groups for state in states])
+                cursor.executemany(self.INSERT_ENTRY, self.__ledger.drain())
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+    
+    def checkpoint(self):
+        # folds the wal back into the database file so it does not grow without bound
+        with self.__write_lock:
+            self.__writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return True
+    
+    def sync(self):
+        # flushes ledger entries appended without a record, e.g. by eviction
+        if self.__ledger.has_pending():
+            self.write_batch([])
+    
+    def close(self):
+        self.sync()
+        with self.__write_lock, self.__read_lock:
+            self.__reader.close()
+            self.__writer.close()
+
+
+class GroupCommitter:
+    def __init__(self, journal, window: float = 0.001, max_batch: int = 512, on_commit=None):
+        self.__journal = journal
+        self.__window = window
+        self.__max_batch = max_batch
+        self.__on_commit = on_commit
+        self.__condition = threading.Condition()
+        self.__queue = []
+        self.__submitted = 0
+        self.__resolved = 0
+        self.__flushing = 0
+        self.__closed = False
+        self.__batches = 0
+        self.__largest_batch = 0
+        self.__latency_total = 0.0
+        self.__latency_max = 0.0
+        self.__recent_latencies = deque(maxlen=1024)
+        self.__thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self.__thread.start()
+    
+    def submit(self, record):
+        future = Future()
+        with self.__condition:
+            if self.__closed:
+                raise Exception("commit log is closed")
+            self.__queue.append((record, future, time.perf_counter()))
+            self.__submitted += 1
+            if len(self.__queue) == 1 or len(self.__queue) >= self.__max_batch:
+                self.__condition.notify_all()
+        return future
+    
+    def _run(self):
+        while True:
+            with self.__condition:
+                while not self.__queue and not self.__closed:
+                    self.__condition.wait()
+                if not self.__queue:
+                    return
+                # hold the batch open for the window so concurrent callers share one fsync
+                deadline = self.__queue[0][2] + self.__window
+                while len(self.__queue) < self.__max_batch and not self.__flushing and not self.__closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self.__condition.wait(remaining)
+                batch = self.__queue[:self.__max_batch]
+                del self.__queue[:self.__max_batch]
+            self._commit(batch)
+    
+    def _commit(self, batch):
+        error = None
+        nbytes = 0
+        try:
+            nbytes = self.__journal.write_batch([record for record, _, _ in batch])
+        except Exception as e:
+            error = e
+        finished = time.perf_counter()
+        if error is None and self.__on_commit is not None:
+            self.__on_commit(len(batch), nbytes)
+        for _, future, _ in batch:
+            if error is None:
+                future.set_result(nbytes)
+            else:
+                future.set_exception(error)
+        with self.__condition:
+            self.__batches += 1
+            self.__largest_batch = max(self.__largest_batch, len(batch))
+            for _, _, started in batch:
+                latency = finished - started
+                self.__latency_total += latency
+                self.__latency_max = max(self.__latency_max, latency)
+                self.__recent_latencies.append(latency)
+            self.__resolved += len(batch)
+            self.__condition.notify_all()
+    
+    def flush(self):
+        with self.__condition:
+            target = self.__submitted
+            self.__flushing += 1
+            self.__condition.notify_all()
+            try:
+                while self.__resolved < target:
+                    self.__condition.wait()
+            finally:
+                self.__flushing -= 1
+    
+    def get_stats(self):
+        with self.__condition:
+            latencies = sorted(self.__recent_latencies)
+            records = self.__resolved
+            return {
+                "batches": self.__batches,
+                "records": records,
+                "avg_batch_size": records / self.__batches if self.__batches else 0.0,
+                "max_batch_size": self.__largest_batch,
+                "avg_latency_ms": self.__latency_total / records * 1000 if records else 0.0,
+                "p99_latency_ms": latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000 if latencies else 0.0,
+                "max_latency_ms": self.__latency_max * 1000
+            }
+    
+    def close(self):
+        self.flush()
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__thread.join()
+
+
+class CommitGate:
+    def __init__(self):
+        self.__condition = threading.Condition()
+        self.__active = 0
+        self.__exclusive = False
+        self.__local = threading.local()
+    
+    def is_held(self):
+        return getattr(self.__local, "depth", 0) > 0
+    
+    def _enter(self): self.__local.depth = getattr(self.__local, "depth", 0) + 1
+    def _leave(self): self.__local.depth -= 1
+    
+    @contextmanager
+    def shared(self):
+        with self.__condition:
+            while self.__exclusive:
+                self.__condition.wait()
+            self.__active += 1
+        self._enter()
+        try:
+            yield
+        finally:
+            self._leave()
+            with self.__condition:
+                self.__active -= 1
+                if not self.__active:
+                    self.__condition.notify_all()
+    
+    @contextmanager
+    def exclusive(self):
+        with self.__condition:
+            while self.__exclusive:
+                self.__condition.wait()
+            self.__exclusive = True
+            while self.__active:
+                self.__condition.wait()
+        self._enter()
+        try:
+            yield
+        finally:
+            self._leave()
+            with self.__condition:
+                self.__exclusive = False
+                self.__condition.notify_all()
+
+
+class Checkpointer:
+    def __init__(self, every_ops: int = 1000, every_bytes: int = 4 * 1024 * 1024):
+        self.__every_ops = every_ops
+        self.__every_bytes = every_bytes
+        self.__ops = 0
+        self.__bytes = 0
+        self.__thread = None
+        self.__lock = threading.Lock()
+    
+    def note(self, nbytes, ops=1):
+        with self.__lock:
+            self.__ops += ops
+            self.__bytes += nbytes
+            return self.__ops >= self.__every_ops or self.__bytes >= self.__every_bytes
+    
+    def is_running(self):
+        return self.__thread is not None and self.__thread.is_alive()
+    
+    def run(self, write, args, background=True):
+        self.wait()
+        self.__ops = 0
+        self.__bytes = 0
+        if not background:
+            return write(*args)
+        self.__thread = threading.Thread(target=write, args=args, name="checkpoint", daemon=True)
+        self.__thread.start()
+        return True
+    
+    def wait(self):
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+
+class TransactionExecutor:
+    def __init__(self, bank=None, max_workers: int = 8):
+        self.__bank = bank
+        self.__pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="txn")
+    
+    def submit(self, transaction):
+        return self.__pool.submit(transaction.execute)
+    
+    def submit_instruction(self, instruction):
+        return self.__pool.submit(self.__bank.submit, instruction)
+    
+    def run_all(self, items):
+        submit = self.submit_instruction if self.__bank is not None else self.submit
+        futures = [submit(item) for item in items]
+        results = []
+        for future in futures:
+            try:
+                results.append((True, future.result()))
+            except Exception as e:
+                results.append((False, str(e)))
+        return results
+    
+    def shutdown(self, wait=True):
+        self.__pool.shutdown(wait=wait)
+
+
+class Histogram:
+    # count/sum/max over the whole run; percentiles come from the most recent samples
+    RECENT = 2048
+    
+    def __init__(self):
+        self.__count = 0
+        self.__sum = 0.0
+        self.__max = 0.0
+        self.__recent = deque(maxlen=self.RECENT)
+    
+    def observe(self, value):
+        self.__count += 1
+        self.__sum += value
+        if value > self.__max:
+            self.__max = value
+        self.__recent.append(value)
+    
+    def summary(self, quantiles=(0.5, 0.9, 0.99)):
+        recent = sorted(self.__recent)
+        data = {"count": self.__count, "sum": self.__sum, "mean": self.__sum / self.__count if self.__count else 0.0, "max": self.__max}
+        for q in quantiles:
+            data[f"p{q * 100:g}"] = recent[min(len(recent) - 1, int(q * len(recent)))] if recent else 0.0
+        return data
+
+
+class Metrics:
+    # instrumentation is patched onto the classes by enable() and removed by disable(),
+    # so a disabled registry costs nothing on the hot paths
+    QUANTILES = (0.5, 0.9, 0.99)
+    # label values must come from a fixed set; messages carry amounts and would add a series per balance
+    REJECTION_REASONS = (
+        ("insufficient funds", "insufficient_funds"),
+        ("amount must be positive", "invalid_amount"),
+        ("not active", "inactive"),
+        ("account is ", "inactive")
+    )
+    
+    def __init__(self):
+        self.__counters = {}
+        self.__histograms = {}
+        self.__lock = threading.Lock()
+        self.__patches = []
+    
+    def is_enabled(self): return bool(self.__patches)
+    
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+    
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram()
+            histogram.observe(value)
+    
+    @contextmanager
+    def timer(self, name, labels=()):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, labels)
+    
+    def reset(self):
+        with self.__lock:
+            self.__counters = {}
+            self.__histograms = {}
+    
+    @staticmethod
+    def _concrete(base):
+        found = []
+        pending = [base]
+        while pending:
+            cls = pending.pop()
+            pending.extend(cls.__subclasses__())
+            if not inspect.isabstract(cls):
+                found.append(cls)
+        return found
+    
+    def _patch(self, cls, name, wrap):
+        # the wrapper lands on the concrete class itself, so a super() call inside it reaches the unwrapped base
+        original = cls.__dict__.get(name)
+        setattr(cls, name, wraps(getattr(cls, name))(wrap(getattr(cls, name))))
+        self.__patches.append((cls, name, original))
+    
+    def enable(self):
+        if self.__patches:
+            return
+        for cls in self._concrete(Transaction):
+            labels = (("type", cls.__name__),)
+            self._patch(cls, "execute", lambda f, labels=labels: self._timed_execute(f, labels))
+            self._patch(cls, "validate", lambda f, labels=labels: self._timed_validate(f, labels))
+        for cls in self._concrete(Account):
+            for op in ("deposit", "withdraw"):
+                labels = (("type", cls.__name__), ("op", op))
+                self._patch(cls, op + "_cents", lambda f, labels=labels: self._timed_call(f, "bank_account_operation_seconds", "bank_account_operation_failures_total", labels))
+        for op in ("save_data", "load_data"):
+            self._patch(BankingSystem, op, lambda f, labels=(("op", op),): self._timed_call(f, "bank_persistence_seconds", "bank_persistence_failures_total", labels))
+        self._patch(IdAllocator, "lease", self._counted_lease)
+    
+    def disable(self):
+        while self.__patches:
+            cls, name, original = self.__patches.pop()
+            if original is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, original)
+    
+    def _timed_call(self, f, seconds, failures, labels):
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            except Exception as e:
+                self.inc(failures, labels + (("reason", type(e).__name__),))
+                raise
+            finally:
+                self.observe(seconds, time.perf_counter() - started, labels)
+        return call
+    
+    def _timed_execute(self, f, labels):
+        def execute(txn):
+            started = time.perf_counter()
+            outcome = "failed"
+            try:
+                result = f(txn)
+                outcome = "completed"
+                return result
+            finally:
+                self.observe("bank_transaction_seconds", time.perf_counter() - started, labels)
+                self.inc("bank_transactions_total", labels + (("outcome", outcome),))
+        return execute
+    
+    @classmethod
+    def rejection_reason(cls, msg):
+        for prefix, reason in cls.REJECTION_REASONS:
+            if prefix in msg:
+                return reason
+        return "other"
+    
+    def _timed_validate(self, f, labels):
+        def validate(txn):
+            started = time.perf_counter()
+            is_valid, msg = f(txn)
+            self.observe("bank_transaction_validate_seconds", time.perf_counter() - started, labels)
+            if not is_valid:
+                self.inc("bank_transaction_rejections_total", labels + (("reason", self.rejection_reason(msg)),))
+            return is_valid, msg
+        return validate
+    
+    def _counted_lease(self, f):
+        def lease(allocator, count=1):
+            started = time.perf_counter()
+            ids = f(allocator, count)
+            labels = (("allocator", allocator.get_name() or "unnamed"),)
+            self.observe("bank_id_lease_seconds", time.perf_counter() - started, labels)
+            self.inc("bank_ids_leased_total", labels, count)
+            return ids
+        return lease
+    
+    def to_dict(self):
+        with self.__lock:
+            counters = sorted(self.__counters.items())
+            histograms = [(key, histogram.summary(self.QUANTILES)) for key, histogram in sorted(self.__histograms.items(), key=lambda item: item[0])]
+        data = {"enabled": self.is_enabled(), "counters": {}, "histograms": {}}
+        for (name, labels), value in counters:
+            data["counters"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+        for (name, labels), summary in histograms:
+            data["histograms"].setdefault(name, []).append(dict(summary, labels=dict(labels)))
+        return data
+    
+    @staticmethod
+    def _prometheus_labels(labels):
+        if not labels:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in labels)
+        return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+    
+    def to_prometheus(self):
+        with self.__lock:
+            counters = sorted(self.__counters.items())
+            histograms = [(key, histogram.summary(self.QUANTILES)) for key, histogram in sorted(self.__histograms.items(), key=lambda item: item[0])]
+        lines = []
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{self._prometheus_labels(labels)} {value}")
+        for (name, labels), summary in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} summary")
+            for q in self.QUANTILES:
+                lines.append(f"{name}{self._prometheus_labels(labels + (('quantile', f'{q:g}'),))} {summary[f'p{q * 100:g}']:.9f}")
+            lines.append(f"{name}_sum{self._prometheus_labels(labels)} {summary['sum']:.9f}")
+            lines.append(f"{name}_count{self._prometheus_labels(labels)} {summary['count']}")
+        return "\n".join(lines) + "\n"
+    
+    def write(self, path, format="json"):
+        text = self.to_prometheus() if format == "prometheus" else json.dumps(self.to_dict(), indent=2)
+        tmp_file = path + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.write(text)
+        os.replace(tmp_file, path)
+
+
+class MetricsReporter:
+    def __init__(self, metrics, path: str, format: str = "json", interval: float = 10.0):
+        self.__metrics = metrics
+        self.__path = path
+        self.__format = format
+        self.__interval = interval
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+    
+    def start(self):
+        self.__thread.start()
+        return self
+    
+    def _run(self):
+        while not self.__stop.wait(self.__interval):
+            self.__metrics.write(self.__path, self.__format)
+    
+    def stop(self):
+        self.__stop.set()
+        self.__thread.join()
+        self.__metrics.write(self.__path, self.__format)
+
+
+METRICS = Metrics()
+
+
+class SnapshotSerializer(ABC):
+    # a serializer writes and reads a whole bank as a header plus customer and account dicts
+    NAME = None
+    EXTENSION = None
+    
+    @abstractmethod
+    def dump(self, path, header, customers, accounts):
+        pass
+    
+    @abstractmethod
+    def load(self, path):
+        pass
+    
+    @abstractmethod
+    def matches(self, prefix):
+        pass
+
+class JsonSerializer(SnapshotSerializer):
+    NAME = "json"
+    EXTENSION = ".export.json"
+    
+    def __init__(self, indent=None):
+        self.__indent = indent
+    
+    def dump(self, path, header, customers, accounts):
+        data = dict(header)
+        data["customers"] = list(customers)
+        data["accounts"] = list(accounts)
+        # dumps runs the c encoder; dump streams through the pure python one
+        with open(path, "w") as f:
+            f.write(json.dumps(data, indent=self.__indent))
+    
+    def load(self, path):
+        with open(path) as f:
+            return json.load(f)
+    
+    def matches(self, prefix):
+        return prefix.lstrip()[:1] == b"{"
+
+class ColumnarSerializer(SnapshotSerializer):
+    NAME = "columnar"
+    EXTENSION = ".col"
+    MAGIC = b"FBCOL001"
+    ALIGN = 8
+    INT_NULL = -2 ** 63
+    
+    def matches(self, prefix):
+        return prefix.startswith(self.MAGIC)
+    
+    @staticmethod
+    def _column_kind(values):
+        # q int64, d float64, s index into the string table, j json text in the string table
+        kinds = {type(value) for value in values} - {type(None)}
+        if not kinds or kinds == {str}:
+            return "s"
+        if kinds == {int}:
+            return "q"
+        if kinds <= {int, float}:
+            return "d"
+        return "j"
+    
+    def dump(self, path, header, customers, accounts):
+        strings = {"": 0}
+        tables = {}
+        blocks = []
+        offset = 0
+        for table, rows in (("customers", customers), ("accounts", accounts)):
+            # rows sharing a key set (in practice, one per customer or account type) form a partition with fixed columns
+            partitions = {}
+            for row in rows:
+                partitions.setdefault(tuple(row), []).append(row)
+            layouts = []
+            for names, members in partitions.items():
+                columns = []
+                for name in names:
+                    values = [row[name] for row in members]
+                    kind = self._column_kind(values)
+                    if kind == "q":
+                        column = array.array("q", [self.INT_NULL if value is None else value for value in values])
+                    elif kind == "d":
+                        column = array.array("d", [math.nan if value is None else value for value in values])
+                    else:
+                        if kind == "j":
+                            values = [None if value is None else json.dumps(value) for value in values]
+                        intern = strings.setdefault
+                        column = array.array("q", [-1 if value is None else intern(value, len(strings)) for value in values])
+                    raw = column.tobytes()
+                    columns.append([name, kind, offset])
+                    blocks.append(raw)
+                    offset += len(raw)
+                layouts.append({"rows": len(members), "columns": columns})
+            tables[table] = layouts
+        
+        # one utf-8 blob; offsets count characters so the whole blob decodes in one call
+        ends = array.array("q", itertools.accumulate(map(len, strings)))
+        blocks.append(ends.tobytes())
+        blocks.append("".join(strings).encode("utf-8"))
+        meta = {
+            "header": header,
+            "byteorder": sys.byteorder,
+            "tables": tables,
+            "strings": {"count": len(strings), "ends": offset, "blob": offset + len(blocks[-2]), "bytes": len(blocks[-1])}
+        }
+        encoded = LedgerStore.ENCODER.encode(meta).encode("utf-8")
+        start = -(-(len(self.MAGIC) + 8 + len(encoded)) // self.ALIGN) * self.ALIGN
+        with open(path, "wb") as f:
+            f.write(self.MAGIC)
+            f.write(struct.pack("<Q", start))
+            f.write(encoded.ljust(start - len(self.MAGIC) - 8, b" "))
+            for block in blocks:
+                f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def load(self, path):
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            body = None
+            try:
+                if view[:len(self.MAGIC)] != self.MAGIC:
+                    raise ValueError(f"{path} is not a columnar snapshot")
+                start = struct.unpack_from("<Q", mapped, len(self.MAGIC))[0]
+                meta = json.loads(bytes(view[len(self.MAGIC) + 8:start]))
+                if meta["byteorder"] != sys.byteorder:
+                    raise ValueError(f"{path} was written on a {meta['byteorder']}-endian machine")
+                body = view[start:]
+                
+                info = meta["strings"]
+                text = str(body[info["blob"]:info["blob"] + info["bytes"]], "utf-8")
+                ends = body[info["ends"]:info["ends"] + 8 * info["count"]].cast("q").tolist()
+                strings = [text[begin:end] for begin, end in zip([0] + ends, ends)]
+                strings.append(None)
                 
-                if not customer:
-                    print(f"warning: account {acc_data.get('account_number')} has invalid holder_id {holder_id}")
+                data = dict(meta["header"])
+                for table, layouts in meta["tables"].items():
+                    rows = data[table] = []
+                    for layout in layouts:
+                        count = layout["rows"]
+                        names, values = [], []
+                        for name, kind, offset in layout["columns"]:
+                            # numeric columns are read straight out of the mapping
+                            column = body[offset:offset + 8 * count].cast("d" if kind == "d" else "q").tolist()
+                            if kind == "s":
+                                column = list(map(strings.__getitem__, column))
+                            elif kind == "j":
+                                column = [None if i < 0 else json.loads(strings[i]) for i in column]
+                            elif kind == "d":
+                                if any(map(math.isnan, column)):
+                                    column = [None if value != value else value for value in column]
+                            elif self.INT_NULL in column:
+                                column = [None if value == self.INT_NULL else value for value in column]
+                            names.append(name)
+                            values.append(column)
+                        rows.extend(dict(zip(names, row)) for row in zip(*values))
+                return data
+            finally:
+                if body is not None:
+                    body.release()
+                view.release()
+
+SERIALIZERS = {serializer.NAME: serializer for serializer in (JsonSerializer(), ColumnarSerializer())}
+
+
+class BankingSystem:
+    SNAPSHOT_FORMAT = "jsonl-directory-1"
+    GROUP_BYTES_ESTIMATE = 1024
+    
+    def __init__(self, data_file: str = "banking_data.json", checkpoint_ops: int = 1000, checkpoint_bytes: int = 4 * 1024 * 1024,
+                 commit_window: float = 0.001, commit_batch: int = 512, lazy: bool = True, cache_customers: int = None, cache_bytes: int = None,
+                 backend=None, shard=None, idempotency_entries: int = 10_000, idempotency_ttl: float = 24 * 3600.0):
+        self.__customers = {}
+        self.__customer_index = CustomerIndex()
+        self.__accounts = {}
+        # keyed requests answered from here instead of running twice; transactions themselves live in the ledger
+        self.__receipts = IdempotencyCache(idempotency_entries, idempotency_ttl)
+        self.__customer_ids = IdAllocator(1, on_reserve=lambda ceiling: self._log({"op": "reserve_ids", "kind": "customer", "ceiling": ceiling}), name="customer")
+        self.__account_numbers = IdAllocator(1000, on_reserve=lambda ceiling: self._log({"op": "reserve_ids", "kind": "account", "ceiling": ceiling}), name="account")
+        self.__next_transaction_id = 1
+        self.__data_file = data_file
+        if backend == "sqlite":
+            backend = SqliteBackend(os.path.splitext(data_file)[0] + ".db")
+        self.__backend = backend
+        if backend is None:
+            self.__ledger = LedgerStore(os.path.splitext(data_file)[0] + ".ledger")
+            self.__journal = Journal(os.path.splitext(data_file)[0] + ".journal", on_sync=self.__ledger.sync)
+        else:
+            self.__ledger = backend.get_ledger()
+            self.__journal = None
+        self.__checkpointer = Checkpointer(checkpoint_ops, checkpoint_bytes)
+        self.__committer = GroupCommitter(self.__journal or backend, commit_window, commit_batch, on_commit=self._on_commit)
+        self.__checkpoint_due = False
+        self.__checkpoint_lock = threading.Lock()
+        self.__gate = CommitGate()
+        self.__id_lock = threading.Lock()
+        self.__migrate_history = False
+        self.__lazy = lazy
+        self.__directory = {}
+        self.__account_owner = {}
+        self.__snapshot_fd = None
+        self.__hydrate_lock = threading.RLock()
+        self.__snapshot_groups = 0
+        self.__hydrated_groups = 0
+        self.__hydrated_bytes = 0
+        self.__cache_customers = cache_customers
+        self.__cache_bytes = cache_bytes
+        self.__resident = OrderedDict()
+        self.__resident_bytes = 0
+        self.__dirty = set()
+        self.__overlay = {}
+        self.__overlay_fd = None
+        self.__overlay_size = 0
+        self.__eviction_due = False
+        self.__cache_hits = 0
+        self.__cache_misses = 0
+        self.__cache_evictions = 0
+        self.__cache_write_backs = 0
+        self.__aggregates = BalanceAggregates()
+        self.__aggregates_stale = False
+        # (index, count) when this bank is one shard of a ShardedBank; every id it hands out is tagged with the index
+        self.__shard = shard
+        self.__holds = {}
+    
+    # six or more digits keep sequence ids apart from the four-digit random ids of older data
+    def generate_customer_id(self, name: str):
+        return self._shard_tag(f"c{name.lower()[:3]}{self.__customer_ids.next():06d}")
+    
+    def generate_account_number(self, customer_name: str):
+        return self._shard_tag(f"a{customer_name.lower()[:3]}{self.__account_numbers.next():06d}")
+    
+    def _shard_tag(self, key):
+        # a shard's ids end in its index, so the router reads the owner off the id itself
+        return key if self.__shard is None else f"{key}s{self.__shard[0]}"
+    
+    def generate_transaction_id(self):
+        with self.__id_lock:
+            txn_id = f"txn{self.__next_transaction_id:08d}"
+            self.__next_transaction_id += 1
+        return txn_id
+    
+    def add_customer(self, customer):
+        self.__customer_index.add(customer)
+        customer._attach_aggregates(self.__aggregates)
+        self.__customers[customer.get_customer_id()] = customer
+        self._make_resident(customer.get_customer_id())
+    
+    def remove_customer(self, customer_id):
+        customer = self.find_customer(customer_id)
+        if not customer:
+            raise ValueError(f"customer {customer_id} not found")
+        if customer.get_account_count():
+            raise ValueError("customer still has accounts")
+        with self.__gate.shared():
+            self.__customers.pop(customer_id, None)
+            self._drop_resident(customer_id)
+            self.__customer_index.remove(customer)
+            commit = self._log({"op": "remove_customer", "customer_id": customer_id})
+        self.wait_durable(commit)
+        return customer
+    
+    def add_account(self, account):
+        account._attach_ledger(self.__ledger)
+        self.__accounts[account.get_account_number()] = account
+        # hydrating an account the bank already knows brings no new money into the totals
+        if account.get_account_number() not in self.__account_owner:
+            self.__aggregates.add_account(account)
+        self.__account_owner[account.get_account_number()] = account.get_account_holder().get_customer_id()
+    
+    def find_customer(self, customer_id):
+        customer = self.__customers.get(customer_id)
+        if customer is not None:
+            self._touch(customer_id)
+        else:
+            # another thread may finish hydrating first; _hydrate then hands back its copy
+            customer = self._hydrate(customer_id)
+            self._maybe_evict()
+        return customer
+    
+    def find_account(self, account_number):
+        account = self.__accounts.get(account_number)
+        if account is not None:
+            self._touch(account.get_account_holder().get_customer_id())
+            return account
+        owner = self.__account_owner.get(account_number)
+        if owner is not None:
+            self._hydrate(owner)
+            self._maybe_evict()
+            account = self.__accounts.get(account_number)
+        return account
+    
+    def _touch(self, customer_id):
+        # lookups run outside the gate; the lru order is only changed under the lock checkpoints iterate it with
+        with self.__hydrate_lock:
+            self.__cache_hits += 1
+            try:
+                self.__resident.move_to_end(customer_id)
+            except KeyError:
+                pass
+    
+    def _hydrate(self, customer_id):
+        # a customer and its accounts are stored as one line and always load together
+        with self.__hydrate_lock:
+            entry = self.__overlay.pop(customer_id, None)
+            from_overlay = entry is not None
+            if entry is None:
+                entry = self.__directory.pop(customer_id, None)
+            if entry is None:
+                return self.__customers.get(customer_id)
+            if entry[0] is None:
+                group = self.__backend.read_group(customer_id)
+                if group is None:
+                    return self.__customers.get(customer_id)
+                # there is no file offset; the entry only carries the group's stored size for the byte budget
+                entry = [None, group["bytes"]]
+            else:
+                source = self.__overlay_fd if from_overlay else self.__snapshot_fd
+                group = json.loads(os.pread(source, entry[1], entry[0]))
+            customer = self._load_customer(group["customer"], index=False)
+            for acc_data in group["accounts"]:
+                self._load_account(acc_data)
+            self._make_resident(customer_id, entry, from_overlay)
+            self.__cache_misses += 1
+            if not from_overlay:
+                self.__hydrated_groups += 1
+                self.__hydrated_bytes += entry[1]
+            return customer
+    
+    def _hydrate_all(self):
+        for customer_id in list(self.__directory) + list(self.__overlay):
+            self._hydrate(customer_id)
+    
+    def _iter_account_chunks(self, chunk_size=10_000):
+        # callers hold the gate exclusively; groups on disk are hydrated a chunk at a time and evicted behind the walk
+        yield list(self.__accounts.values())
+        pending = list(self.__directory) + list(self.__overlay)
+        for start in range(0, len(pending), chunk_size):
+            accounts = []
+            for customer_id in pending[start:start + chunk_size]:
+                customer = self._hydrate(customer_id)
+                if customer is not None:
+                    accounts.extend(customer.iter_accounts())
+            yield accounts
+            if self.__eviction_due:
+                self._evict()
+    
+    def _make_resident(self, customer_id, entry=None, from_overlay=False):
+        # entry is where an unmodified copy of the group lives; None means only memory has it
+        with self.__hydrate_lock:
+            size = entry[1] if entry is not None else self.GROUP_BYTES_ESTIMATE
+            self._drop_resident(customer_id)
+            self.__resident[customer_id] = [entry, from_overlay, size]
+            self.__resident_bytes += size
+            if self._over_capacity(1.0):
+                self.__eviction_due = True
+    
+    def _drop_resident(self, customer_id):
+        with self.__hydrate_lock:
+            slot = self.__resident.pop(customer_id, None)
+            if slot is not None:
+                self.__resident_bytes -= slot[2]
+            self.__dirty.discard(customer_id)
+    
+    def _over_capacity(self, fraction):
+        if self.__cache_customers is not None and len(self.__resident) > self.__cache_customers * fraction:
+            return True
+        return self.__cache_bytes is not None and self.__resident_bytes > self.__cache_bytes * fraction
+    
+    def _maybe_evict(self):
+        # eviction needs every operation drained so no caller is holding an object that is about to go
+        if not self.__eviction_due or self.__gate.is_held():
+            return
+        with self.__gate.exclusive():
+            self._evict()
+    
+    def _evict(self):
+        with self.__hydrate_lock:
+            self.__eviction_due = False
+            if self.__backend is None:
+                while len(self.__resident) > 1 and self._over_capacity(0.9):
+                    customer_id, (entry, from_overlay, _) = next(iter(self.__resident.items()))
+                    self._evict_group(customer_id, entry, from_overlay)
+                return
+            # a write-through backend must hold every recorded change before a group is dropped and read back;
+            # dirty groups carry changes no record has captured yet (a period close in progress) and stay
+            self.__committer.flush()
+            for customer_id in list(self.__resident):
+                if len(self.__resident) <= 1 or not self._over_capacity(0.9):
+                    break
+                if customer_id not in self.__dirty:
+                    entry, from_overlay, _ = self.__resident[customer_id]
+                    self._evict_group(customer_id, entry, from_overlay)
+    
+    def _evict_group(self, customer_id, entry, from_overlay):
+        customer = self.__customers.get(customer_id)
+        accounts = customer.get_accounts_list() if customer is not None else []
+        for account in accounts:
+            self.__ledger.append(account.get_account_number(), account._take_unlogged_transactions())
+        if customer is not None and self.__backend is not None and entry is None:
+            groups = [(customer.to_dict(), [account.to_dict() for account in accounts])]
+            self.__backend.write_groups(groups)
+            self.__directory[customer_id] = [None, self.GROUP_BYTES_ESTIMATE]
+            self.__cache_write_backs += 1
+        elif customer is not None and (entry is None or customer_id in self.__dirty):
+            self.__overlay[customer_id] = self._write_back(customer, accounts)
+            self.__cache_write_backs += 1
+        elif from_overlay:
+            self.__overlay[customer_id] = entry
+        elif entry is not None:
+            self.__directory[customer_id] = entry
+        for account in accounts:
+            self.__accounts.pop(account.get_account_number(), None)
+        self.__customers.pop(customer_id, None)
+        self._drop_resident(customer_id)
+        self.__cache_evictions += 1
+    
+    def _write_back(self, customer, accounts):
+        # modified groups go to a scratch file until the next checkpoint folds them into the snapshot
+        if self.__overlay_fd is None:
+            self.__overlay_fd = os.open(os.path.splitext(self.__data_file)[0] + ".overlay", os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            self.__overlay_size = 0
+        accounts_data = [account.to_dict() for account in accounts]
+        line = LedgerStore.ENCODER.encode({"customer": customer.to_dict(), "accounts": accounts_data}).encode("utf-8") + b"\n"
+        os.pwrite(self.__overlay_fd, line, self.__overlay_size)
+        entry = [self.__overlay_size, len(line), [a["account_number"] for a in accounts_data], *CustomerIndex.keys(customer)]
+        self.__overlay_size += len(line)
+        return entry
+    
+    def get_cache_stats(self):
+        return {
+            "hits": self.__cache_hits,
+            "misses": self.__cache_misses,
+            "evictions": self.__cache_evictions,
+            "write_backs": self.__cache_write_backs,
+            "resident_customers": len(self.__resident),
+            "resident_bytes": self.__resident_bytes,
+            "dirty_customers": len(self.__dirty),
+            "overlay_customers": len(self.__overlay),
+            "capacity_customers": self.__cache_customers,
+            "capacity_bytes": self.__cache_bytes
+        }
+    
+    def get_aggregates(self):
+        if self.__aggregates_stale:
+            self.verify_aggregates(repair=True)
+        return self.__aggregates.to_dict()
+    
+    def verify_aggregates(self, repair=False):
+        # recomputes every total from the accounts themselves; anything that disagrees with the running totals is drift
+        expected = BalanceAggregates()
+        drifted = []
+        with self.__gate.exclusive():
+            for accounts in self._iter_account_chunks():
+                holders = {}
+                for account in accounts:
+                    expected.add_account(account)
+                    holders[id(account.get_account_holder())] = account.get_account_holder()
+                drifted.extend(customer.get_customer_id() for customer in holders.values() if not customer.verify_totals(repair))
+            actual = self.__aggregates.to_dict()
+            expected = expected.to_dict()
+            if repair:
+                self.__aggregates.reset(expected)
+                self.__aggregates_stale = False
+        return {"ok": actual == expected and not drifted, "expected": expected, "actual": actual, "drifted_customers": drifted}
+    
+    def get_load_stats(self):
+        return {
+            "snapshot_customers": self.__snapshot_groups,
+            "hydrated_customers": self.__hydrated_groups,
+            "resident_customers": len(self.__customers),
+            "resident_accounts": len(self.__accounts),
+            "bytes_hydrated": self.__hydrated_bytes,
+            "touched": self.__hydrated_groups / self.__snapshot_groups if self.__snapshot_groups else 0.0
+        }
+    
+    def find_customer_by_email(self, email):
+        return self.find_customer(self.__customer_index.find_by_email(email))
+    
+    def find_customer_by_tax_id(self, tax_id):
+        return self.find_customer(self.__customer_index.find_by_tax_id(tax_id))
+    
+    def find_customers_by_phone(self, phone):
+        return self._resolve_customers(self.__customer_index.find_by_phone(phone))
+    
+    def search_customers(self, name_prefix, limit=20):
+        return self._resolve_customers(self.__customer_index.search_name(name_prefix, limit))
+    
+    def _resolve_customers(self, customer_ids):
+        customers = [self.find_customer(cust_id) for cust_id in customer_ids]
+        return [customer for customer in customers if customer]
+    
+    def create_customer(self, customer_type, name, email, phone, address, date_of_birth=None, company_name=None, tax_id=None):
+        if customer_type == "corporate" and (not company_name or not tax_id):
+            raise ValueError("company name and tax id required")
+        if customer_type not in ("individual", "corporate"):
+            raise ValueError("invalid type")
+        
+        # allocation and the customer record share the gate so a checkpoint never splits them
+        with self.__gate.shared():
+            cust_id = self.generate_customer_id(name)
+            if customer_type == "individual":
+                customer = IndividualCustomer(cust_id, name, email, phone, address, date_of_birth or "1990-01-01")
+            else:
+                customer = CorporateCustomer(cust_id, name, email, phone, address, company_name, tax_id)
+            self.add_customer(customer)
+            commit = self._log({"op": "customer", "data": customer.to_dict()})
+        self.wait_durable(commit)
+        return customer
+    
+    def create_account(self, customer_id, account_type, amount=None):
+        if account_type in ("savings", "checking"):
+            amount = amount if amount is not None else Validator.validate_amount("initial balance: $")
+        elif account_type == "loan":
+            amount = amount if amount is not None else Validator.validate_amount("loan amount: $")
+        else:
+            raise ValueError("invalid type")
+        
+        with self.__gate.shared():
+            # looked up under the gate; a Customer fetched before it may have been evicted since
+            customer = self.find_customer(customer_id)
+            if not customer:
+                raise ValueError("customer not found")
+            acc_num = self.generate_account_number(customer.get_name())
+            if account_type == "savings":
+                account = SavingsAccount(acc_num, customer, amount)
+            elif account_type == "checking":
+                account = CheckingAccount(acc_num, customer, amount)
+            else:
+                account = LoanAccount(acc_num, customer, amount)
+            self.add_account(account)
+            customer.add_account(account)
+            # journaled here like every transaction, so callers never have to remember log_accounts
+            with account.get_lock():
+                commit = self._log_accounts([account])
+        self.wait_durable(commit)
+        EVENTS.emit("account_opened", account=acc_num, account_type=account_type)
+        return account
+    
+    def _require_account(self, account_number):
+        account = self.find_account(account_number)
+        if not account:
+            raise ValueError(f"account {account_number} not found")
+        return account
+    
+    def _build_transaction(self, instruction):
+        op = instruction.get("op")
+        amount = instruction.get("amount")
+        account = self._require_account(instruction.get("account"))
+        if op == "deposit":
+            return DepositTransaction(self.generate_transaction_id(), account, amount, instruction.get("method") or "cash"), (account,)
+        if op == "withdraw":
+            return WithdrawalTransaction(self.generate_transaction_id(), account, amount, instruction.get("method") or "atm"), (account,)
+        if op == "transfer":
+            dest = self._require_account(instruction.get("to_account"))
+            return TransferTransaction(self.generate_transaction_id(), account, dest, amount), (account, dest)
+        raise ValueError(f"unknown operation {op}")
+    
+    def submit(self, instruction):
+        txn, commit = self.submit_nowait(instruction)
+        self.wait_durable(commit)
+        return txn
+    
+    def submit_nowait(self, instruction):
+        txn, _, commit = self._execute(instruction)
+        return txn, commit
+    
+    def _execute(self, instruction, key=None):
+        with self.__gate.shared():
+            txn, accounts = self._build_transaction(instruction)
+            with Transaction.lock_accounts(*accounts):
+                txn.execute()
+                receipt = self._receipt(instruction["op"], txn, accounts[0])
+                commit = self._log_accounts(accounts, txn, receipts=None if key is None else [(key, receipt)])
+        return txn, receipt, commit
+    
+    @staticmethod
+    def _receipt(op, txn, account):
+        return {
+            "transaction_id": txn.get_transaction_id(),
+            "op": op,
+            "account": account.get_account_number(),
+            "amount_cents": txn.get_amount_cents(),
+            "ts": txn.get_ts(),
+            "balance_cents": account.get_balance_cents()
+        }
+    
+    def post(self, instruction):
+        receipt, commit = self.post_nowait(instruction)
+        if commit is not None:
+            self.wait_durable(commit)
+        return receipt
+    
+    def post_nowait(self, instruction):
+        # answers with a receipt; an instruction carrying a key that was seen before gets the original receipt back without running again
+        key = instruction.get("key")
+        if key is None:
+            _, receipt, commit = self._execute(instruction)
+            return receipt, commit
+        replay = self.__receipts.claim(key)
+        if replay is not None:
+            return dict(replay.result(), replayed=True), None
+        try:
+            _, receipt, commit = self._execute(instruction, key)
+        except Exception as e:
+            # nothing was posted, so a later retry may run it
+            self.__receipts.resolve(key, error=e)
+            raise
+        commit.add_done_callback(lambda _: self.__receipts.resolve(key, receipt))
+        return receipt, commit
+    
+    def get_idempotency_stats(self):
+        return self.__receipts.get_stats()
+    
+    def wait_durable(self, commit):
+        # callers block after releasing account locks so they can share a group commit
+        commit.result()
+        self._maybe_checkpoint()
+        self._maybe_evict()
+    
+    def deposit(self, account_number, amount, method="cash", key=None):
+        return self.post({"op": "deposit", "account": account_number, "amount": amount, "method": method, "key": key})
+    
+    def withdraw(self, account_number, amount, method="atm", key=None):
+        return self.post({"op": "withdraw", "account": account_number, "amount": amount, "method": method, "key": key})
+    
+    def transfer(self, from_account, to_account, amount, key=None):
+        return self.post({"op": "transfer", "account": from_account, "to_account": to_account, "amount": amount, "key": key})
+    
+    # first phase of a cross-shard transfer: the source side withdraws into a hold,
+    # the destination side only checks it could take the deposit
+    def prepare_transfer(self, txn_id, side, account_number, amount, key=None):
+        if side not in ("out", "in"):
+            raise ValueError(f"unknown transfer side {side}")
+        # a key is deduplicated by the source shard; a repeat answers with the original receipt and prepares nothing
+        key = key if side == "out" else None
+        if key is not None:
+            replay = self.__receipts.claim(key)
+            if replay is not None:
+                return dict(replay.result(), replayed=True)
+        try:
+            with self.__gate.shared():
+                account = self._require_account(account_number)
+                with account.get_lock():
+                    if txn_id in self.__holds:
+                        return dict(self.__holds[txn_id])
+                    if side == "out":
+                        txn = WithdrawalTransaction(txn_id, account, amount)
+                    else:
+                        txn = DepositTransaction(txn_id, account, amount)
+                    is_valid, msg = txn.validate()
+                    if not is_valid:
+                        raise ValueError(msg)
+                    cents = txn.get_amount_cents()
+                    if side == "out":
+                        account.withdraw_cents(cents)
+                    elif isinstance(account, LoanAccount) and cents < account.get_monthly_payment_cents() and cents < account.get_remaining_balance_cents():
+                        raise ValueError(f"minimum payment: ${account.get_monthly_payment_cents() / 100:.2f}")
+                    hold = {"txn": txn_id, "side": side, "account": account_number, "amount_cents": cents}
+                    if key is not None:
+                        hold["key"] = key
+                    self.__holds[txn_id] = hold
+                    commit = self._log_accounts([account] if side == "out" else [], hold=hold)
+        except Exception as e:
+            if key is not None:
+                self.__receipts.resolve(key, error=e)
+            raise
+        self.wait_durable(commit)
+        return dict(hold)
+    
+    # second phase; finishing an unknown transaction is a no-op so the coordinator can retry after a crash
+    def finish_transfer(self, txn_id, commit):
+        with self.__gate.shared():
+            hold = self.__holds.get(txn_id)
+            if hold is None:
+                return None
+            account = self._require_account(hold["account"])
+            with account.get_lock():
+                if self.__holds.get(txn_id) is not hold:
+                    return None
+                # an aborted withdrawal is refunded, a committed deposit lands; the other two only drop the hold
+                moves = (hold["side"] == "in") == bool(commit)
+                if moves:
+                    account.deposit_cents(hold["amount_cents"])
+                del self.__holds[txn_id]
+                receipt = {
+                    "transaction_id": txn_id,
+                    "op": "transfer",
+                    "account": hold["account"],
+                    "amount_cents": hold["amount_cents"],
+                    "ts": CLOCK.now_us(),
+                    "balance_cents": account.get_balance_cents()
+                }
+                key = hold.get("key") if commit else None
+                durable = self._log_accounts([account] if moves else [], release=txn_id, receipts=None if key is None else [(key, receipt)])
+        if "key" in hold:
+            durable.add_done_callback(lambda _: self.__receipts.resolve(hold["key"], receipt, None if commit else Exception("transfer aborted")))
+        self.wait_durable(durable)
+        return receipt
+    
+    def get_holds(self):
+        return [dict(hold) for hold in self.__holds.values()]
+    
+    def apply_batch(self, instructions, chunk_size=10_000):
+        # each chunk gets its own journal record and gate entry, so checkpoints and eviction run between chunks
+        report = {"results": [], "completed": 0, "duplicates": 0}
+        started = time.perf_counter()
+        lines = enumerate(instructions, 1)
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if not chunk:
+                break
+            commit = self._apply_batch_chunk(chunk, report)
+            if commit is not None:
+                self.wait_durable(commit)
+        results = report["results"]
+        elapsed = time.perf_counter() - started
+        return {
+            "results": results,
+            "completed": report["completed"],
+            "duplicates": report["duplicates"],
+            "failed": len(results) - report["completed"] - report["duplicates"],
+            "elapsed": elapsed,
+            "ops_per_sec": len(results) / elapsed if elapsed > 0 else 0.0
+        }
+    
+    def _apply_batch_chunk(self, lines, report):
+        results = report["results"]
+        touched = {}
+        receipts = {}
+        last_txn = None
+        commit = None
+        with self.__gate.shared():
+            try:
+                for line, instruction in lines:
+                    key = None
+                    try:
+                        if isinstance(instruction, str):
+                            instruction = json.loads(instruction)
+                        if not isinstance(instruction, dict):
+                            raise ValueError("batch line is not an object")
+                        # csv rows without a key carry an empty string
+                        key = instruction.get("key") or None
+                        if key is not None:
+                            original = receipts.get(key)
+                            if original is None:
+                                replay = self.__receipts.claim(key)
+                                original = replay.result() if replay is not None else None
+                            if original is not None:
+                                report["duplicates"] += 1
+                                results.append({"line": line, "status": "duplicate", "transaction_id": original["transaction_id"]})
+                                continue
+                        try:
+                            txn, accounts = self._build_transaction(instruction)
+                            with Transaction.lock_accounts(*accounts):
+                                for account in accounts:
+                                    touched[account.get_account_number()] = account
+                                txn.execute()
+                                if key is not None:
+                                    receipts[key] = self._receipt(instruction.get("op"), txn, accounts[0])
+                        except Exception as e:
+                            if key is not None:
+                                self.__receipts.resolve(key, error=e)
+                            raise
+                        last_txn = txn
+                        report["completed"] += 1
+                        results.append({"line": line, "status": "completed", "transaction_id": txn.get_transaction_id()})
+                    except Exception as e:
+                        results.append({"line": line, "status": "failed", "error": str(e)})
+            finally:
+                # whatever ran is journaled, even if the chunk was cut short
+                if touched:
+                    with Transaction.lock_accounts(*touched.values()):
+                        commit = self._log_accounts(touched.values(), last_txn, receipts=receipts.items())
+                    commit.add_done_callback(lambda _: [self.__receipts.resolve(key, receipt) for key, receipt in receipts.items()])
+        return commit
+    
+    @staticmethod
+    def read_batch_file(path):
+        with open(path, "r", newline="") as f:
+            if path.endswith(".csv"):
+                for row in csv.DictReader(f):
+                    yield row
+            else:
+                # parsed per line by apply_batch, so one bad line fails alone
+                for line in f:
+                    if line.strip():
+                        yield line
+    
+    def apply_batch_file(self, path):
+        return self.apply_batch(self.read_batch_file(path))
+    
+    def close_period(self, periods_per_year=12):
+        started = time.perf_counter()
+        totals = {"accounts": 0, "interest_cents": 0, "fees_cents": 0, "accrued_cents": 0}
+        balances = []
+        ts = CLOCK.now_us()
+        with self.__gate.exclusive():
+            for accounts in self._iter_account_chunks():
+                self._close_accounts(accounts, periods_per_year, ts, balances, totals)
+            commit = self._log({"op": "period_close", "balances": balances})
+            if self.__backend is not None:
+                # once the record is durable it carries what the walk changed, and the walked groups can go again
+                commit.result()
+                self.__dirty.clear()
+                self._evict()
+        self.wait_durable(commit)
+        totals["elapsed"] = time.perf_counter() - started
+        return totals
+    
+    def _close_accounts(self, accounts, periods_per_year, ts, balances, totals):
+        savings, checking, loans = [], [], []
+        for account in accounts:
+            if account.get_status() != "active":
+                continue
+            if isinstance(account, SavingsAccount):
+                savings.append(account)
+            elif isinstance(account, CheckingAccount):
+                checking.append(account)
+            elif isinstance(account, LoanAccount):
+                loans.append(account)
+        
+        # rates are computed per account type in one pass; posting back is the only per-account loop
+        savings_interest = Money.apply_rates([a.get_balance_cents() for a in savings], [a.get_interest_rate() / periods_per_year for a in savings], positive_only=True)
+        checking_interest = Money.apply_rates([a.get_balance_cents() for a in checking], [CheckingAccount.INTEREST_RATE / periods_per_year] * len(checking), positive_only=True)
+        loan_accrual = Money.apply_rates([a.get_remaining_balance_cents() for a in loans], [a.get_interest_rate() / periods_per_year for a in loans])
+        
+        for account, interest in zip(savings, savings_interest):
+            if interest:
+                balance = account.get_balance_cents() + interest
+                account._set_balance_cents(balance)
+                account._add_transaction(LedgerEntry.create("interest", interest, balance, description="period interest", ts=ts))
+                balances.append([account.get_account_number(), balance])
+        fees = 0
+        for account, interest in zip(checking, checking_interest):
+            balance = account.get_balance_cents() + interest
+            if interest:
+                account._add_transaction(LedgerEntry.create("interest", interest, balance, description="period interest", ts=ts))
+            fee = account.get_monthly_fee_cents()
+            if fee:
+                balance -= fee
+                fees += fee
+                account._add_transaction(LedgerEntry.create("fee", fee, balance, description="monthly fee", ts=ts))
+            account._set_balance_cents(balance)
+            balances.append([account.get_account_number(), balance])
+        # loan interest is charged when a payment splits principal and interest; the accrual is a memo entry
+        for account, accrued in zip(loans, loan_accrual):
+            if accrued:
+                account._add_transaction(LedgerEntry.create("accrual", accrued, account.get_balance_cents(), interest_cents=accrued, description="interest accrued", ts=ts))
+        
+        closed = savings + checking + loans
+        self.__ledger.append_many([(account.get_account_number(), account._take_unlogged_transactions()) for account in closed])
+        self.__dirty.update(account.get_account_holder().get_customer_id() for account in closed)
+        totals["accounts"] += len(closed)
+        totals["interest_cents"] += sum(savings_interest) + sum(checking_interest)
+        totals["fees_cents"] += fees
+        totals["accrued_cents"] += sum(loan_accrual)
+    
+    def payoff_quote(self, account_number, as_of=None):
+        loan = self._require_account(account_number)
+        if not isinstance(loan, LoanAccount):
+            raise ValueError(f"account {account_number} is not a loan")
+        return LoanAnalytics.payoff_quote(loan, as_of)
+    
+    def loan_schedule(self, account_number):
+        loan = self._require_account(account_number)
+        if not isinstance(loan, LoanAccount):
+            raise ValueError(f"account {account_number} is not a loan")
+        with self.__gate.shared(), loan.get_lock():
+            rows, position = loan.get_schedule()
+            payments_made = loan.get_payments_made()
+        return {
+            "account_number": account_number,
+            "payments_made": payments_made,
+            "installments": [
+                {"due_cents": due, "interest_cents": interest, "principal_cents": principal, "remaining_cents": remaining}
+                for due, interest, principal, remaining in rows[position:]
+            ]
+        }
+    
+    def loan_report(self, as_of=None):
+        reports = []
+        with self.__gate.exclusive():
+            for accounts in self._iter_account_chunks():
+                reports.append(LoanAnalytics.portfolio_report([a for a in accounts if isinstance(a, LoanAccount)], as_of))
+        return LoanAnalytics.merge_reports(reports)
+    
+    def iter_statement(self, account_number, start=None, end=None, types=None, cursor=None):
+        # start is inclusive and end exclusive; both take microseconds or "yyyy-mm-dd[ hh:mm:ss]"
+        start_us, end_us = Clock.parse(start), Clock.parse(end)
+        skip = 0
+        if cursor:
+            cursor_ts, skip = (int(part) for part in cursor.split(":"))
+            start_us = cursor_ts if start_us is None else max(start_us, cursor_ts)
+            skip = skip if start_us == cursor_ts else 0
+        unknown = set(types or ()) - set(LedgerEntry.CODES)
+        if unknown:
+            raise ValueError(f"unknown entry types {sorted(unknown)}")
+        codes = None if types is None else {LedgerEntry.CODES[entry_type] for entry_type in types}
+        with self.__gate.shared():
+            account = self._require_account(account_number)
+            with account.get_lock():
+                entries = account.query_history(start_us, end_us)
+        return self._statement_rows(entries, codes, start_us, skip, lambda ts: self._balance_before(account_number, ts))
+    
+    def _balance_before(self, account_number, ts):
+        # entries from before balance_after was recorded: walk back from the live balance over everything since ts
+        with self.__gate.shared():
+            account = self._require_account(account_number)
+            with account.get_lock():
+                balance = account.get_balance_cents()
+                for entry in account.query_history(ts):
+                    balance -= entry.balance_delta()
+        return balance
+    
+    @staticmethod
+    def _statement_rows(entries, codes, first_ts, skip, balance_before):
+        # one pass: running balance, type filter and the resume cursor ("ts:entries already seen at ts")
+        balance = None
+        run_ts, run_count = first_ts, 0
+        for entry in entries:
+            if entry.balance_after is not None:
+                balance = entry.balance_after
+            else:
+                if balance is None:
+                    balance = balance_before(entry.ts)
+                balance += entry.balance_delta()
+            if entry.ts == run_ts:
+                run_count += 1
+                if run_count <= skip:
                     continue
+            else:
+                run_ts, run_count = entry.ts, 1
+            if codes is not None and entry.code not in codes:
+                continue
+            row = {
+                "ts": entry.ts,
+                "type": LedgerEntry.TYPES[entry.code],
+                "amount_cents": entry.amount,
+                "change_cents": entry.balance_delta(),
+                "balance_cents": balance,
+                "cursor": f"{run_ts}:{run_count}"
+            }
+            if entry.principal is not None:
+                row["principal_cents"] = entry.principal
+            if entry.interest is not None:
+                row["interest_cents"] = entry.interest
+            if entry.description is not None:
+                row["description"] = entry.description
+            yield row
+    
+    def statement(self, account_number, start=None, end=None, types=None, cursor=None, limit=100):
+        rows = list(itertools.islice(self.iter_statement(account_number, start, end, types, cursor), limit + 1))
+        page = rows[:limit]
+        return {
+            "account_number": account_number,
+            "entries": page,
+            "opening_balance_cents": page[0]["balance_cents"] - page[0]["change_cents"] if page and page[0]["balance_cents"] is not None else None,
+            "closing_balance_cents": page[-1]["balance_cents"] if page else None,
+            "next_cursor": page[-1]["cursor"] if len(rows) > limit else None
+        }
+    
+    def log_customer(self, customer):
+        with self.__gate.shared():
+            commit = self._log({"op": "customer", "data": customer.to_dict()})
+        self.wait_durable(commit)
+    
+    def log_accounts(self, *accounts, txn=None):
+        with self.__gate.shared():
+            with Transaction.lock_accounts(*accounts):
+                commit = self._log_accounts(accounts, txn)
+        self.wait_durable(commit)
+    
+    def _log_accounts(self, accounts, txn=None, hold=None, release=None, receipts=None):
+        states = []
+        for account in accounts:
+            self.__ledger.append(account.get_account_number(), account._take_unlogged_transactions())
+            states.append(account.to_dict())
+            if self.__backend is None:
+                self.__dirty.add(account.get_account_holder().get_customer_id())
+        record = {"op": "accounts", "data": states}
+        if txn is not None:
+            record["txn"] = txn.get_transaction_id()
+        if hold is not None:
+            record["hold"] = hold
+        if release is not None:
+            record["release"] = release
+        if receipts:
+            record["receipts"] = [[key, receipt] for key, receipt in receipts]
+            for key, receipt in record["receipts"]:
+                self.__receipts.record(key, receipt)
+        return self._log(record)
+    
+    def _log(self, record):
+        return self.__committer.submit(record)
+    
+    def _on_commit(self, count, nbytes):
+        if self.__checkpointer.note(nbytes, count):
+            self.__checkpoint_due = True
+    
+    def is_checkpoint_due(self): return self.__checkpoint_due
+    
+    def is_eviction_due(self): return self.__eviction_due
+    
+    def get_commit_stats(self):
+        return self.__committer.get_stats()
+    
+    def _maybe_checkpoint(self):
+        # runs outside the commit gate; a checkpoint needs exclusive access to capture
+        if self.__checkpoint_due and not self.__checkpointer.is_running() and not self.__checkpoint_lock.locked():
+            self.__checkpoint_due = False
+            self.checkpoint()
+    
+    def checkpoint(self, background=True):
+        if self.__backend is not None:
+            return self._checkpoint_backend(background)
+        with self.__checkpoint_lock:
+            self.__checkpointer.wait()
+            with self.__gate.exclusive(), self.__hydrate_lock:
+                accounts = list(self.__accounts.values())
+                groups = [
+                    (c.get_customer_id(), c.to_dict(), [a.to_dict() for a in c.iter_accounts()], CustomerIndex.keys(c))
+                    for c in list(self.__customers.values())
+                ]
+                # groups not resident are copied over byte for byte from the snapshot or the write-back file
+                untouched = [(cust_id, entry, self.__snapshot_fd, False) for cust_id, entry in self.__directory.items()]
+                untouched += [(cust_id, entry, self.__overlay_fd, True) for cust_id, entry in self.__overlay.items()]
+                # a dirty group's old copy is stale from here on; the snapshot being written becomes its copy
+                for cust_id in self.__dirty:
+                    slot = self.__resident.get(cust_id)
+                    if slot is not None:
+                        slot[0] = None
+                self.__dirty = set()
+                resident = {cust_id: slot[0] for cust_id, slot in list(self.__resident.items())}
+                data = {
+                    "format": self.SNAPSHOT_FORMAT,
+                    "next_customer_id": self.__customer_ids.checkpoint(),
+                    "next_account_number": self.__account_numbers.checkpoint(),
+                    "next_transaction_id": self.__next_transaction_id,
+                    "aggregates": self.__aggregates.to_dict(),
+                    "holds": list(self.__holds.values()),
+                    "receipts": self.__receipts.to_list()
+                }
+                for account in accounts:
+                    self.__ledger.append(account.get_account_number(), account._take_unlogged_transactions())
+                self.__committer.flush()
+                self.__ledger.sync()
+                ledger_index = self.__ledger.capture_index()
+                data["journal_seq"], data["journal_segment"] = self.__journal.rotate()
+            return self.__checkpointer.run(self._write_snapshot, (data, groups, untouched, resident, ledger_index), background)
+    
+    def _checkpoint_backend(self, background):
+        with self.__checkpoint_lock:
+            self.__checkpointer.wait()
+            with self.__gate.exclusive(), self.__hydrate_lock:
+                for account in list(self.__accounts.values()):
+                    self.__ledger.append(account.get_account_number(), account._take_unlogged_transactions())
+                self.__committer.flush()
+                # groups added without a record exist only in memory; they are written in place, under the gate,
+                # so a later record for the same group cannot be overtaken
+                fresh = [(cust_id, slot) for cust_id, slot in list(self.__resident.items()) if slot[0] is None]
+                groups = []
+                for cust_id, _ in fresh:
+                    customer = self.__customers[cust_id]
+                    groups.append((customer.to_dict(), [account.to_dict() for account in customer.iter_accounts()]))
+                header = {
+                    "next_customer_id": self.__customer_ids.checkpoint(),
+                    "next_account_number": self.__account_numbers.checkpoint(),
+                    "next_transaction_id": self.__next_transaction_id
+                }
+                try:
+                    self.__backend.write_groups(groups, header)
+                    self.__backend.prune_receipts(CLOCK.now_us() - self.__receipts.get_ttl_us(), self.__receipts.get_max_entries())
+                except Exception as e:
+                    EVENTS.emit("checkpoint_failed", error=str(e))
+                    return False
+                for _, slot in fresh:
+                    slot[0] = [None, slot[2]]
+            return self.__checkpointer.run(self.__backend.checkpoint, (), background)
+    
+    def _write_snapshot(self, data, groups, untouched, resident, ledger_index):
+        # layout: header line, one line per customer with its accounts, then the directory line
+        tmp_file = self.__data_file + ".tmp"
+        encode = LedgerStore.ENCODER.encode
+        try:
+            self.__ledger.write_index(ledger_index)
+            directory = {}
+            with open(tmp_file, "wb") as f:
+                data["index_offset"] = "0" * 20
+                f.write(encode(data).encode("utf-8") + b"\n")
+                for cust_id, customer_data, accounts_data, keys in groups:
+                    line = encode({"customer": customer_data, "accounts": accounts_data}).encode("utf-8") + b"\n"
+                    directory[cust_id] = [f.tell(), len(line), [a["account_number"] for a in accounts_data], *keys]
+                    f.write(line)
+                for cust_id, entry, source_fd, _ in untouched:
+                    directory[cust_id] = [f.tell(), *entry[1:]]
+                    f.write(os.pread(source_fd, entry[1], entry[0]))
+                data["index_offset"] = f"{f.tell():020d}"
+                f.write(encode({"directory": directory}).encode("utf-8") + b"\n")
+                f.seek(0)
+                f.write(encode(data).encode("utf-8") + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.__data_file)
+            self._switch_snapshot(directory, untouched, resident)
+            self.__journal.discard_before(data["journal_segment"])
+            return True
+        except Exception as e:
+            EVENTS.emit("checkpoint_failed", error=str(e))
+            return False
+    
+    def _switch_snapshot(self, directory, untouched, resident):
+        with self.__hydrate_lock:
+            previous = self.__snapshot_fd
+            self.__snapshot_fd = os.open(self.__data_file, os.O_RDONLY)
+            remapped = {cust_id: directory[cust_id] for cust_id in self.__directory if cust_id in directory}
+            for cust_id, entry, _, from_overlay in untouched:
+                if from_overlay and self.__overlay.get(cust_id) is entry:
+                    del self.__overlay[cust_id]
+                    remapped[cust_id] = directory[cust_id]
+            self.__directory = remapped
+            # only groups unmodified since the capture match what was written
+            captured = dict(resident)
+            captured.update((cust_id, entry) for cust_id, entry, _, _ in untouched)
+            missing = object()
+            for cust_id, slot in list(self.__resident.items()):
+                if cust_id in directory and cust_id not in self.__dirty and slot[0] is captured.get(cust_id, missing):
+                    slot[0], slot[1] = directory[cust_id], False
+            if not self.__overlay and self.__overlay_fd is not None:
+                for slot in list(self.__resident.values()):
+                    if slot[1]:
+                        slot[0], slot[1] = None, False
+                os.ftruncate(self.__overlay_fd, 0)
+                self.__overlay_size = 0
+            if previous is not None:
+                os.close(previous)
+    
+    def save_data(self, silent=False, path=None, format=None):
+        if path is None and format is None:
+            saved = self.checkpoint(background=False)
+        else:
+            saved = self.export_data(path, format or "json")
+        if not saved:
+            print("save failed")
+            return False
+        if not silent:
+            print(f"data saved")
+        return True
+    
+    def export_data(self, path=None, format="json"):
+        serializer = SERIALIZERS.get(format)
+        if serializer is None:
+            raise ValueError(f"unknown snapshot format {format}")
+        path = path or os.path.splitext(self.__data_file)[0] + serializer.EXTENSION
+        with self.__gate.exclusive(), self.__hydrate_lock:
+            self.__committer.flush()
+            header = {
+                "next_customer_id": self.__customer_ids.get_next(),
+                "next_account_number": self.__account_numbers.get_next(),
+                "next_transaction_id": self.__next_transaction_id,
+                "journal_seq": self.__journal.get_seq() if self.__journal is not None else 0,
+                "aggregates": self.__aggregates.to_dict(),
+                "holds": list(self.__holds.values()),
+                "receipts": self.__receipts.to_list()
+            }
+            # an export is self-contained: each account carries its ledger history, which an import moves into the new ledger
+            customers, accounts = [], []
+            for customer in self.__customers.values():
+                customers.append(customer.to_dict())
+                accounts.extend(account.to_dict(include_history=True) for account in customer.iter_accounts())
+            # groups left on disk are decoded but not hydrated, so an export leaves the cache alone
+            for entries, fd in ((self.__directory, self.__snapshot_fd), (self.__overlay, self.__overlay_fd)):
+                for cust_id, entry in entries.items():
+                    if self.__backend is not None:
+                        group = self.__backend.read_group(cust_id)
+                    else:
+                        group = json.loads(os.pread(fd, entry[1], entry[0]))
+                    customers.append(group["customer"])
+                    for state in group["accounts"]:
+                        state["transaction_history"] = [item.to_dict() for item in self.__ledger.read(state["account_number"])]
+                        accounts.append(state)
+        tmp_file = path + ".tmp"
+        try:
+            serializer.dump(tmp_file, header, customers, accounts)
+            os.replace(tmp_file, path)
+            return True
+        except Exception as e:
+            EVENTS.emit("export_failed", error=str(e))
+            return False
+    
+    def _load_customer(self, cust_data, index=True):
+        if cust_data.get("customer_type") == "IndividualCustomer":
+            customer = IndividualCustomer.from_dict(cust_data)
+        elif cust_data.get("customer_type") == "CorporateCustomer":
+            customer = CorporateCustomer.from_dict(cust_data)
+        else:
+            customer = Customer.from_dict(cust_data)
+        if index:
+            self.__customer_index.add(customer, unique=False)
+        customer._attach_aggregates(self.__aggregates)
+        self.__customers[customer.get_customer_id()] = customer
+        self._make_resident(customer.get_customer_id())
+        return customer
+    
+    def _load_account(self, acc_data):
+        holder_id = acc_data.get("holder_id")
+        customer = self.find_customer(holder_id)
+        
+        if not customer:
+            EVENTS.emit("orphan_account", account=acc_data.get("account_number"), holder=holder_id)
+            return None
+        
+        account_type = acc_data.get("account_type")
+        if account_type == "SavingsAccount":
+            account = SavingsAccount.from_dict(acc_data, customer)
+        elif account_type == "CheckingAccount":
+            account = CheckingAccount.from_dict(acc_data, customer)
+        elif account_type == "LoanAccount":
+            account = LoanAccount.from_dict(acc_data, customer)
+        else:
+            EVENTS.emit("unknown_account_type", account=acc_data.get("account_number"), account_type=account_type)
+            return None
+        
+        if acc_data.get("transaction_history"):
+            # the ledger is authoritative; history embedded for an account it already holds would be appended twice
+            if self.__ledger.read(account.get_account_number(), last=1):
+                account._take_unlogged_transactions()
+            else:
+                self.__migrate_history = True
+        self.add_account(account)
+        customer.add_account(account)
+        return account
+    
+    def _replay_record(self, record):
+        if record["op"] == "customer":
+            if not self.find_customer(record["data"]["customer_id"]):
+                self._load_customer(record["data"])
+        elif record["op"] == "period_close":
+            for account_number, balance in record["balances"]:
+                account = self.find_account(account_number)
+                if account:
+                    account._set_balance_cents(balance)
+                    self.__dirty.add(account.get_account_holder().get_customer_id())
+        elif record["op"] == "reserve_ids":
+            allocator = self.__customer_ids if record["kind"] == "customer" else self.__account_numbers
+            allocator.advance(record["ceiling"])
+        elif record["op"] == "remove_customer":
+            customer = self.find_customer(record["customer_id"])
+            if customer:
+                self.__customers.pop(record["customer_id"], None)
+                self._drop_resident(record["customer_id"])
+                self.__customer_index.remove(customer)
+        elif record["op"] == "accounts":
+            for state in record["data"]:
+                self.find_customer(state.get("holder_id"))
+                existing = self.find_account(state["account_number"])
+                history = existing._take_unlogged_transactions() if existing else []
+                state["transaction_history"] = history
+                if existing:
+                    existing.get_account_holder().remove_account(existing)
+                account = self._load_account(state)
+                if existing and account:
+                    # the record replaces the account outright; the bank totals take the difference
+                    self.__aggregates.apply(
+                        state["account_type"],
+                        account.get_balance_cents() - existing.get_balance_cents(),
+                        account.get_remaining_balance_cents() - existing.get_remaining_balance_cents() if isinstance(account, LoanAccount) else 0
+                    )
+                self.__dirty.add(state.get("holder_id"))
+            if "txn" in record:
+                self.__next_transaction_id = max(self.__next_transaction_id, int(record["txn"][3:]) + 1)
+            if "hold" in record:
+                self.__holds[record["hold"]["txn"]] = record["hold"]
+            if "release" in record:
+                self.__holds.pop(record["release"], None)
+            self.__receipts.load(record.get("receipts", ()))
+    
+    def _open_snapshot(self, path):
+        with open(path, "rb") as f:
+            prefix = f.read(64)
+            if SERIALIZERS["columnar"].matches(prefix):
+                return SERIALIZERS["columnar"].load(path)
+            f.seek(0)
+            header = f.readline()
+            try:
+                data = json.loads(header)
+            except ValueError:
+                data = None
+            if not isinstance(data, dict) or data.get("format") != self.SNAPSHOT_FORMAT:
+                # older snapshots are one json document holding every customer and account
+                f.seek(0)
+                return json.load(f)
+            f.seek(int(data["index_offset"]))
+            directory = json.loads(f.readline())["directory"]
+        
+        self.__snapshot_fd = os.open(path, os.O_RDONLY)
+        self.__directory = directory
+        self.__snapshot_groups = len(directory)
+        account_owner = self.__account_owner
+        for cust_id, entry in directory.items():
+            for account_number in entry[2]:
+                account_owner[account_number] = cust_id
+        self.__customer_index.add_many((cust_id, *entry[3:7]) for cust_id, entry in directory.items())
+        return data
+    
+    def load_data(self, path=None):
+        # path imports a file in any snapshot format; the data file is rewritten from it once loaded
+        if self.__backend is not None and path is None:
+            return self._open_backend()
+        source = path or self.__data_file
+        if not os.path.exists(source) and (self.__journal is None or not self.__journal.segments()):
+            print("starting fresh")
+            return False
+        try:
+            journal_seq = 0
+            self.__migrate_history = path is not None
+            if os.path.exists(source):
+                data = self._open_snapshot(source)
                 
-                account_type = acc_data.get("account_type")
-                if account_type == "SavingsAccount":
-                    account = SavingsAccount.from_dict(acc_data, customer)
-                elif account_type == "CheckingAccount":
-                    account = CheckingAccount.from_dict(acc_data, customer)
-                elif account_type == "LoanAccount":
-                    account = LoanAccount.from_dict(acc_data, customer)
-                else:
-                    print(f"warning: unknown account type {account_type}")
-                    continue
+                self.__customer_ids.reset(data.get("next_customer_id", 1))
+                self.__account_numbers.reset(data.get("next_account_number", 1000))
+                self.__next_transaction_id = data.get("next_transaction_id", 1)
+                journal_seq = data.get("journal_seq", 0)
+                self.__holds = {hold["txn"]: hold for hold in data.get("holds", [])}
+                self.__receipts.load(data.get("receipts", []))
                 
-                self.__accounts[account.get_account_number()] = account
-                customer.add_account(account)
+                for cust_data in data.get("customers", []):
+                    self._load_customer(cust_data)
+                
+                for acc_data in data.get("accounts", []):
+                    self._load_account(acc_data)
+                
+                # accounts loaded above were counted as they arrived; a recorded total wins, and a directory snapshot without one is rebuilt on first use
+                if "aggregates" in data:
+                    self.__aggregates.reset(data["aggregates"])
+                elif data.get("format") == self.SNAPSHOT_FORMAT:
+                    self.__aggregates_stale = True
+            
+            if self.__journal is not None:
+                for record in self.__journal.replay(journal_seq):
+                    self._replay_record(record)
+            elif path is not None:
+                # an import into a backend writes every group through at the checkpoint below
+                self._hydrate_all()
+                for slot in self.__resident.values():
+                    slot[0] = None
+            
+            if not self.__lazy:
+                self._hydrate_all()
+            self._maybe_evict()
             
+            # histories embedded in older snapshots move into the ledger once; imports become the data file
+            if self.__migrate_history:
+                self.checkpoint(background=False)
             return True
         except Exception as e:
-            print(f"load failed: {e}")
+            EVENTS.emit("load_failed", error=str(e))
             return False
+    
+    def _open_backend(self):
+        if not self.__backend.has_data():
+            print("starting fresh")
+            return False
+        try:
+            header = self.__backend.load_header()
+            self.__customer_ids.reset(header["next_customer_id"])
+            self.__account_numbers.reset(header["next_account_number"])
+            self.__next_transaction_id = header["next_transaction_id"]
+            customers, owners = self.__backend.load_directory()
+            self.__directory = {row[0]: [None, self.GROUP_BYTES_ESTIMATE] for row in customers}
+            self.__snapshot_groups = len(customers)
+            self.__account_owner.update(owners)
+            self.__customer_index.add_many(customers)
+            self.__aggregates.reset(self.__backend.load_aggregates())
+            self.__holds = {hold["txn"]: hold for hold in self.__backend.load_holds()}
+            self.__receipts.load(self.__backend.load_receipts(CLOCK.now_us() - self.__receipts.get_ttl_us(), self.__receipts.get_max_entries()))
+            if not self.__lazy:
+                self._hydrate_all()
+            self._maybe_evict()
+            return True
+        except Exception as e:
+            EVENTS.emit("load_failed", error=str(e))
+            return False
+    
+    def sync(self):
+        self.__committer.flush()
+        (self.__journal or self.__backend).sync()
+    
+    def close(self):
+        self.__checkpointer.wait()
+        self.__committer.close()
+        (self.__journal or self.__backend).close()
+        self.__ledger.close()
+        if self.__snapshot_fd is not None:
+            os.close(self.__snapshot_fd)
+            self.__snapshot_fd = None
+        if self.__overlay_fd is not None:
+            os.close(self.__overlay_fd)
+            self.__overlay_fd = None
+            os.remove(os.path.splitext(self.__data_file)[0] + ".overlay")
+
+class BankServer:
+    OPERATIONS = ("create_customer", "create_account", "deposit", "withdraw", "transfer", "balance", "customer_info", "search_customers", "remove_customer", "payoff_quote", "loan_schedule", "loan_report", "commit_stats", "bank_totals", "metrics", "statement", "idempotency_stats")
+    
+    def __init__(self, bank, host: str = "127.0.0.1", port: int = 8765, unix_path: str = None, workers: int = 8):
+        self.__bank = bank
+        self.__host = host
+        self.__port = port
+        self.__unix_path = unix_path
+        self.__pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bank")
+        self.__server = None
+    
+    def get_address(self):
+        if self.__unix_path:
+            return self.__unix_path
+        return self.__server.sockets[0].getsockname()[:2]
+    
+    async def start(self):
+        if self.__unix_path:
+            self.__server = await asyncio.start_unix_server(self._handle_connection, path=self.__unix_path)
+        else:
+            self.__server = await asyncio.start_server(self._handle_connection, self.__host, self.__port)
+        return self
+    
+    async def serve_forever(self):
+        async with self.__server:
+            await self.__server.serve_forever()
+    
+    async def _handle_connection(self, reader, writer):
+        write_lock = asyncio.Lock()
+        in_flight = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # requests are pipelined: each line runs as its own task and answers carry the request id
+                task = asyncio.create_task(self._process(line, writer, write_lock))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            if in_flight:
+                await asyncio.gather(*in_flight)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    
+    async def _process(self, line, writer, write_lock):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            loop = asyncio.get_running_loop()
+            result, commit = await loop.run_in_executor(self.__pool, self.dispatch, request)
+            if commit is not None:
+                # the worker is released while the group commit is pending; answer once it is durable
+                await asyncio.wrap_future(commit)
+                if self.__bank.is_checkpoint_due() or self.__bank.is_eviction_due():
+                    await loop.run_in_executor(self.__pool, self.__bank.wait_durable, commit)
+            response = {"id": request_id, "ok": True, "result": result}
+        except Exception as e:
+            response = {"id": request_id, "ok": False, "error": str(e)}
+        async with write_lock:
+            writer.write(json.dumps(response, separators=(",", ":")).encode("utf-8") + b"\n")
+            await writer.drain()
+    
+    def dispatch(self, request):
+        op = request.get("op")
+        if op not in self.OPERATIONS:
+            raise ValueError(f"unknown operation {op}")
+        return getattr(self, "_op_" + op)(request)
+    
+    def _op_create_customer(self, request):
+        customer = self.__bank.create_customer(
+            request.get("type", "individual"),
+            request["name"],
+            request["email"],
+            request["phone"],
+            request["address"],
+            date_of_birth=request.get("date_of_birth"),
+            company_name=request.get("company_name"),
+            tax_id=request.get("tax_id")
+        )
+        return {"customer_id": customer.get_customer_id()}, None
+    
+    def _op_create_account(self, request):
+        if request.get("amount") is None:
+            raise ValueError("amount required")
+        account = self.__bank.create_account(request.get("customer_id"), request.get("account_type"), request["amount"])
+        return {"account_number": account.get_account_number()}, None
+    
+    def _submit(self, instruction):
+        # a retried request with the same key is answered from the receipt cache
+        return self.__bank.post_nowait(instruction)
+    
+    def _op_deposit(self, request):
+        return self._submit({"op": "deposit", "account": request.get("account"), "amount": request.get("amount"), "method": "cash", "key": request.get("key")})
+    
+    def _op_withdraw(self, request):
+        return self._submit({"op": "withdraw", "account": request.get("account"), "amount": request.get("amount"), "method": "atm", "key": request.get("key")})
+    
+    def _op_transfer(self, request):
+        return self._submit({"op": "transfer", "account": request.get("account"), "to_account": request.get("to_account"), "amount": request.get("amount"), "key": request.get("key")})
+    
+    def _op_balance(self, request):
+        account = self.__bank._require_account(request.get("account"))
+        return {"account": account.get_account_number(), "balance_cents": account.get_balance_cents(), "status": account.get_status()}, None
+    
+    def _op_customer_info(self, request):
+        customer = self.__bank.find_customer(request.get("customer_id"))
+        if not customer:
+            raise ValueError("customer not found")
+        info = customer.to_dict()
+        info["accounts"] = [
+            {"account_number": acc.get_account_number(), "account_type": acc.__class__.__name__, "balance_cents": acc.get_balance_cents()}
+            for acc in customer.get_accounts_list()
+        ]
+        info["total_balance_cents"] = customer.get_total_balance_cents()
+        info["balance_by_type"] = customer.get_balance_breakdown()
+        return info, None
+    
+    def _op_search_customers(self, request):
+        if request.get("email"):
+            found = self.__bank.find_customer_by_email(request["email"])
+            customers = [found] if found else []
+        elif request.get("tax_id"):
+            found = self.__bank.find_customer_by_tax_id(request["tax_id"])
+            customers = [found] if found else []
+        elif request.get("phone"):
+            customers = self.__bank.find_customers_by_phone(request["phone"])
+        elif request.get("name"):
+            customers = self.__bank.search_customers(request["name"], int(request.get("limit", 20)))
+        else:
+            raise ValueError("one of email, phone, tax_id or name required")
+        return {"customers": [customer.to_dict() for customer in customers]}, None
+    
+    def _op_remove_customer(self, request):
+        self.__bank.remove_customer(request.get("customer_id"))
+        return {"customer_id": request.get("customer_id")}, None
+    
+    def _op_payoff_quote(self, request):
+        return self.__bank.payoff_quote(request.get("account"), request.get("as_of")), None
+    
+    def _op_loan_schedule(self, request):
+        return self.__bank.loan_schedule(request.get("account")), None
+    
+    def _op_loan_report(self, request):
+        return self.__bank.loan_report(request.get("as_of")), None
+    
+    def _op_commit_stats(self, request):
+        return self.__bank.get_commit_stats(), None
+    
+    def _op_bank_totals(self, request):
+        return self.__bank.get_aggregates(), None
+    
+    def _op_metrics(self, request):
+        return METRICS.to_dict(), None
+    
+    def _op_idempotency_stats(self, request):
+        return self.__bank.get_idempotency_stats(), None
+    
+    def _op_statement(self, request):
+        limit = min(int(request.get("limit", 100)), 1000)
+        return self.__bank.statement(request.get("account"), request.get("start"), request.get("end"), request.get("types"), request.get("cursor"), limit), None
+    
+    def close(self):
+        if self.__server is not None:
+            self.__server.close()
+        self.__pool.shutdown(wait=True)
+
+
+class ShardWorker:
+    # runs in a child process and owns one shard's BankingSystem; requests arrive as (id, op, args) over a pipe
+    OPERATIONS = ("create_customer", "create_account", "deposit", "withdraw", "transfer", "balance", "prepare", "finish", "holds", "totals")
+    
+    def __init__(self, conn, index: int, count: int, data_file: str, backend=None, workers: int = 8):
+        self.__conn = conn
+        self.__index = index
+        self.__count = count
+        self.__data_file = data_file
+        self.__backend = backend
+        self.__workers = workers
+        self.__send_lock = threading.Lock()
+        self.__bank = None
+    
+    @staticmethod
+    def main(conn, index, count, data_file, backend=None, workers=8):
+        ShardWorker(conn, index, count, data_file, backend, workers).run()
+    
+    def run(self):
+        # shards have no console of their own; events and stray prints are dropped
+        EVENTS.set_sink(NullSink())
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            self.__bank = BankingSystem(self.__data_file, backend=self.__backend, shard=(self.__index, self.__count))
+            self.__bank.load_data()
+            pool = ThreadPoolExecutor(max_workers=self.__workers, thread_name_prefix=f"shard{self.__index}")
+            try:
+                while True:
+                    try:
+                        message = self.__conn.recv()
+                    except EOFError:
+                        break
+                    if message is None:
+                        break
+                    pool.submit(self._handle, message)
+            finally:
+                pool.shutdown(wait=True)
+                self.__bank.save_data(silent=True)
+                self.__bank.close()
+                self.__conn.close()
+    
+    def _handle(self, message):
+        request_id, op, args = message
+        try:
+            if op not in self.OPERATIONS:
+                raise ValueError(f"unknown operation {op}")
+            response = (request_id, True, getattr(self, "_op_" + op)(**args))
+        except Exception as e:
+            response = (request_id, False, e)
+        with self.__send_lock:
+            self.__conn.send(response)
+    
+    def _op_create_customer(self, customer_type, name, email, phone, address, **details):
+        return self.__bank.create_customer(customer_type, name, email, phone, address, **details).get_customer_id()
+    
+    def _op_create_account(self, customer_id, account_type, amount):
+        account = self.__bank.create_account(customer_id, account_type, amount)
+        return account.get_account_number()
+    
+    def _op_deposit(self, account, amount, key=None):
+        return self.__bank.deposit(account, amount, key=key)
+    
+    def _op_withdraw(self, account, amount, key=None):
+        return self.__bank.withdraw(account, amount, key=key)
+    
+    def _op_transfer(self, account, to_account, amount, key=None):
+        return self.__bank.transfer(account, to_account, amount, key=key)
+    
+    def _op_balance(self, account):
+        account = self.__bank._require_account(account)
+        return {"account": account.get_account_number(), "balance_cents": account.get_balance_cents(), "status": account.get_status()}
+    
+    def _op_prepare(self, txn, side, account, amount, key=None):
+        return self.__bank.prepare_transfer(txn, side, account, amount, key)
+    
+    def _op_finish(self, txn, commit):
+        return self.__bank.finish_transfer(txn, commit)
+    
+    def _op_holds(self):
+        return self.__bank.get_holds()
+    
+    def _op_totals(self):
+        return {"aggregates": self.__bank.get_aggregates(), "holds": self.__bank.get_holds()}
+
+
+class ShardedBank:
+    # partitions customers and accounts over worker processes, each with its own journal or database.
+    # customers are placed by a hash of their email and their accounts live with them; ids carry the shard.
+    # transfers between shards run two-phase commit; the coordinator only logs commit decisions, so a
+    # transaction with no logged decision is aborted when holds are resolved after a crash
+    def __init__(self, data_file: str = "banking_data.json", shards: int = 4, backend=None, workers: int = 8):
+        if shards < 1:
+            raise ValueError("at least one shard required")
+        base = os.path.splitext(data_file)[0]
+        self.__count = shards
+        self.__ids = itertools.count(1)
+        self.__pending = {}
+        self.__pending_lock = threading.Lock()
+        self.__send_locks = [threading.Lock() for _ in range(shards)]
+        self.__conns = []
+        self.__processes = []
+        self.__readers = []
+        self.__cross_shard = 0
+        self.__aborted = 0
+        self.__journal = Journal(base + ".coordinator.journal")
+        self.__committed = {record["txn"] for record in self.__journal.replay() if record.get("op") == "commit"}
+        self.__committer = GroupCommitter(self.__journal)
+        # spawn rather than fork: the parent already runs commit threads
+        context = multiprocessing.get_context("spawn")
+        for index in range(shards):
+            parent, child = context.Pipe()
+            process = context.Process(target=ShardWorker.main, args=(child, index, shards, f"{base}.shard{index}.json", backend, workers), name=f"shard{index}", daemon=True)
+            process.start()
+            child.close()
+            reader = threading.Thread(target=self._read_responses, args=(index, parent), name=f"shard{index}-reader", daemon=True)
+            reader.start()
+            self.__conns.append(parent)
+            self.__processes.append(process)
+            self.__readers.append(reader)
+        self.recover()
+    
+    @staticmethod
+    def shard_of(key: str, count: int):
+        # ids handed out by shard i end in "s<i>"
+        _, tag, index = key.rpartition("s")
+        if not tag or not index.isdigit() or int(index) >= count:
+            raise ValueError(f"{key} does not belong to any of {count} shards")
+        return int(index)
+    
+    @staticmethod
+    def placement(email: str, count: int):
+        # new customers spread by email; after that their ids route them
+        return zlib.crc32(email.lower().encode("utf-8")) % count
+    
+    def get_shard_count(self): return self.__count
+    
+    def get_stats(self):
+        return {"shards": self.__count, "cross_shard_transfers": self.__cross_shard, "aborted_transfers": self.__aborted, "commit": self.__committer.get_stats()}
+    
+    def _read_responses(self, index, conn):
+        while True:
+            try:
+                request_id, ok, value = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self.__pending_lock:
+                _, future = self.__pending.pop(request_id, (None, None))
+            if future is None:
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        # anything still waiting on this shard will never be answered
+        with self.__pending_lock:
+            orphaned = [(request_id, future) for request_id, (shard, future) in self.__pending.items() if shard == index]
+            for request_id, _ in orphaned:
+                del self.__pending[request_id]
+        for _, future in orphaned:
+            future.set_exception(Exception(f"shard {index} exited"))
+    
+    def _send(self, shard, op, **args):
+        request_id = next(self.__ids)
+        future = Future()
+        with self.__pending_lock:
+            self.__pending[request_id] = (shard, future)
+        with self.__send_locks[shard]:
+            self.__conns[shard].send((request_id, op, args))
+        return future
+    
+    def _call(self, shard, op, **args):
+        return self._send(shard, op, **args).result()
+    
+    def _route(self, key):
+        return self.shard_of(key, self.__count)
+    
+    def create_customer(self, customer_type, name, email, phone, address, date_of_birth=None, company_name=None, tax_id=None):
+        return self._call(self.placement(email, self.__count), "create_customer", customer_type=customer_type, name=name, email=email, phone=phone, address=address,
+                          date_of_birth=date_of_birth, company_name=company_name, tax_id=tax_id)
+    
+    def create_account(self, customer_id, account_type, amount):
+        return self._call(self._route(customer_id), "create_account", customer_id=customer_id, account_type=account_type, amount=amount)
+    
+    def deposit(self, account_number, amount, key=None):
+        return self._call(self._route(account_number), "deposit", account=account_number, amount=amount, key=key)
+    
+    def withdraw(self, account_number, amount, key=None):
+        return self._call(self._route(account_number), "withdraw", account=account_number, amount=amount, key=key)
+    
+    def balance(self, account_number):
+        return self._call(self._route(account_number), "balance", account=account_number)
+    
+    def transfer(self, from_account, to_account, amount, key=None):
+        source = self._route(from_account)
+        dest = self._route(to_account)
+        if source == dest:
+            return self._call(source, "transfer", account=from_account, to_account=to_account, amount=amount, key=key)
+        
+        txn_id = f"x{os.urandom(8).hex()}"
+        votes = [
+            self._send(source, "prepare", txn=txn_id, side="out", account=from_account, amount=amount, key=key),
+            self._send(dest, "prepare", txn=txn_id, side="in", account=to_account, amount=amount)
+        ]
+        errors = []
+        replayed = None
+        for vote in votes:
+            try:
+                result = vote.result()
+                if result.get("replayed"):
+                    replayed = result
+            except Exception as e:
+                errors.append(e)
+        if errors or replayed is not None:
+            # presumed abort: nothing is logged, each side drops whatever it prepared
+            for future in [self._send(shard, "finish", txn=txn_id, commit=False) for shard in (source, dest)]:
+                future.result()
+            if replayed is not None:
+                return replayed
+            self.__aborted += 1
+            raise errors[0]
+        
+        # the transfer happens once this record is durable; a crash after it is finished by recover()
+        self.__committer.submit({"op": "commit", "txn": txn_id}).result()
+        finished = [self._send(shard, "finish", txn=txn_id, commit=True) for shard in (source, dest)]
+        receipt = finished[0].result()
+        finished[1].result()
+        self.__cross_shard += 1
+        return receipt
+    
+    def get_holds(self):
+        futures = [self._send(shard, "holds") for shard in range(self.__count)]
+        return [hold for future in futures for hold in future.result()]
+    
+    def get_totals(self):
+        # money parked in an outgoing hold has left its account but not yet arrived anywhere
+        totals = {"total_cents": 0, "by_type": {}, "loans_outstanding_cents": 0, "held_cents": 0, "holds": 0}
+        for future in [self._send(shard, "totals") for shard in range(self.__count)]:
+            shard = future.result()
+            aggregates = shard["aggregates"]
+            totals["total_cents"] += aggregates["total_cents"]
+            totals["loans_outstanding_cents"] += aggregates["loans_outstanding_cents"]
+            for account_type, cents in aggregates["by_type"].items():
+                totals["by_type"][account_type] = totals["by_type"].get(account_type, 0) + cents
+            totals["held_cents"] += sum(hold["amount_cents"] for hold in shard["holds"] if hold["side"] == "out")
+            totals["holds"] += len(shard["holds"])
+        return totals
+    
+    def recover(self):
+        # finishes transfers a previous coordinator left prepared: logged ones commit, the rest abort
+        holds = self.get_holds()
+        futures = [self._send(self._route(hold["account"]), "finish", txn=hold["txn"], commit=hold["txn"] in self.__committed) for hold in holds]
+        for future in futures:
+            future.result()
+        self._discard_decisions()
+        return len(holds)
+    
+    def _discard_decisions(self):
+        # decisions only matter while some shard still holds the transaction
+        _, segment = self.__journal.rotate()
+        self.__journal.discard_before(segment)
+        self.__committed = set()
+    
+    def close(self):
+        if not self.get_holds():
+            self._discard_decisions()
+        for shard, conn in enumerate(self.__conns):
+            with self.__send_locks[shard]:
+                conn.send(None)
+        for process in self.__processes:
+            process.join()
+        for reader in self.__readers:
+            reader.join()
+        for conn in self.__conns:
+            conn.close()
+        self.__committer.close()
+        self.__journal.close()
+
+
+def serve(argv=None):
+    parser = argparse.ArgumentParser(description="farabi bank json-lines server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on a unix socket path instead of tcp")
+    parser.add_argument("--data", default="banking_data.json")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--cache-customers", type=int, help="most customers kept in memory; the rest stay on disk")
+    parser.add_argument("--cache-bytes", type=int, help="most estimated customer bytes kept in memory")
+    parser.add_argument("--backend", choices=("sqlite",), help="storage backend instead of journal and snapshot files")
+    parser.add_argument("--events", help="file domain events are appended to as json lines; by default they are dropped")
+    parser.add_argument("--metrics", help="file the metrics registry is dumped to periodically; enables instrumentation")
+    parser.add_argument("--metrics-format", choices=("json", "prometheus"), default="json")
+    parser.add_argument("--metrics-interval", type=float, default=10.0)
+    args = parser.parse_args(argv)
+    
+    # operations no longer print per request; events go to a buffered file or nowhere
+    EVENTS.set_sink(BufferedSink(args.events) if args.events else NullSink())
+    reporter = None
+    if args.metrics:
+        METRICS.enable()
+        reporter = MetricsReporter(METRICS, args.metrics, args.metrics_format, args.metrics_interval).start()
+    bank = BankingSystem(args.data, cache_customers=args.cache_customers, cache_bytes=args.cache_bytes, backend=args.backend)
+    bank.load_data()
+    server = BankServer(bank, args.host, args.port, args.unix, args.workers)
+    
+    async def run():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await server.start()
+        print(f"serving on {server.get_address()}", flush=True)
+        await stop.wait()
+    
+    try:
+        asyncio.run(run())
+    finally:
+        server.close()
+        bank.save_data()
+        bank.close()
+        if reporter is not None:
+            reporter.stop()
+        EVENTS.set_sink(None).close()
 
 def main():
     bank = BankingSystem()
@@ -738,24 +4563,20 @@ def main():
                 email = Validator.validate_email()
                 phone = Validator.validate_phone()
                 address = Validator.validate_not_empty("address: ", "address")
-                cust_id = bank.generate_customer_id(name)
                 
                 if ctype == "1":
                     dob = Validator.validate_date("date of birth (yyyy-mm-dd): ")
-                    customer = IndividualCustomer(cust_id, name, email, phone, address, dob)
+                    customer = bank.create_customer("individual", name, email, phone, address, date_of_birth=dob)
                 else:
                     company = Validator.validate_not_empty("company name: ", "company name")
                     tax_id = Validator.validate_not_empty("tax id: ", "tax id")
-                    customer = CorporateCustomer(cust_id, name, email, phone, address, company, tax_id)
+                    customer = bank.create_customer("corporate", name, email, phone, address, company_name=company, tax_id=tax_id)
                 
-                bank.add_customer(customer)
-                print(f"customer created: {cust_id}")
-                bank.save_data(silent=True) 
+                print(f"customer created: {customer.get_customer_id()}")
             
             elif choice == "2":
                 cust_id = Validator.validate_not_empty("customer id: ", "customer id")
-                customer = bank.find_customer(cust_id)
-                if not customer:
+                if not bank.find_customer(cust_id):
                     print("error: customer not found")
                     continue
                 
@@ -763,12 +4584,11 @@ def main():
                 atype = Validator.validate_choice("type: ", ["1", "2", "3"], "enter 1 for savings, 2 for checking, or 3 for loan")
                 
                 if atype == "1":
-                    bank.create_account(customer, "savings")
+                    account = bank.create_account(cust_id, "savings")
                 elif atype == "2":
-                    bank.create_account(customer, "checking")
+                    account = bank.create_account(cust_id, "checking")
                 elif atype == "3":
-                    bank.create_account(customer, "loan")
-                bank.save_data(silent=True)
+                    account = bank.create_account(cust_id, "loan")
             
             elif choice == "3":
                 acc_num = Validator.validate_not_empty("account number: ", "account number")
@@ -778,11 +4598,7 @@ def main():
                     continue
                 
                 amount = Validator.validate_amount()
-                txn_id = bank.generate_transaction_id()
-                txn = DepositTransaction(txn_id, account, amount)
-                txn.execute()
-                bank.add_transaction(txn)
-                bank.save_data(silent=True) 
+                bank.deposit(acc_num, amount)
             
             elif choice == "4":
                 acc_num = Validator.validate_not_empty("account number: ", "account number")
@@ -792,11 +4608,7 @@ def main():
                     continue
                 
                 amount = Validator.validate_amount()
-                txn_id = bank.generate_transaction_id()
-                txn = WithdrawalTransaction(txn_id, account, amount)
-                txn.execute()
-                bank.add_transaction(txn)
-                bank.save_data(silent=True) 
+                bank.withdraw(acc_num, amount)
             
             elif choice == "5":
                 from_acc = Validator.validate_not_empty("from account: ", "from account")
@@ -809,11 +4621,7 @@ def main():
                     continue
                 
                 amount = Validator.validate_amount()
-                txn_id = bank.generate_transaction_id()
-                txn = TransferTransaction(txn_id, source, dest, amount)
-                txn.execute()
-                bank.add_transaction(txn)
-                bank.save_data(silent=True) 
+                bank.transfer(from_acc, to_acc, amount)
             
             elif choice == "6":
                 cust_id = Validator.validate_not_empty("customer id: ", "customer id")
@@ -833,6 +4641,7 @@ def main():
             
             elif choice == "8":
                 bank.save_data()
+                bank.close()
                 print("\nthank you for using our services. have a nice day!")
                 break
             
@@ -845,4 +4654,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve(sys.argv[2:])
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import EVENTS, BankingSystem, CheckingAccount, IndividualCustomer, NullSink
+
+
+@pytest.fixture(autouse=True)
+def quiet_events():
+    previous = EVENTS.set_sink(NullSink())
+    yield
+    EVENTS.set_sink(previous)
+
+
+@pytest.fixture(params=[None, "sqlite"], ids=["journal", "sqlite"])
+def backend(request):
+    return request.param
+
+
+def build_bank(path, accounts, balance=100.0, **options):
+    bank = BankingSystem(str(path), **options)
+    bank.load_data()
+    numbers = []
+    for i in range(accounts):
+        customer = IndividualCustomer(f"ct{i:07d}", f"test {i}", f"test{i}@example.com", "5550000", "test street")
+        bank.add_customer(customer)
+        account = CheckingAccount(f"at{i:07d}", customer, balance, overdraft_limit=0)
+        bank.add_account(account)
+        customer.add_account(account)
+        numbers.append(account.get_account_number())
+    bank.save_data(silent=True)
+    return bank, numbers
+
+
+def balances(bank, numbers):
+    return [bank.find_account(number).get_balance_cents() for number in numbers]
@@ -0,0 +1,44 @@
+import json
+
+from conftest import balances, build_bank
+from main import BankingSystem
+
+
+def test_bad_lines_fail_alone_and_the_rest_is_journaled(tmp_path, backend):
+    path = tmp_path / "bank.json"
+    bank, numbers = build_bank(path, 2, backend=backend)
+    batch = tmp_path / "batch.jsonl"
+    with open(batch, "w") as f:
+        f.write(json.dumps({"op": "deposit", "account": numbers[0], "amount": 50, "key": "b1"}) + "\n")
+        f.write('{"op": "deposit", "account":\n')
+        f.write("[1, 2]\n")
+        f.write(json.dumps({"op": "withdraw", "account": numbers[1], "amount": 500}) + "\n")
+        f.write(json.dumps({"op": "transfer", "account": numbers[1], "to_account": numbers[0], "amount": 25}) + "\n")
+    report = bank.apply_batch_file(str(batch))
+    assert [r["status"] for r in report["results"]] == ["completed", "failed", "failed", "failed", "completed"]
+    assert "insufficient funds" in report["results"][3]["error"]
+    expected = balances(bank, numbers)
+    assert expected == [17500, 7500]
+    bank.close()
+
+    bank = BankingSystem(str(path), backend=backend)
+    bank.load_data()
+    assert balances(bank, numbers) == expected
+    assert bank.deposit(numbers[0], 50, key="b1")["replayed"]
+    bank.close()
+
+
+def test_batch_commits_in_chunks(tmp_path):
+    path = tmp_path / "bank.json"
+    bank, numbers = build_bank(path, 3)
+    instructions = [{"op": "deposit", "account": numbers[i % 3], "amount": 1} for i in range(10)]
+    report = bank.apply_batch(instructions, chunk_size=3)
+    assert report["completed"] == 10
+    assert [r["line"] for r in report["results"]] == list(range(1, 11))
+    expected = balances(bank, numbers)
+    bank.close()
+
+    bank = BankingSystem(str(path))
+    bank.load_data()
+    assert balances(bank, numbers) == expected == [10400, 10300, 10300]
+    bank.close()
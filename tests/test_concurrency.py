@@ -0,0 +1,42 @@
+import random
+
+from conftest import balances, build_bank
+from main import BankingSystem, TransactionExecutor
+
+
+def test_concurrent_transfers_conserve_money(tmp_path, backend):
+    bank, numbers = build_bank(tmp_path / "bank.json", 10, backend=backend, checkpoint_ops=200)
+    expected = sum(balances(bank, numbers))
+    rng = random.Random(7)
+    instructions = []
+    for _ in range(2000):
+        source, dest = rng.sample(numbers, 2)
+        instructions.append({"op": "transfer", "account": source, "to_account": dest, "amount": f"{rng.randint(1, 5000) / 100:.2f}"})
+
+    executor = TransactionExecutor(bank, max_workers=16)
+    results = executor.run_all(instructions)
+    executor.shutdown()
+
+    after = balances(bank, numbers)
+    assert any(ok for ok, _ in results)
+    assert sum(after) == expected
+    assert min(after) >= 0
+    bank.close()
+
+    reloaded = BankingSystem(str(tmp_path / "bank.json"), backend=backend)
+    reloaded.load_data()
+    assert balances(reloaded, numbers) == after
+    reloaded.close()
+
+
+def test_opposing_transfers_do_not_deadlock(tmp_path):
+    bank, numbers = build_bank(tmp_path / "bank.json", 2)
+    a, b = numbers
+    instructions = [{"op": "transfer", "account": a, "to_account": b, "amount": "1.00"},
+                    {"op": "transfer", "account": b, "to_account": a, "amount": "1.00"}] * 500
+    executor = TransactionExecutor(bank, max_workers=8)
+    results = executor.run_all(instructions)
+    executor.shutdown()
+    assert all(ok for ok, _ in results)
+    assert balances(bank, numbers) == [10000, 10000]
+    bank.close()
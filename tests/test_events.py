@@ -0,0 +1,47 @@
+from main import EVENTS, BankingSystem, CustomerIndex, EventSink
+
+
+class CollectingSink(EventSink):
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+def test_library_notices_go_through_the_event_bus(tmp_path, capsys):
+    sink = CollectingSink()
+    previous = EVENTS.set_sink(sink)
+    try:
+        bank = BankingSystem(str(tmp_path / "bank.json"))
+        customer = bank.create_customer("individual", "test", "test@example.com", "5550000", "test street")
+        account = bank.create_account(customer.get_customer_id(), "checking", 100)
+        index = CustomerIndex()
+        index.add_keys("c1", "same@example.com", None, None, "one", unique=False)
+        index.add_keys("c2", "same@example.com", None, None, "two", unique=False)
+        bank.close()
+    finally:
+        EVENTS.set_sink(previous)
+    assert "account created" not in capsys.readouterr().out
+    kinds = {event.kind: event for event in sink.events}
+    assert kinds["account_opened"].fields == {"account": account.get_account_number(), "account_type": "checking"}
+    assert kinds["shared_email"].render() == "warning: customer c2 shares email with c1"
+
+
+def test_checkpoint_failure_is_an_event(tmp_path, capsys):
+    bank = BankingSystem(str(tmp_path / "bank.json"))
+    bank.load_data()
+    bank.create_customer("individual", "test", "test@example.com", "5550000", "test street")
+    # the snapshot is written to a temporary file first; a directory in its place makes that fail
+    (tmp_path / "bank.json.tmp").mkdir()
+    sink = CollectingSink()
+    previous = EVENTS.set_sink(sink)
+    try:
+        assert not bank.checkpoint(background=False)
+    finally:
+        EVENTS.set_sink(previous)
+    (tmp_path / "bank.json.tmp").rmdir()
+    bank.close()
+    assert "checkpoint failed" not in capsys.readouterr().out
+    failures = [event for event in sink.events if event.kind == "checkpoint_failed"]
+    assert len(failures) == 1 and failures[0].render().startswith("checkpoint failed: ")
@@ -0,0 +1,53 @@
+import pytest
+
+from conftest import build_bank
+from main import CLOCK, BankingSystem, SimulatedClock
+
+
+def history(bank, number):
+    return [(row["type"], row["amount_cents"], row["balance_cents"]) for row in bank.statement(number, limit=1000)["entries"]]
+
+
+@pytest.mark.parametrize("format", ["json", "columnar"])
+def test_export_carries_ledger_history(tmp_path, backend, format):
+    (tmp_path / "source").mkdir()
+    (tmp_path / "target").mkdir()
+    bank, numbers = build_bank(tmp_path / "source" / "bank.json", 3, backend=backend, cache_customers=1)
+    bank.deposit(numbers[0], 12)
+    bank.transfer(numbers[0], numbers[1], 5)
+    bank.checkpoint(background=False)
+    bank.withdraw(numbers[2], 3)
+    expected = {number: history(bank, number) for number in numbers}
+    export = tmp_path / f"export.{format}"
+    assert bank.save_data(silent=True, path=str(export), format=format)
+    bank.close()
+
+    imported = BankingSystem(str(tmp_path / "target" / "bank.json"))
+    assert imported.load_data(str(export))
+    assert {number: history(imported, number) for number in numbers} == expected
+    imported.close()
+
+    # a restart reads the migrated history from the new ledger, and importing again does not duplicate it
+    imported = BankingSystem(str(tmp_path / "target" / "bank.json"))
+    assert imported.load_data(str(export))
+    assert {number: history(imported, number) for number in numbers} == expected
+    imported.close()
+
+
+@pytest.mark.parametrize("format", ["json", "columnar"])
+def test_export_keeps_microsecond_stamps(tmp_path, format):
+    (tmp_path / "source").mkdir()
+    (tmp_path / "target").mkdir()
+    with CLOCK.using(SimulatedClock(CLOCK.now_us(), step_us=10)):
+        bank, numbers = build_bank(tmp_path / "source" / "bank.json", 1)
+        for amount in (1, 2, 3):
+            bank.deposit(numbers[0], amount)
+    stamps = [entry.ts for entry in bank.find_account(numbers[0]).query_history()]
+    export = tmp_path / f"export.{format}"
+    assert bank.save_data(silent=True, path=str(export), format=format)
+    bank.close()
+
+    imported = BankingSystem(str(tmp_path / "target" / "bank.json"))
+    assert imported.load_data(str(export))
+    assert [entry.ts for entry in imported.find_account(numbers[0]).query_history()] == stamps
+    imported.close()
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from conftest import balances, build_bank
+from main import CLOCK, BankingSystem, FixedClock
+
+
+def test_keyed_retry_returns_original_receipt(tmp_path, backend):
+    path = tmp_path / "bank.json"
+    bank, numbers = build_bank(path, 2, backend=backend)
+    first = bank.deposit(numbers[0], 10, key="k1")
+    retry = bank.deposit(numbers[0], 10, key="k1")
+    assert retry["replayed"] and retry["transaction_id"] == first["transaction_id"]
+    assert bank.find_account(numbers[0]).get_balance_cents() == 11000
+
+    report = bank.apply_batch([{"op": "deposit", "account": numbers[0], "amount": "5", "key": "k1"},
+                               {"op": "deposit", "account": numbers[0], "amount": "5", "key": "k2"},
+                               {"op": "deposit", "account": numbers[0], "amount": "5", "key": "k2"}])
+    assert [r["status"] for r in report["results"]] == ["duplicate", "completed", "duplicate"]
+    expected = balances(bank, numbers)
+    bank.close()
+
+    # receipts survive a restart without a checkpoint in between
+    bank = BankingSystem(str(path), backend=backend)
+    bank.load_data()
+    assert bank.deposit(numbers[0], 5, key="k2")["replayed"]
+    assert balances(bank, numbers) == expected
+    bank.close()
+
+
+def test_failed_request_is_not_remembered(tmp_path):
+    bank, numbers = build_bank(tmp_path / "bank.json", 1)
+    with pytest.raises(Exception):
+        bank.withdraw(numbers[0], 1000, key="w")
+    receipt = bank.withdraw(numbers[0], 10, key="w")
+    assert not receipt.get("replayed")
+    assert bank.find_account(numbers[0]).get_balance_cents() == 9000
+    bank.close()
+
+
+def test_concurrent_retries_post_once(tmp_path):
+    bank, numbers = build_bank(tmp_path / "bank.json", 1)
+    receipts = []
+    threads = [threading.Thread(target=lambda: receipts.append(bank.deposit(numbers[0], 1, key="same"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({receipt["transaction_id"] for receipt in receipts}) == 1
+    assert bank.find_account(numbers[0]).get_balance_cents() == 10100
+    bank.close()
+
+
+def test_receipts_expire_and_stay_bounded(tmp_path):
+    path = tmp_path / "bank.json"
+    bank, numbers = build_bank(path, 1, idempotency_entries=3, idempotency_ttl=60)
+    for i in range(5):
+        bank.deposit(numbers[0], 1, key=f"m{i}")
+    assert bank.get_idempotency_stats()["entries"] == 3
+    assert not bank.deposit(numbers[0], 1, key="m0").get("replayed")
+    with CLOCK.using(FixedClock(CLOCK.now_us() + 120 * 1_000_000)):
+        assert not bank.deposit(numbers[0], 1, key="m4").get("replayed")
+    bank.close()
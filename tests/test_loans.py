@@ -0,0 +1,63 @@
+import pytest
+
+import main
+from main import BankingSystem, IndividualCustomer, LoanAnalytics
+
+
+LOANS = [
+    (1_000_000, 0.08, 24, None),
+    (333_333, 0.1299, 36, None),
+    (250_000, 0.0, 12, None),
+    (1_234_567, 0.055, 60, 30_000),
+]
+
+
+def schedule_lookup(principal, rate, term, payment, months):
+    rows = LoanAnalytics.schedule(principal, rate, term, payment)
+    if months <= 0:
+        return principal
+    return rows[months - 1][3] if months <= len(rows) else 0
+
+
+def remaining_by_month(loans):
+    principals, rates, terms, payments, months, expected = [], [], [], [], [], []
+    for principal, rate, term, payment in loans:
+        payment = payment if payment is not None else LoanAnalytics.monthly_payment(principal, rate, term)
+        for k in range(term + 2):
+            principals.append(principal)
+            rates.append(rate)
+            terms.append(term)
+            payments.append(payment)
+            months.append(k)
+            expected.append(schedule_lookup(principal, rate, term, payment, k))
+    return (principals, rates, terms, payments, months), expected
+
+
+def test_scheduled_remaining_matches_schedule():
+    columns, expected = remaining_by_month(LOANS)
+    assert LoanAnalytics.scheduled_remaining(*columns) == expected
+
+
+def test_numpy_and_fallback_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    columns, expected = remaining_by_month(LOANS)
+    vectorized = LoanAnalytics.scheduled_remaining(*columns)
+    monkeypatch.setattr(main, "np", None)
+    assert LoanAnalytics.scheduled_remaining(*columns) == vectorized == expected
+
+
+def test_loan_schedule_follows_payments(tmp_path):
+    bank = BankingSystem(str(tmp_path / "bank.json"))
+    bank.load_data()
+    customer = IndividualCustomer("ct0000001", "test", "test@example.com", "5550000", "test street")
+    bank.add_customer(customer)
+    number = bank.create_account(customer.get_customer_id(), "loan", 10_000.0).get_account_number()
+    before = bank.loan_schedule(number)
+    assert len(before["installments"]) == 24
+    assert before["installments"][-1]["remaining_cents"] == 0
+    first = before["installments"][0]
+    bank.deposit(number, first["due_cents"] / 100)
+    after = bank.loan_schedule(number)
+    assert after["payments_made"] == 1
+    assert after["installments"] == before["installments"][1:]
+    bank.close()
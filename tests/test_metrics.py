@@ -0,0 +1,29 @@
+import pytest
+
+from conftest import build_bank
+from main import Metrics
+
+
+@pytest.fixture
+def metrics():
+    registry = Metrics()
+    registry.enable()
+    yield registry
+    registry.disable()
+
+
+def test_failure_labels_do_not_carry_amounts(tmp_path, metrics):
+    bank, numbers = build_bank(tmp_path / "bank.json", 1)
+    account = bank.find_account(numbers[0])
+    for amount in (150, 275, 999, 1234):
+        with pytest.raises(Exception):
+            account.withdraw(amount)
+        with pytest.raises(Exception):
+            bank.withdraw(numbers[0], amount)
+    text = metrics.to_prometheus()
+    assert "$" not in text
+    failures = [line for line in text.splitlines() if line.startswith("bank_account_operation_failures_total{")]
+    rejections = [line for line in text.splitlines() if line.startswith("bank_transaction_rejections_total{")]
+    assert len(failures) == 1 and 'reason="ValueError"' in failures[0]
+    assert len(rejections) == 1 and 'reason="insufficient_funds"' in rejections[0]
+    bank.close()
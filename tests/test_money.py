@@ -0,0 +1,21 @@
+from decimal import Decimal
+
+import pytest
+
+from conftest import balances, build_bank
+from main import Money
+
+
+@pytest.mark.parametrize("text", ["0.005", "1.005", "2.675", "0.125", "1234.565", "-0.005", "19.99"])
+def test_floats_round_like_their_text(text):
+    assert Money.to_cents(float(text)) == Money.to_cents(text) == Money.to_cents(Decimal(text))
+
+
+def test_every_path_stores_the_same_cents(tmp_path):
+    bank, numbers = build_bank(tmp_path / "bank.json", 4)
+    bank.deposit(numbers[0], 1.005)
+    bank.deposit(numbers[1], "1.005")
+    bank.apply_batch([{"op": "deposit", "account": numbers[2], "amount": "1.005"}])
+    bank.find_account(numbers[3]).deposit(1.005)
+    assert balances(bank, numbers) == [10101] * 4
+    bank.close()
@@ -0,0 +1,92 @@
+from conftest import balances, build_bank
+from main import BankingSystem
+
+
+def reopen(path, backend=None):
+    bank = BankingSystem(str(path), backend=backend)
+    assert bank.load_data()
+    return bank
+
+
+def test_checkpoint_and_reload(tmp_path, backend):
+    path = tmp_path / "bank.json"
+    bank, numbers = build_bank(path, 5, backend=backend)
+    bank.deposit(numbers[0], 25)
+    bank.transfer(numbers[1], numbers[2], 10)
+    bank.checkpoint(background=False)
+    bank.withdraw(numbers[3], 5)
+    expected = balances(bank, numbers)
+    bank.close()
+
+    bank = reopen(path, backend)
+    assert balances(bank, numbers) == expected
+    assert [entry.get_type() for entry in bank.find_account(numbers[0]).query_history()][-1] == "deposit"
+    bank.close()
+
+
+def test_journal_replay_drops_torn_tail(tmp_path):
+    path = tmp_path / "bank.json"
+    bank, numbers = build_bank(path, 3)
+    bank.deposit(numbers[0], 40)
+    bank.transfer(numbers[0], numbers[1], 15)
+    expected = balances(bank, numbers)
+    bank.close()
+
+    # a crash mid-append leaves half a record at the end of the last segment
+    segment = sorted(tmp_path.glob("bank.journal.*"))[-1]
+    with open(segment, "ab") as f:
+        f.write(b'{"op":"accounts","data":[{"account_number":')
+
+    bank = reopen(path)
+    assert balances(bank, numbers) == expected
+    # the tail was cut back to a clean line, so new records replay after it
+    bank.deposit(numbers[2], 7)
+    expected = balances(bank, numbers)
+    bank.close()
+
+    bank = reopen(path)
+    assert balances(bank, numbers) == expected
+    bank.close()
+
+
+def test_created_account_is_journaled(tmp_path, backend):
+    path = tmp_path / "bank.json"
+    bank = BankingSystem(str(path), backend=backend)
+    bank.load_data()
+    customer = bank.create_customer("individual", "test", "test@example.com", "5550000", "test street")
+    number = bank.create_account(customer.get_customer_id(), "savings", 250).get_account_number()
+    bank.close()
+
+    bank = reopen(path, backend)
+    assert bank.find_account(number).get_balance_cents() == 25000
+    bank.close()
+
+
+def test_account_for_evicted_customer_survives_checkpoint(tmp_path, backend):
+    path = tmp_path / "bank.json"
+    bank, _ = build_bank(path, 4, backend=backend, cache_customers=1)
+    # ct0000000 was evicted while the later customers were built
+    number = bank.create_account("ct0000000", "savings", 1000).get_account_number()
+    totals = bank.get_aggregates()["total_cents"]
+    bank.checkpoint(background=False)
+    bank.close()
+
+    bank = reopen(path, backend)
+    assert bank.find_account(number).get_balance_cents() == 100000
+    assert bank.get_aggregates()["total_cents"] == totals
+    assert number in [account.get_account_number() for account in bank.find_customer("ct0000000").get_accounts_list()]
+    bank.close()
+
+
+def test_period_close_keeps_the_cache_bound(tmp_path, backend):
+    path = tmp_path / "bank.json"
+    bank, numbers = build_bank(path, 30, backend=backend, cache_customers=5)
+    bank.checkpoint(background=False)
+    bank.close_period()
+    assert bank.get_cache_stats()["resident_customers"] <= 5
+    expected = balances(bank, numbers)
+    bank.close()
+
+    bank = reopen(path, backend)
+    assert balances(bank, numbers) == expected
+    bank.close()
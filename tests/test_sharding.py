@@ -0,0 +1,52 @@
+from main import ShardedBank
+
+
+def cross_shard_pair(bank, numbers):
+    count = bank.get_shard_count()
+    return next((a, b) for a in numbers for b in numbers if ShardedBank.shard_of(a, count) != ShardedBank.shard_of(b, count))
+
+
+def open_bank(path, backend=None):
+    return ShardedBank(str(path), shards=2, backend=backend)
+
+
+def test_cross_shard_transfers_and_hold_recovery(tmp_path, backend):
+    path = tmp_path / "bank.json"
+    bank = open_bank(path, backend)
+    numbers = []
+    for i in range(6):
+        customer_id = bank.create_customer("individual", f"test {i}", f"test{i}@example.com", "5550000", "test street")
+        numbers.append(bank.create_account(customer_id, "checking", 1000))
+    source, dest = cross_shard_pair(bank, numbers)
+
+    receipt = bank.transfer(source, dest, 25, key="t1")
+    assert bank.transfer(source, dest, 25, key="t1")["transaction_id"] == receipt["transaction_id"]
+    assert bank.balance(source)["balance_cents"] == 97500
+    assert bank.balance(dest)["balance_cents"] == 102500
+
+    # leave one transfer prepared with no decision and one with a logged commit, then crash the shards
+    for txn, amount in (("undecided", 10), ("decided", 7)):
+        bank._call(bank.shard_of(source, 2), "prepare", txn=txn, side="out", account=source, amount=amount)
+        bank._call(bank.shard_of(dest, 2), "prepare", txn=txn, side="in", account=dest, amount=amount)
+    bank._ShardedBank__committer.submit({"op": "commit", "txn": "decided"}).result()
+    assert bank.get_totals()["held_cents"] == 1700
+    for process in bank._ShardedBank__processes:
+        process.kill()
+
+    bank = open_bank(path, backend)
+    assert bank.get_holds() == []
+    assert bank.balance(source)["balance_cents"] == 97500 - 700
+    assert bank.balance(dest)["balance_cents"] == 102500 + 700
+    assert bank.get_totals()["total_cents"] == 600000
+    bank.close()
+
+
+def test_ids_route_by_their_shard_tag():
+    assert ShardedBank.shard_of("cann000001s1", 2) == 1
+    assert ShardedBank.shard_of("abss001000s0", 2) == 0
+    for key in ("cann000001", "cann000001s2"):
+        try:
+            ShardedBank.shard_of(key, 2)
+        except ValueError:
+            continue
+        raise AssertionError(f"{key} should not route")
@@ -0,0 +1,75 @@
+import json
+
+from main import CLOCK, BankingSystem, CheckingAccount, IndividualCustomer, SimulatedClock
+
+
+def open_checking(tmp_path, balance):
+    bank = BankingSystem(str(tmp_path / "bank.json"))
+    bank.load_data()
+    customer = IndividualCustomer("ct0000001", "test", "test@example.com", "5550000", "test street")
+    bank.add_customer(customer)
+    account = CheckingAccount("at0000001", customer, balance, overdraft_limit=500)
+    bank.add_account(account)
+    customer.add_account(account)
+    bank.log_accounts(account)
+    return bank, account.get_account_number()
+
+
+def test_overdraft_rows_carry_their_own_balances(tmp_path):
+    bank, number = open_checking(tmp_path, 100.0)
+    bank.withdraw(number, 150)
+    page = bank.statement(number)
+    rows = [(row["type"], row["change_cents"], row["balance_cents"]) for row in page["entries"]]
+    assert rows == [("withdrawal", -15000, -5000), ("fee", -3500, -8500)]
+    assert page["opening_balance_cents"] == 10000
+    assert page["closing_balance_cents"] == -8500
+    bank.close()
+
+
+def test_running_balance_and_cursor_pages(tmp_path):
+    with CLOCK.using(SimulatedClock(CLOCK.now_us(), step_us=1000)):
+        bank, number = open_checking(tmp_path, 100.0)
+        for amount in (10, 20, 30, 40):
+            bank.deposit(number, amount)
+        bank.withdraw(number, 250)
+        first = bank.statement(number, limit=3)
+        second = bank.statement(number, cursor=first["next_cursor"], limit=3)
+    entries = first["entries"] + second["entries"]
+    assert [row["type"] for row in entries] == ["deposit"] * 4 + ["withdrawal", "fee"]
+    assert first["opening_balance_cents"] == 10000
+    assert second["opening_balance_cents"] == first["closing_balance_cents"]
+    assert second["closing_balance_cents"] == 10000 + 10000 - 25000 - 3500
+    assert second["next_cursor"] is None
+    bank.close()
+
+
+def test_entries_without_balance_after_get_running_balances(tmp_path):
+    (tmp_path / "source").mkdir()
+    (tmp_path / "target").mkdir()
+    with CLOCK.using(SimulatedClock(CLOCK.now_us(), step_us=1000)):
+        bank, number = open_checking(tmp_path / "source", 100.0)
+        for amount in (10, 20, 30):
+            bank.deposit(number, amount)
+        bank.withdraw(number, 5)
+    expected = bank.statement(number)
+    export = tmp_path / "export.json"
+    assert bank.save_data(silent=True, path=str(export))
+    bank.close()
+
+    # snapshots from before the balance series only carry amounts
+    with open(export) as f:
+        data = json.load(f)
+    for account in data["accounts"]:
+        for entry in account.get("transaction_history", []):
+            entry.pop("balance_after", None)
+    with open(export, "w") as f:
+        json.dump(data, f)
+
+    bank = BankingSystem(str(tmp_path / "target" / "bank.json"))
+    assert bank.load_data(str(export))
+    page = bank.statement(number)
+    assert [row["balance_cents"] for row in page["entries"]] == [row["balance_cents"] for row in expected["entries"]] == [11000, 13000, 16000, 15500]
+    assert page["opening_balance_cents"] == 10000
+    second = bank.statement(number, cursor=bank.statement(number, limit=2)["next_cursor"])
+    assert [row["balance_cents"] for row in second["entries"]] == [16000, 15500]
+    bank.close()